@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module compares the time to load and parse an
+.eaf file with the Eaf and the EafPythonic backend. The
+example file turkish.eaf is scaled up 100 times before.
+
+Usage: python benchmark_eafparse.py [factor]
+"""
+
+import os
+import sys
+import copy
+import time
+import tempfile
+
+from xml.etree import ElementTree as ET
+
+from pyannotation.elan import data as elandata
+
+def scale_eaf(filepath, factor):
+    """Return the content of an .eaf file where all time slots and
+    annotations are repeated factor times.
+    """
+
+    tree = ET.parse(filepath)
+    root = tree.getroot()
+    time_order = root.find("TIME_ORDER")
+    time_slots = list(time_order)
+    offset = max(int(ts.attrib.get("TIME_VALUE", 0)) for ts in time_slots)
+    tiers = root.findall("TIER")
+    annotations = [(tier, list(tier)) for tier in tiers]
+
+    for k in range(1, factor):
+        suffix = "-{0}".format(k)
+        for ts in time_slots:
+            new_ts = copy.deepcopy(ts)
+            new_ts.attrib["TIME_SLOT_ID"] += suffix
+            if "TIME_VALUE" in new_ts.attrib:
+                new_ts.attrib["TIME_VALUE"] = str(
+                    int(new_ts.attrib["TIME_VALUE"]) + k * (offset + 1))
+            time_order.append(new_ts)
+        for tier, tier_annotations in annotations:
+            for a in tier_annotations:
+                new_a = copy.deepcopy(a)
+                for e in new_a:
+                    for attr in ["ANNOTATION_ID", "ANNOTATION_REF",
+                                 "PREVIOUS_ANNOTATION", "TIME_SLOT_REF1",
+                                 "TIME_SLOT_REF2"]:
+                        if attr in e.attrib:
+                            e.attrib[attr] += suffix
+                tier.append(new_a)
+
+    return ET.tostring(root, encoding="utf-8")
+
+def time_parse(filepath, read_only):
+    """Return the seconds to load the file, the seconds to parse it into
+    a tree and the number of utterances.
+    """
+
+    start = time.time()
+    annotation_file_object = elandata.EafAnnotationFileObject(
+        filepath, read_only = read_only)
+    annotation_file_object.file
+    loaded = time.time()
+    parser = elandata.EafAnnotationFileParser(annotation_file_object,
+        annotation_file_object.create_tier_handler())
+    tree = parser.parse()
+    return loaded - start, time.time() - loaded, len(tree)
+
+if __name__ == "__main__":
+    factor = 100
+    if len(sys.argv) > 1:
+        factor = int(sys.argv[1])
+    filepath = os.path.join(os.path.dirname(__file__), "..",
+                            "example_data", "turkish.eaf")
+
+    fd, scaled_filepath = tempfile.mkstemp(suffix = ".eaf")
+    os.write(fd, scale_eaf(filepath, factor))
+    os.close(fd)
+
+    try:
+        for name, read_only in [("Eaf", False), ("EafPythonic", True)]:
+            load, parse, utterances = time_parse(scaled_filepath, read_only)
+            print("{0:<12} load {1:8.3f}s  parse {2:8.3f}s  {3} utterances".format(
+                name, load, parse, utterances))
+    finally:
+        os.remove(scaled_filepath)
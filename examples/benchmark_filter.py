@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module compares the time to filter a GRAID annotation
+tree with 100,000 utterances with precompiled patterns and
+with the uncompiled patterns that were used before, where
+each annotation was searched twice, with precompiled
+patterns and a trigram index of the tree and with the
+short-circuit evaluation.
+
+Usage: python benchmark_filter.py [utterances]
+"""
+
+import sys
+import time
+import random
+
+import regex
+
+from pyannotation import data
+from pyannotation import annotationtree
+
+WORDS = [ "guš-īt", "say", "house", "dog", "barks", "ke", "ba",
+          "rawant", "man", "ta", "šahr", "gind-īn" ]
+
+def graid_tree(utterances, seed = 0):
+    """Return a GRAID annotation tree with random utterances."""
+
+    rnd = random.Random(seed)
+    data_structure_type = data.DataStructureTypeGraid()
+    tree = annotationtree.AnnotationTree(data_structure_type)
+    tree.structure_type_handler = data_structure_type
+    elements = []
+    next_id = 0
+    for _ in range(utterances):
+        clause_units = []
+        words = []
+        for _ in range(rnd.randint(1, 3)):
+            clause_words = []
+            for _ in range(rnd.randint(1, 5)):
+                word = rnd.choice(WORDS)
+                words.append(word)
+                clause_words.append([
+                    data.Annotation(next_id, word),
+                    data.Annotation(next_id + 1, word.upper()),
+                    data.Annotation(next_id + 2, rnd.choice(["np", "v", ""]))])
+                next_id += 3
+            clause_units.append([
+                data.Annotation(next_id, " ".join(w[0]["annotation"]
+                                                  for w in clause_words)),
+                clause_words,
+                data.Annotation(next_id + 1, "")])
+            next_id += 2
+        elements.append([
+            data.Annotation(next_id, " ".join(words)),
+            clause_units,
+            data.Annotation(next_id + 1, "translation"),
+            data.Annotation(next_id + 2, "")])
+        next_id += 3
+    tree.tree = elements
+    return tree
+
+class UncompiledFilter(annotationtree.AnnotationTreeFilter):
+    """The filter as it was before the patterns were compiled."""
+
+    def element_passes_filter(self, element):
+        all_filter_empty = True
+        for ann_type in self.filter.keys():
+            if self.filter[ann_type] != "":
+                all_filter_empty = False
+        if all_filter_empty:
+            return True
+        if self.boolean_operation == self.AND:
+            passed = True
+        else:
+            passed = False
+        passed = self._passes_filter(passed, element,
+                                     self.data_structure_type.data_hierarchy)
+        if self.inverted:
+            passed = not passed
+        return passed
+
+    def _passes_filter(self, passed, elements, hierarchy):
+        for i, t in enumerate(hierarchy):
+            if type(t) is list:
+                local_passes = False
+                for e in elements[i]:
+                    passes = self._passes_filter(passed, e, t)
+                    local_passes = (local_passes or passes)
+                if self.boolean_operation == self.AND:
+                    passed = (passed and local_passes)
+                else:
+                    passed = (passed or local_passes)
+            else:
+                passes = False
+                if self.filter[t] != "":
+                    match = regex.search(
+                        self.filter[t], elements[i]["annotation"])
+                    if match:
+                        self.matchobject[t][elements[i]["id"]] = \
+                            [ [m.start(), m.end()] for m in regex.finditer(
+                                self.filter[t], elements[i]["annotation"]) ]
+                        passes = True
+                elif self.boolean_operation == self.AND:
+                    passes = True
+                if self.boolean_operation == self.AND:
+                    passed = (passed and passes)
+                else:
+                    passed = (passed or passes)
+        return passed
+
+def time_filter(tree, filter_class, filters, short_circuit = False):
+    """Return the seconds to apply a filter to the tree and the number of
+    elements that passed.
+    """
+
+    filter = filter_class(tree.data_structure_type)
+    filter.set_short_circuit(short_circuit)
+    for ann_type, filter_string in filters:
+        filter.set_filter_for_type(ann_type, filter_string)
+    tree.init_filters()
+    start = time.time()
+    tree.append_filter(filter)
+    return time.time() - start, len(tree.filtered_element_positions())
+
+if __name__ == "__main__":
+    utterances = 100000
+    if len(sys.argv) > 1:
+        utterances = int(sys.argv[1])
+    tree = graid_tree(utterances)
+    indexed_tree = graid_tree(utterances)
+    start = time.time()
+    indexed_tree.build_ngram_index()
+    print("trigram index built in {0:.3f}s".format(time.time() - start))
+
+    for filters in [ [("utterance", "dog")],
+                     [("word", "^gu"), ("graid1", "np")],
+                     [("word", "house"), ("utterance", "ke ba")],
+                     [("translation", "nothing")] ]:
+        print(", ".join("{0}={1}".format(t, f) for t, f in filters))
+        for name, t, filter_class, short_circuit in [
+                ("uncompiled", tree, UncompiledFilter, False),
+                ("compiled", tree, annotationtree.AnnotationTreeFilter,
+                 False),
+                ("indexed", indexed_tree,
+                 annotationtree.AnnotationTreeFilter, False),
+                ("short-circuit", tree, annotationtree.AnnotationTreeFilter,
+                 True) ]:
+            seconds, passed = time_filter(
+                t, filter_class, filters, short_circuit)
+            print("  {0:<14} {1:8.3f}s  {2} elements".format(
+                name, seconds, passed))
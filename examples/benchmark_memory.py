@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module compares the memory that is used per
+annotation by the dictionaries that were used before and
+by the slotted annotation records, for the annotations of
+EafPythonic and for the annotations of an AnnotationTree.
+
+Usage: python benchmark_memory.py [factor]
+"""
+
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from pyannotation import data
+from pyannotation.elan import data as elandata
+
+from benchmark_eafparse import scale_eaf
+
+def bytes_per_item(create, n):
+    """Return the number of bytes allocated per item when n items are
+    created with the function create.
+    """
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = [create(i) for i in range(n)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # do not count the list that holds the items
+    return float(after - before - sys.getsizeof(items)) / n
+
+if __name__ == "__main__":
+    factor = 100
+    if len(sys.argv) > 1:
+        factor = int(sys.argv[1])
+    filepath = os.path.join(os.path.dirname(__file__), "..",
+                            "example_data", "turkish.eaf")
+
+    fd, scaled_filepath = tempfile.mkstemp(suffix = ".eaf")
+    os.write(fd, scale_eaf(filepath, factor))
+    os.close(fd)
+    try:
+        eaf = elandata.EafPythonic(scaled_filepath)
+    finally:
+        os.remove(scaled_filepath)
+
+    alignable = list(eaf.alignableAnnotationsDict.values())
+    ref = list(eaf.refAnnotationsDict.values())
+
+    results = [
+        ("EafPythonic alignable annotation",
+         lambda i: dict((k, alignable[i][k]) for k in
+                        elandata.AlignableAnnotation.__slots__),
+         lambda i: elandata.AlignableAnnotation(*[alignable[i][k] for k in
+                        elandata.AlignableAnnotation.__slots__]),
+         len(alignable)),
+        ("EafPythonic ref annotation",
+         lambda i: dict((k, ref[i][k]) for k in
+                        elandata.RefAnnotation.__slots__),
+         lambda i: elandata.RefAnnotation(*[ref[i][k] for k in
+                        elandata.RefAnnotation.__slots__]),
+         len(ref)),
+        ("AnnotationTree annotation",
+         lambda i: { 'id': i, 'annotation': ref[i % len(ref)].value },
+         lambda i: data.Annotation(i, ref[i % len(ref)].value),
+         len(ref)),
+    ]
+
+    for name, create_dict, create_record, n in results:
+        print("{0:<34} dict {1:7.1f} bytes  slots {2:7.1f} bytes".format(
+            name, bytes_per_item(create_dict, n),
+            bytes_per_item(create_record, n)))
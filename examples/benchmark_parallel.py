@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module measures how the evaluation of a filter scales
+with the number of worker processes, for one GRAID annotation
+tree with 100,000 utterances and for a corpus of eight trees
+with 12,500 utterances each.
+
+Usage: python benchmark_parallel.py [utterances] [max_workers]
+"""
+
+import sys
+import time
+import multiprocessing
+
+from pyannotation import corpus
+from pyannotation import annotationtree
+
+from benchmark_filter import graid_tree
+
+def graid_filter(data_structure_type):
+    filter = annotationtree.AnnotationTreeFilter(data_structure_type)
+    filter.set_filter_for_type("word", "^gu")
+    filter.set_filter_for_type("graid1", "np")
+    return filter
+
+def time_tree(tree, workers):
+    """Return the seconds to filter a tree."""
+
+    tree.init_filters()
+    start = time.time()
+    tree.append_filter(graid_filter(tree.data_structure_type), workers)
+    return time.time() - start
+
+def time_corpus(corpus_trees, workers):
+    """Return the seconds to filter all trees of a corpus."""
+
+    corpus_trees.init_filters()
+    start = time.time()
+    corpus_trees.append_filter(
+        graid_filter(corpus_trees.data_structure_type), workers)
+    return time.time() - start
+
+if __name__ == "__main__":
+    utterances = 100000
+    max_workers = 8
+    if len(sys.argv) > 1:
+        utterances = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        max_workers = int(sys.argv[2])
+    print("{0} cpus".format(multiprocessing.cpu_count()))
+
+    tree = graid_tree(utterances)
+    corpus_trees = corpus.CorpusTrees(tree.data_structure_type)
+    for i in range(8):
+        corpus_trees.items.append(
+            ("tree{0}".format(i), graid_tree(utterances // 8, seed = i)))
+
+    workers = 1
+    while workers <= max_workers:
+        tree_seconds = time_tree(tree, workers)
+        corpus_seconds = time_corpus(corpus_trees, workers)
+        if workers == 1:
+            tree_base, corpus_base = tree_seconds, corpus_seconds
+        print("{0} workers  tree {1:7.3f}s ({2:4.1f}x)  "
+              "corpus {3:7.3f}s ({4:4.1f}x)".format(workers,
+                tree_seconds, tree_base / tree_seconds,
+                corpus_seconds, corpus_base / corpus_seconds))
+        workers *= 2
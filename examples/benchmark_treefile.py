@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module compares the size and the loading time of a GRAID
+annotation tree with 100,000 utterances in a pickle file of the
+annotation dictionaries, as they were saved before, in a pickle
+file of the compact annotations and in a binary tree file, and
+the time to read one element from the memory-mapped tree file.
+
+Usage: python benchmark_treefile.py [utterances]
+"""
+
+import os
+import sys
+import time
+import pickle
+import tempfile
+
+from pyannotation import annotationtree
+
+from benchmark_filter import graid_tree
+
+def as_dictionaries(element):
+    """Return the element with annotation dictionaries."""
+
+    if type(element) is list:
+        return [as_dictionaries(e) for e in element]
+    return { "id": element.id, "annotation": element.annotation }
+
+def time_load(data_structure_type, filepath, method):
+    """Return the seconds to load a tree with the given method."""
+
+    tree = annotationtree.AnnotationTree(data_structure_type)
+    start = time.time()
+    getattr(tree, method)(filepath)
+    return time.time() - start
+
+if __name__ == "__main__":
+    utterances = 100000
+    if len(sys.argv) > 1:
+        utterances = int(sys.argv[1])
+    tree = graid_tree(utterances)
+    directory = tempfile.mkdtemp()
+    dictionary_pickle = os.path.join(directory, "dictionaries.pickle")
+    compact_pickle = os.path.join(directory, "compact.pickle")
+    binary = os.path.join(directory, "tree.bin")
+    try:
+        file = open(dictionary_pickle, "wb")
+        pickle.dump(as_dictionaries(tree.tree), file)
+        file.close()
+        tree.save_tree_as_pickle(compact_pickle)
+        start = time.time()
+        tree.save_tree_as_binary(binary)
+        print("binary tree file saved in {0:.3f}s".format(
+            time.time() - start))
+
+        for name, filepath, method in [
+                ("dictionary pickle", dictionary_pickle,
+                 "load_tree_from_pickle"),
+                ("compact pickle", compact_pickle, "load_tree_from_pickle"),
+                ("binary", binary, "load_tree_from_binary") ]:
+            seconds = time_load(tree.data_structure_type, filepath, method)
+            print("  {0:<18} {1:8.3f}s  {2:6.1f} MB".format(name, seconds,
+                os.path.getsize(filepath) / 1000000.0))
+
+        mapped_tree = annotationtree.AnnotationTree(tree.data_structure_type)
+        start = time.time()
+        mapped_tree.map_tree_file(binary)
+        mapped_tree.get_element_at(len(mapped_tree) // 2)
+        print("  {0:<18} {1:8.5f}s".format("mapped, 1 element",
+            time.time() - start))
+        mapped_tree.tree_file.close()
+    finally:
+        for filename in os.listdir(directory):
+            os.remove(os.path.join(directory, filename))
+        os.rmdir(directory)
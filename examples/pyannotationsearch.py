@@ -71,6 +71,10 @@ for _, annotationtree in corpus.items:
     for filter in filterChain:
         annotationtree.append_filter(copy.deepcopy(filter))
 
+# Or search all trees of the corpus at once and stop after 10 hits
+for filepath, element_id, spans in corpus.search(filterChain, limit = 10):
+    print(filepath, element_id, spans)
+
 # Verify the elements
 for element in annotation_tree.elements():
     print(element)
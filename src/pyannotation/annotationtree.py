@@ -20,9 +20,27 @@ Wto read and write files.
 from __future__ import unicode_literals
 
 import pyannotation.data as data
+import pyannotation.ngramindex as ngramindex
+import pyannotation.columns as columns
+import pyannotation.treefile as treefile
+import pyannotation.journal as journal
+import os
+import sys
+import uuid
+import copy
 import pickle
 import regex
 import operator
+import multiprocessing
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The compiled iterators of the annotations of a type, by the access path
+# of the type
+_annotation_iterators = dict()
 
 class AnnotationTree():
     """
@@ -36,10 +54,16 @@ class AnnotationTree():
 
         """
 
-        self.tree = []
         self._next_annotation_id = 0
-
         self.data_structure_type = data_structure_type
+        self.ngram_index = None
+        self.columns = None
+        self.tree_file = None
+        self.journal = None
+        self._journal_changes = None
+        self.journal_compaction_ratio = 0.5
+        self.version = 0
+        self.tree = []
 
         if data_structure_type == data.GRAID:
             self.structure_type_handler = data.DataStructureTypeGraid()
@@ -47,7 +71,10 @@ class AnnotationTree():
             self.structure_type_handler = data.DataStructureTypeMorphsynt()
 
         self.filters = []
-        self.filtered_element_ids = [[]]
+        self.filter_bitmaps = [_new_bitmap(0)]
+        # the bitmap, the size of the tree and the positions of each
+        # filter stage read through filtered_element_ids
+        self._filtered_element_lists = []
 
     @property
     def next_annotation_id(self):
@@ -90,6 +117,400 @@ class AnnotationTree():
             raise(TypeError, "annotation ID must be int")
         self._next_annotation_id = next_id
 
+    @property
+    def tree(self):
+        """Returns the list of elements of the annotation tree. If the
+        tree was mapped from a tree file with map_tree_file, all elements
+        are read from the file on the first access.
+
+        Returns
+        -------
+        _tree : array_like
+            The elements of the annotation tree.
+
+        """
+
+        if self._tree is None:
+            self._read_mapped_tree()
+        return self._tree
+
+    @tree.setter
+    def tree(self, tree):
+        """Set the elements of the annotation tree and build the
+        index of element and annotation ids.
+
+        Parameters
+        ----------
+        tree : array_like
+            The elements of the annotation tree.
+
+        """
+
+        self._close_tree_file()
+        self._detach_journal()
+        self._tree = tree
+        self.version += 1
+        self._build_index()
+
+    def _build_index(self, annotations = None):
+        """Build the dictionaries that map the element ids to the
+        positions of the elements in the tree and the annotation ids to
+        the annotations.
+
+        Parameters
+        ----------
+        annotations : array_like
+            All annotations of the tree in the order of the elements, if
+            they are known already. Otherwise the elements are walked.
+
+        """
+
+        self._element_positions = dict()
+        self._positions_valid_until = 0
+        self._update_positions()
+        if annotations is None:
+            self._annotations = dict()
+            for e in self._tree:
+                self._index_annotations(e)
+        else:
+            self._annotations = dict(
+                (a.id, a) for a in annotations if a.id is not None)
+        if self.ngram_index is not None:
+            self.build_ngram_index(self.ngram_index.n)
+        if self.columns is not None:
+            self.build_columns()
+
+    def _update_positions(self):
+        """Update the positions of all elements from the first position
+        that is not valid anymore to the end of the tree.
+
+        """
+
+        for i in range(self._positions_valid_until, len(self._tree)):
+            id_element = self._element_id(self._tree[i])
+            if id_element is not None:
+                self._element_positions[id_element] = i
+        self._positions_valid_until = len(self._tree)
+
+    def _element_id(self, element):
+        """Return the id of an element, that is the id of its first
+        annotation.
+
+        Parameters
+        ----------
+        element : array_like
+            An element of the annotation tree.
+
+        Returns
+        -------
+        id : int
+            The id of the element or None if the element has no id.
+
+        """
+
+        try:
+            return element[0]['id']
+        except (IndexError, KeyError, TypeError):
+            return None
+
+    def _position_of_element(self, id_element):
+        """Return the position of the element with the given id in the
+        tree.
+
+        Parameters
+        ----------
+        id_element : int
+            Id of an element.
+
+        Returns
+        -------
+        position : int
+            The position of the element or None if there is no element
+            with the id.
+
+        """
+
+        if self._tree is None:
+            self._read_mapped_tree()
+        position = self._element_positions.get(id_element)
+        if position is None or position >= self._positions_valid_until:
+            self._update_positions()
+            position = self._element_positions.get(id_element)
+        return position
+
+    def _index_annotations(self, element):
+        """Add all annotations of an element to the annotation index.
+
+        Parameters
+        ----------
+        element : array_like
+            An element or a part of an element of the annotation tree.
+
+        """
+
+        if type(element) is list:
+            for e in element:
+                self._index_annotations(e)
+        elif type(element) is data.Annotation or type(element) is dict:
+            if element['id'] is not None:
+                self._annotations[element['id']] = element
+
+    def _unindex_annotations(self, element):
+        """Remove all annotations of an element from the annotation index.
+
+        Parameters
+        ----------
+        element : array_like
+            An element or a part of an element of the annotation tree.
+
+        """
+
+        if type(element) is list:
+            for e in element:
+                self._unindex_annotations(e)
+        elif type(element) is data.Annotation or type(element) is dict:
+            if self._annotations.get(element['id']) is element:
+                del self._annotations[element['id']]
+
+    def _add_element(self, element, position = None):
+        """Add an element to the tree and to the indexes.
+
+        Parameters
+        ----------
+        element : array_like
+            An element of the annotation tree.
+        position : int
+            The position where the element is inserted, or None to
+            append the element.
+
+        """
+
+        if self._tree is None:
+            self._read_mapped_tree()
+        if position is None:
+            self._tree.append(element)
+            if self._positions_valid_until == len(self._tree) - 1:
+                id_element = self._element_id(element)
+                if id_element is not None:
+                    self._element_positions[id_element] = len(self._tree) - 1
+                self._positions_valid_until = len(self._tree)
+        else:
+            self._tree.insert(position, element)
+            self._positions_valid_until = min(
+                self._positions_valid_until, position)
+        self._index_annotations(element)
+        self.version += 1
+        if self.ngram_index is not None:
+            self.ngram_index.add_element(self._element_id(element), element)
+        if self.columns is not None:
+            if position is None:
+                self.columns.add_element(element)
+            else:
+                self.columns.insert_element(position, element)
+        if self._journal_changes is not None:
+            if position is None:
+                self._journal_changes.append(("append", element))
+            else:
+                self._journal_changes.append(("insert", position, element))
+
+    def build_ngram_index(self, n = 3):
+        """Build an inverted n-gram index over the annotation values of
+        the tree. The index is used by append_filter and reset_filters to
+        evaluate a filter only on the elements that contain the literals
+        of its patterns. It is kept up to date by the methods that add,
+        remove and change elements. If annotations are edited in place
+        without mark_element_changed the index has to be built again.
+
+        Parameters
+        ----------
+        n : int
+            The length of the n-grams.
+
+        See Also
+        --------
+        ngramindex.NgramIndex
+
+        """
+
+        self.ngram_index = ngramindex.NgramIndex(
+            self.data_structure_type, n)
+        for e in self.tree:
+            self.ngram_index.add_element(self._element_id(e), e)
+
+    def build_columns(self):
+        """Build the columns of the annotations of the tree, one column
+        for each annotation type. The columns are used by append_filter,
+        reset_filters and search to evaluate the regular expressions of a
+        filter on the values of one annotation type before the elements
+        are evaluated. If the tree also has an n-gram index only the rows
+        of the candidates of the index are checked. The columns are kept
+        up to date by the methods that add, remove and change elements
+        and annotations; annotations that are edited in place have to be
+        reported with mark_element_changed.
+
+        See Also
+        --------
+        get_column, columns.AnnotationColumns
+
+        """
+
+        self.columns = columns.AnnotationColumns(self.data_structure_type)
+        for e in self.tree:
+            self.columns.add_element(e)
+
+    def get_column(self, ann_type):
+        """Return the column of the annotations of a type. The columns
+        are built if the tree has no columns yet.
+
+        Parameters
+        ----------
+        ann_type : str
+            The annotation type.
+
+        Returns
+        -------
+        column : columns.AnnotationColumn
+            The ids, parents, element positions and values of the
+            annotations of the type, in the order of the tree.
+
+        Raises
+        ------
+        data.UnknownAnnotationTypeError
+            If the ann_type doesn't exist.
+
+        """
+
+        if ann_type not in self.data_structure_type.type_rows:
+            raise data.UnknownAnnotationTypeError(ann_type)
+        if self.columns is None:
+            self.build_columns()
+        return self.columns.columns[ann_type]
+
+    def get_element(self, id_element):
+        """Return the element with a certain id.
+
+        Parameters
+        ----------
+        id_element : int
+            Id of an element.
+
+        Returns
+        -------
+        element : array_like
+            The element or None if there is no element with the id.
+
+        """
+
+        if self._tree is None:
+            position = self.tree_file.position_of_element(id_element)
+            if position is None:
+                return None
+            return self.tree_file.element(position)
+        position = self._position_of_element(id_element)
+        if position is None:
+            return None
+        return self._tree[position]
+
+    def get_element_at(self, position):
+        """Return the element at a position. If the tree is mapped from
+        a tree file only this element is read from the file.
+
+        Parameters
+        ----------
+        position : int
+            The position of the element in the tree.
+
+        Returns
+        -------
+        element : array_like
+            The element at the position.
+
+        """
+
+        if self._tree is None:
+            return self.tree_file.element(position)
+        return self._tree[position]
+
+    def get_elements_in_id_range(self, first_id, last_id):
+        """Return the elements with ids from first_id to last_id,
+        including both, in the order of the tree. If the tree is mapped
+        from a tree file only these elements are read from the file.
+
+        Parameters
+        ----------
+        first_id : int
+            The smallest element id.
+        last_id : int
+            The largest element id.
+
+        Returns
+        -------
+        elements : array_like
+            The elements with ids in the range.
+
+        """
+
+        if self._tree is None:
+            return [self.tree_file.element(position) for position in
+                    self.tree_file.positions_of_id_range(first_id, last_id)]
+        elements = []
+        for e in self._tree:
+            id_element = self._element_id(e)
+            if id_element is not None and first_id <= id_element <= last_id:
+                elements.append(e)
+        return elements
+
+    def get_annotation(self, id_annotation):
+        """Return the annotation with a certain id.
+
+        Parameters
+        ----------
+        id_annotation : int
+            Id of an annotation.
+
+        Returns
+        -------
+        annotation : data.Annotation
+            The annotation or None if there is no annotation with the id.
+
+        """
+
+        if self._tree is None:
+            self._read_mapped_tree()
+        return self._annotations.get(id_annotation)
+
+    def iter_annotations(self, ann_type):
+        """Iterate over the annotations of a type in all elements of the
+        tree. The annotations are read with an iterator that is compiled
+        from the access path of the type in the data hierarchy, so that
+        only the lists that contain annotations of the type are visited.
+
+        Parameters
+        ----------
+        ann_type : str
+            The annotation type.
+
+        Returns
+        -------
+        annotations : iterator
+            Tuples (element_index, path, id, annotation), where path is
+            the tuple of the indices of the annotation in the element.
+            For the type 'word' in the hierarchy
+            ['utterance', ['word'], 'translation'] the path of the third
+            word is (1, 2, 0).
+
+        Raises
+        ------
+        data.UnknownAnnotationTypeError
+            If the ann_type doesn't exist.
+
+        """
+
+        if ann_type not in self.data_structure_type.type_paths:
+            raise data.UnknownAnnotationTypeError(ann_type)
+        return _annotation_iterator(
+            self.data_structure_type.type_paths[ann_type])(self.elements())
+
     def save_tree_as_pickle(self, filepath):
         """Save the project annotation tree in a pickle
         file.
@@ -117,9 +538,263 @@ class AnnotationTree():
         """
 
         file = open(filepath, "rb")
-        self.tree = pickle.load(file)
+        self.tree = self._compact_element(pickle.load(file))
         file.close()
 
+    def save_tree_as_binary(self, filepath):
+        """Save the project annotation tree in a binary tree file.
+
+        Parameters
+        ----------
+        filepath : str
+            The absolute path to a file.
+
+        See Also
+        --------
+        treefile.write_tree
+
+        """
+
+        # a mapped tree is read before the file is truncated
+        if self._tree is None:
+            self._read_mapped_tree()
+        file = open(filepath, "wb")
+        try:
+            treefile.write_tree(file, self)
+        finally:
+            file.close()
+
+    def load_tree_from_binary(self, filepath):
+        """Load the project annotation tree from a binary tree file.
+
+        Parameters
+        ----------
+        filepath : str
+            The absolute path to a file.
+
+        Raises
+        ------
+        data.DataStructureTypeNotSupportedError
+            If the tree in the file has another data structure type.
+
+        See Also
+        --------
+        treefile.read_tree
+
+        """
+
+        file = open(filepath, "rb")
+        try:
+            header, elements, annotations = treefile.read_tree(file)
+        finally:
+            file.close()
+        self.set_tree_from_binary(filepath, header, elements, annotations)
+
+    def set_tree_from_binary(self, filepath, header, elements, annotations):
+        """Set the elements that were read from a binary tree file, for
+        example in another process, and replay the journal of the file.
+
+        Parameters
+        ----------
+        filepath : str
+            The absolute path to the file.
+        header : dict
+            The header of the file.
+        elements : array_like
+            The elements of the file.
+        annotations : array_like
+            All annotations of the elements.
+
+        Raises
+        ------
+        data.DataStructureTypeNotSupportedError
+            If the tree in the file has another data structure type.
+
+        See Also
+        --------
+        treefile.read_tree
+
+        """
+
+        if header["data_structure_type"] != self.data_structure_type.name:
+            raise data.DataStructureTypeNotSupportedError(
+                "Data structure type {0} not supported".format(
+                    header["data_structure_type"]))
+        self._close_tree_file()
+        self._detach_journal()
+        self._tree = elements
+        self.version += 1
+        self._build_index(annotations)
+        self._next_annotation_id = header["next_annotation_id"]
+        self._open_journal(filepath, header)
+
+    def map_tree_file(self, filepath):
+        """Map the annotation tree to a binary tree file. The elements
+        are not read until they are accessed: elements, get_element,
+        get_element_at and get_elements_in_id_range read only the
+        requested elements from the memory-mapped file, all other
+        methods read the whole tree on their first call. The elements
+        that are read from the mapped file are copies, changes to them
+        are lost. An n-gram index of the tree is removed.
+
+        Parameters
+        ----------
+        filepath : str
+            The absolute path to a file.
+
+        Raises
+        ------
+        data.DataStructureTypeNotSupportedError
+            If the tree in the file has another data structure type.
+
+        See Also
+        --------
+        treefile.MappedTreeFile
+
+        """
+
+        tree_file = treefile.MappedTreeFile(filepath)
+        if tree_file.header["data_structure_type"] != \
+                self.data_structure_type.name:
+            tree_file.close()
+            raise data.DataStructureTypeNotSupportedError(
+                "Data structure type {0} not supported".format(
+                    tree_file.header["data_structure_type"]))
+        self._close_tree_file()
+        self._detach_journal()
+        self.tree_file = tree_file
+        self._tree = None
+        self._element_positions = dict()
+        self._positions_valid_until = 0
+        self._annotations = dict()
+        self.ngram_index = None
+        self.columns = None
+        self._next_annotation_id = tree_file.header["next_annotation_id"]
+        self.version += 1
+        self._open_journal(filepath, tree_file.header)
+
+    def _read_mapped_tree(self):
+        """Read all elements of the mapped tree file and close the file.
+
+        """
+
+        header, elements, annotations = self.tree_file.read_tree()
+        self._close_tree_file()
+        self._tree = elements
+        self._build_index(annotations)
+
+    def save_tree_with_journal(self, filepath, compact = False):
+        """Save the project annotation tree in a binary tree file and
+        a journal. If the tree was loaded from or saved to this file
+        before, only the changes since then are appended to the journal
+        in the file filepath + journal.SUFFIX. The tree file is written
+        completely, and the journal is emptied, when the tree is saved
+        for the first time, when the journal grows larger than
+        journal_compaction_ratio times the size of the tree file or when
+        compact is True.
+
+        The changes are tracked by append_element, insert_element,
+        remove_element, set_annotation and mark_element_changed.
+        load_tree_from_binary and map_tree_file replay the journal.
+
+        Parameters
+        ----------
+        filepath : str
+            The absolute path to a file.
+        compact : bool
+            Write the tree file completely.
+
+        See Also
+        --------
+        journal.TreeJournal
+
+        """
+
+        if self._tree is None:
+            self._read_mapped_tree()
+        if compact or self.journal is None or \
+                self._journal_tree_filepath != os.path.abspath(filepath) or \
+                self.journal.valid_length > \
+                    self.journal_compaction_ratio * os.path.getsize(filepath):
+            self._compact_journal(filepath)
+        elif len(self._journal_changes) > 0:
+            self._journal_changes.append(
+                ("next_annotation_id", self._next_annotation_id))
+            self.journal.append(self._journal_changes)
+            self._journal_changes = []
+
+    def _compact_journal(self, filepath):
+        """Write the tree file completely, with a new journal token, and
+        create an empty journal.
+
+        """
+
+        token = uuid.uuid4().hex
+        temporary_filepath = filepath + ".tmp"
+        file = open(temporary_filepath, "wb")
+        try:
+            treefile.write_tree(file, self, { "journal_token": token })
+            file.flush()
+            os.fsync(file.fileno())
+        finally:
+            file.close()
+        # a journal of the old tree file has another token and is not
+        # replayed if the program stops before the new journal is created
+        os.replace(temporary_filepath, filepath)
+        tree_journal = journal.TreeJournal(filepath + journal.SUFFIX)
+        tree_journal.create(token)
+        self._attach_journal(filepath, tree_journal)
+
+    def _open_journal(self, filepath, header):
+        """Replay the journal of a tree file that was saved with
+        save_tree_with_journal.
+
+        """
+
+        token = header.get("journal_token")
+        if token is None:
+            return
+        tree_journal = journal.TreeJournal(filepath + journal.SUFFIX)
+        records = tree_journal.read(token)
+        if tree_journal.valid_length is None:
+            return
+        if len(records) > 0 and self._tree is None:
+            self._read_mapped_tree()
+        for changes in records:
+            for change in changes:
+                self._replay_change(change)
+        self._attach_journal(filepath, tree_journal)
+
+    def _replay_change(self, change):
+        if change[0] == "append":
+            self._add_element(change[1])
+        elif change[0] == "insert":
+            self._add_element(change[2], change[1])
+        elif change[0] == "remove":
+            self.remove_element(change[1])
+        elif change[0] == "set":
+            self.set_annotation(change[1], change[2])
+        elif change[0] == "replace":
+            position = self._position_of_element(change[1])
+            self.remove_element(change[1])
+            self._add_element(change[2], position)
+        elif change[0] == "next_annotation_id":
+            self._next_annotation_id = change[1]
+
+    def _attach_journal(self, filepath, tree_journal):
+        self.journal = tree_journal
+        self._journal_tree_filepath = os.path.abspath(filepath)
+        self._journal_changes = []
+
+    def _detach_journal(self):
+        self.journal = None
+        self._journal_changes = None
+
+    def _close_tree_file(self):
+        if self.tree_file is not None:
+            self.tree_file.close()
+            self.tree_file = None
+
     def append_element(self, element, update_ids = False):
         """Append an element to the annotation tree.
 
@@ -133,9 +808,31 @@ class AnnotationTree():
         """
 
         if update_ids:
-            self.tree.append(self._update_ids_of_element(element))
+            self._add_element(self._update_ids_of_element(element))
         else:
-            self.tree.append(element)
+            self._add_element(self._compact_element(element))
+
+    def _compact_element(self, element):
+        """Replace the annotation dictionaries in an element with
+        data.Annotation objects.
+
+        Parameters
+        ----------
+        element : array_like
+            An element or a list of elements of the annotation tree.
+
+        Returns
+        -------
+        element : array_like
+            The element with data.Annotation objects.
+
+        """
+
+        if type(element) is dict:
+            return data.Annotation(element['id'], element['annotation'])
+        elif type(element) is list:
+            return [self._compact_element(e) for e in element]
+        return element
 
     def _update_ids_of_element(self, element):
         """Update the ids of the element in the annotation tree.
@@ -154,8 +851,9 @@ class AnnotationTree():
 
         element_with_ids = []
         for e in element:
-            if type(e) is dict:
-                element_with_ids.append({ 'id': self.next_annotation_id, 'annotation': e['annotation'] })
+            if type(e) is dict or type(e) is data.Annotation:
+                element_with_ids.append(data.Annotation(
+                    self.next_annotation_id, e['annotation']))
             elif type(e) is list:
                 element_with_ids.append(self._update_ids_of_element(e))
         return element_with_ids
@@ -174,114 +872,429 @@ class AnnotationTree():
 
         """
 
-        empty_element = self.structure_type_handler.empty_element()
-        return self._update_ids_of_element(empty_element)
+        empty_element = self.structure_type_handler.empty_element()
+        return self._update_ids_of_element(empty_element)
+
+    def append_empty_element(self):
+        """Append an element with the ids.
+
+        See Also
+        --------
+        empty_element
+
+        """
+
+        empty_element = self.empty_element()
+        self._add_element(empty_element)
+
+    def elements(self):
+        """Retrieve the elements of the tree.
+
+        Returns
+        -------
+        e : array_like
+            Return elements of the tree.
+
+        """
+
+        if self._tree is None:
+            return self.tree_file.elements()
+        return (e for e in self.tree)
+
+    def remove_element(self, id_element):
+        """Remove an element with a certain id.
+
+        Parameters
+        ----------
+        id_element : int
+            Id of an element.
+
+        Returns
+        -------
+        remove_element : bool
+            Return an answer true or false.
+
+        """
+
+        i = self._position_of_element(id_element)
+        if i is None:
+            return False
+        e = self._tree.pop(i)
+        del self._element_positions[id_element]
+        self._positions_valid_until = min(self._positions_valid_until, i)
+        self._unindex_annotations(e)
+        self.version += 1
+        if self.ngram_index is not None:
+            self.ngram_index.remove_element(id_element)
+        if self.columns is not None:
+            self.columns.remove_element(i)
+        if self._journal_changes is not None:
+            self._journal_changes.append(("remove", id_element))
+        return True
+
+    def set_annotation(self, id_annotation, annotation):
+        """Change the value of an annotation. Changes made with this
+        method are written to the journal by save_tree_with_journal;
+        annotations that are changed directly have to be reported with
+        mark_element_changed.
+
+        Parameters
+        ----------
+        id_annotation : int
+            Id of an annotation.
+        annotation : str
+            The new value of the annotation.
+
+        Returns
+        -------
+        set_annotation : bool
+            Return an answer true or false.
+
+        """
+
+        a = self.get_annotation(id_annotation)
+        if a is None:
+            return False
+        a['annotation'] = annotation
+        self.version += 1
+        if self.ngram_index is not None:
+            id_element = self.ngram_index.element_of_annotation(id_annotation)
+            if id_element is not None:
+                self.ngram_index.remove_element(id_element)
+                self.ngram_index.add_element(id_element,
+                                             self.get_element(id_element))
+        if self.columns is not None:
+            self.columns.set_annotation(id_annotation, annotation)
+        if self._journal_changes is not None:
+            self._journal_changes.append(("set", id_annotation, annotation))
+        return True
+
+    def mark_element_changed(self, id_element):
+        """Report that the annotations of an element were changed
+        directly, so that the element is written to the journal by
+        save_tree_with_journal.
+
+        Parameters
+        ----------
+        id_element : int
+            Id of an element.
+
+        Returns
+        -------
+        mark_element_changed : bool
+            Return an answer true or false.
+
+        """
+
+        if self._tree is None:
+            self._read_mapped_tree()
+        element = self.get_element(id_element)
+        if element is None:
+            return False
+        self._unindex_annotations(element)
+        self._index_annotations(element)
+        self.version += 1
+        if self.ngram_index is not None:
+            self.ngram_index.remove_element(id_element)
+            self.ngram_index.add_element(id_element, element)
+        if self.columns is not None:
+            self.columns.replace_element(
+                self._position_of_element(id_element), element)
+        if self._journal_changes is not None:
+            self._journal_changes.append(("replace", id_element, element))
+        return True
+
+    def insert_element(self, element, id_element, after = False,
+                       update_ids = False):
+        """Insert an element with a certain id.
+
+        Parameters
+        ----------
+        element : str
+            Value of a field in the data structure annotation tree.
+        id_element : int
+            Id of an element.
+        after : bool
+        update_ids: bool
+            To update or not the ids of the annotation tree.
+
+        Returns
+        -------
+        insert_element : bool
+            Return an answer true or false.
+
+        """
+
+        if update_ids:
+            element = self._update_ids_of_element(element)
+        else:
+            element = self._compact_element(element)
+        i = self._position_of_element(id_element)
+        if i is None:
+            return False
+        if after:
+            i += 1
+        self._add_element(element, i)
+        return True
+
+    def search(self, filter_chain):
+        """Search the elements that pass all filters of a filter chain.
+        The elements are evaluated lazily, in the order of the tree, with
+        copies of the filters. If the tree has columns or an n-gram index
+        only the candidate elements of the filters are evaluated. The tree
+        should not be changed while the search is running.
+
+        Parameters
+        ----------
+        filter_chain : array_like
+            A list of AnnotationTreeFilter objects.
+
+        Returns
+        -------
+        hits : generator
+            A generator of tuples (element id, spans), where spans is a
+            dict that maps annotation types to dicts of annotation ids and
+            match spans.
+
+        """
+
+        filters = []
+        for filter in filter_chain:
+            filter = copy.copy(filter)
+            filter.reset_match_object()
+            filters.append(filter)
+
+        candidate_positions = None
+        for filter in filters:
+            if filter.inverted:
+                continue
+            filter_positions = self._filter_candidate_positions(filter)
+            if filter_positions is None:
+                continue
+            if candidate_positions is None:
+                candidate_positions = filter_positions
+            else:
+                candidate_positions = candidate_positions & filter_positions
+        if candidate_positions is None:
+            positions = range(len(self.tree))
+        else:
+            positions = sorted(candidate_positions)
+
+        for i in positions:
+            element = self.tree[i]
+            passed = True
+            for filter in filters:
+                passes = filter.element_passes_filter(element)
+                filter.reset_match_object()
+                if not passes:
+                    passed = False
+                    break
+            if not passed:
+                continue
+
+            spans = dict()
+            for filter in filters:
+                if filter.inverted:
+                    continue
+                filter.collect_matches(element)
+                for ann_type, type_spans in filter.matchobject.items():
+                    if len(type_spans) > 0:
+                        spans.setdefault(ann_type, dict()).update(type_spans)
+                filter.reset_match_object()
+            yield self._element_id(element), spans
+
+    def __len__(self):
+        """Return the size of the tree, number of elements.
+
+        Returns
+        -------
+        len(tree) : int
+            Return the size of the tree, number of elements.
+
+        """
+
+        if self._tree is None:
+            return len(self.tree_file)
+        return len(self.tree)
+
+    def append_filter(self, filter, workers = 1):
+        """Append a filter to the search. Only the elements that passed
+        the previous filter are evaluated.
 
-    def append_empty_element(self):
-        """Append an element with the ids.
+        Parameters
+        ----------
+        filter : str
+            Value to set the fiter.
+        workers : int
+            The number of processes that evaluate the filter.
 
         See Also
         --------
-        empty_element
+        append_filter_to_trees
 
         """
 
-        empty_element = self.empty_element()
-        self.tree.append(empty_element)
+        append_filter_to_trees([self], [filter], workers)
 
-    def elements(self):
-        """Retrieve the elements of the tree.
+    def _apply_filter(self, filter, bitmap, workers = 1):
+        """Evaluate a filter on the elements that are set in a bitmap.
+
+        Parameters
+        ----------
+        filter : AnnotationTreeFilter
+            The filter to evaluate.
+        bitmap : array_like
+            The bitmap of the elements that passed the previous filter.
+        workers : int
+            The number of processes that evaluate the filter.
 
         Returns
         -------
-        e : array_like
-            Return elements of the tree.
+        new_bitmap : array_like
+            The bitmap of the elements that pass the filter.
 
         """
 
-        return (e for e in self.tree)
+        new_bitmap, positions = self._filter_candidates(filter, bitmap)
+        for i in evaluate_filter_jobs(
+                [(filter, self.tree, positions)], workers)[0]:
+            new_bitmap[i] = 1
+        return new_bitmap
 
-    def remove_element(self, id_element):
-        """Remove an element with a certain id.
+    def _filter_candidates(self, filter, bitmap):
+        """Return the positions of the elements that have to be evaluated
+        for a filter. If the tree has columns or an n-gram index,
+        elements that cannot contain a match are not evaluated.
 
         Parameters
         ----------
-        id_element : int
-            Id of an element.
+        filter : AnnotationTreeFilter
+            The filter to evaluate.
+        bitmap : array_like
+            The bitmap of the elements that passed the previous filter.
 
         Returns
         -------
-        remove_element : bool
-            Return an answer true or false.
+        new_bitmap : array_like
+            The bitmap for the filter, where elements that pass without
+            evaluation are already set.
+        positions : array_like
+            The positions of the elements to evaluate, in ascending order.
 
         """
 
-        for i, e in enumerate(self.tree):
-            if e[0]['id'] == id_element:
-                self.tree.pop(i)
-                return True
-        return False
+        new_bitmap = _new_bitmap(len(bitmap))
+        candidate_positions = self._filter_candidate_positions(filter)
+
+        if candidate_positions is None:
+            positions = _bitmap_positions(bitmap)
+        elif filter.inverted:
+            # elements that are not candidates pass an inverted filter
+            positions = []
+            for i in _bitmap_positions(bitmap):
+                if i in candidate_positions:
+                    positions.append(i)
+                else:
+                    new_bitmap[i] = 1
+        else:
+            positions = sorted(i for i in candidate_positions
+                               if i < len(bitmap) and bitmap[i])
 
-    def insert_element(self, element, id_element, after = False,
-                       update_ids = False):
-        """Insert an element with a certain id.
+        return new_bitmap, positions
+
+    def _filter_candidate_positions(self, filter):
+        """Return the positions of the elements that may pass the
+        regular expressions of a filter, without its inversion. The
+        candidates are taken from the n-gram index of the tree; if the
+        tree has columns, the regular expressions are evaluated on the
+        rows of these candidates, or on the whole columns if the index
+        has no candidates for the filter.
 
         Parameters
         ----------
-        element : str
-            Value of a field in the data structure annotation tree.
-        id_element : int
-            Id of an element.
-        after : bool
-        update_ids: bool
-            To update or not the ids of the annotation tree.
+        filter : AnnotationTreeFilter
+            The filter.
 
         Returns
         -------
-        insert_element : bool
-            Return an answer true or false.
+        positions : set
+            The positions of the candidate elements or None if all
+            elements are candidates.
 
         """
 
-        if update_ids:
-            element = self._update_ids_of_element(element)
-        for i, e in enumerate(self.tree):
-            if e[0]['id'] == id_element:
-                if after:
-                    self.tree.insert(i + 1, element)
-                else:
-                    self.tree.insert(i, element)
-                return True
-        return False
+        positions = None
+        if self.ngram_index is not None:
+            ids = self.ngram_index.filter_candidate_ids(filter)
+            if ids is not None:
+                positions = set(i for i in map(self._position_of_element, ids)
+                                if i is not None)
+        if self.columns is not None:
+            return self.columns.filter_candidate_positions(filter, positions)
+        return positions
 
-    def __len__(self):
-        """Return the size of the tree, number of elements.
+    def filtered_element_positions(self):
+        """Return the positions of the elements that passed all filters.
 
         Returns
         -------
-        len(tree) : int
-            Return the size of the tree, number of elements.
+        positions : array_like
+            The positions of the elements in the tree.
 
         """
 
-        return len(self.tree)
+        bitmap = self.filter_bitmaps[-1]
+        return [i for i in _bitmap_positions(bitmap) if i < len(self.tree)]
 
-    def append_filter(self, filter):
-        """Append a filter to the search.
+    @property
+    def filtered_element_ids(self):
+        """The positions of the elements that passed the filters, one
+        list for the tree without filters and one list for each filter,
+        so that filtered_element_ids[-1] are the positions of the
+        elements that passed all filters. The lists are read from
+        filter_bitmaps and kept until the bitmap of their filter or the
+        size of the tree change. Assigning a list of position lists
+        replaces filter_bitmaps.
 
-        Parameters
-        ----------
-        filter : str
-            Value to set the fiter.
+        """
+
+        size = len(self.tree)
+        cache = self._filtered_element_lists
+        lists = []
+        for i, bitmap in enumerate(self.filter_bitmaps):
+            if i < len(cache) and cache[i][0] is bitmap and \
+                    cache[i][1] == size:
+                lists.append(cache[i][2])
+            else:
+                lists.append([p for p in _bitmap_positions(bitmap)
+                              if p < size])
+        self._filtered_element_lists = [
+            (bitmap, size, positions)
+            for bitmap, positions in zip(self.filter_bitmaps, lists)]
+        return lists
+
+    @filtered_element_ids.setter
+    def filtered_element_ids(self, element_ids):
+        bitmaps = []
+        for positions in element_ids:
+            bitmap = _new_bitmap(len(self.tree))
+            for i in positions:
+                bitmap[i] = 1
+            bitmaps.append(bitmap)
+        self.filter_bitmaps = bitmaps
+
+    def get_filtered_element_ids(self):
+        """Return the ids of the elements that passed all filters.
+
+        Returns
+        -------
+        ids : array_like
+            The ids of the elements.
 
         """
 
-        self.filters.append(filter)
-        new_filtered_elements = [i
-             for i, e in enumerate(self.tree)
-             if i in self.filtered_element_ids[-1] and
-                filter.element_passes_filter(e)]
-        self.filtered_element_ids.append(new_filtered_elements)
+        return [self._element_id(self.tree[i])
+                for i in self.filtered_element_positions()]
 
     def last_filter(self):
         """Return the latest added filter.
@@ -300,18 +1313,20 @@ class AnnotationTree():
         else:
             return AnnotationTreeFilter(self.data_structure_type)
 
-    def update_last_filter(self, filter):
+    def update_last_filter(self, filter, workers = 1):
         """Update the last filter added.
 
         Parameters
         ----------
         filter : str
             Value to set the fiter.
+        workers : int
+            The number of processes that evaluate the filter.
 
         """
 
         self.pop_filter()
-        self.append_filter(filter)
+        self.append_filter(filter, workers)
 
     def pop_filter(self):
         """Remove and return item at index.
@@ -324,7 +1339,7 @@ class AnnotationTree():
         """
 
         if len(self.filters) > 0:
-            self.filtered_element_ids.pop()
+            self.filter_bitmaps.pop()
             return self.filters.pop()
         return None
 
@@ -334,21 +1349,25 @@ class AnnotationTree():
         """
 
         self.filters = []
-        self.filtered_element_ids = [ range(len(self.tree)) ]
+        self.filter_bitmaps = [ _new_bitmap(len(self.tree), 1) ]
 
-    def reset_filters(self):
+    def reset_filters(self, workers = 1):
         """Reset the filters array.
 
+        Parameters
+        ----------
+        workers : int
+            The number of processes that evaluate the filters.
+
         """
 
-        self.filtered_element_ids = [ range(len(self.tree)) ]
+        self.filter_bitmaps = [ _new_bitmap(len(self.tree), 1) ]
         for filter in self.filters:
-            new_filtered_elements = [i for i, e in enumerate(self.tree)
-                if i in self.filtered_element_ids[-1] and
-                    filter.element_passes_filter(e)]
-            self.filtered_element_ids.append(new_filtered_elements)
+            self.filter_bitmaps.append(
+                self._apply_filter(filter, self.filter_bitmaps[-1], workers))
 
-    def as_html(self, filtered = False, html_frame = True):
+    def as_html(self, filtered = False, html_frame = True, start = 0,
+                stop = None):
         """Return the search result in a html page.
 
         Parameters
@@ -357,43 +1376,115 @@ class AnnotationTree():
             To know if the search if filtered or not.
         html_frame: bool
             Set or not the an html frame.
+        start : int
+            The first of the elements to render.
+        stop : int
+            The element after the last element to render, None for all
+            elements.
 
         Returns
         -------
         html = str
             Html page.
 
+        See Also
+        --------
+        iter_html
+
+        """
+
+        return "".join(self.iter_html(filtered, html_frame, start, stop))
+
+    def write_html(self, file, filtered = False, html_frame = True,
+                   start = 0, stop = None):
+        """Write the search result as a html page to a file, one table
+        after the other.
+
+        Parameters
+        ----------
+        file : file
+            A file-like object with a write method for str.
+        filtered : bool
+            To know if the search if filtered or not.
+        html_frame: bool
+            Set or not the an html frame.
+        start : int
+            The first of the elements to render.
+        stop : int
+            The element after the last element to render, None for all
+            elements.
+
+        See Also
+        --------
+        iter_html
+
+        """
+
+        for chunk in self.iter_html(filtered, html_frame, start, stop):
+            file.write(chunk)
+
+    def iter_html(self, filtered = False, html_frame = True, start = 0,
+                  stop = None):
+        """Return the search result as a html page in chunks: the start
+        of the frame, one table per element and the end of the frame.
+        The elements are rendered while the chunks are consumed, so the
+        first chunks are available at once. start and stop select a
+        page of the rendered elements, which are the elements that pass
+        the filters if filtered is True. The elements of a tree that is
+        mapped from a tree file are read one at a time.
+
+        Parameters
+        ----------
+        filtered : bool
+            To know if the search if filtered or not.
+        html_frame: bool
+            Set or not the an html frame.
+        start : int
+            The first of the elements to render.
+        stop : int
+            The element after the last element to render, None for all
+            elements.
+
+        Returns
+        -------
+        chunks : generator
+            The parts of the html page.
+
         """
 
-        html = ""
         if html_frame:
-            html = "<html><head><meta http-equiv=\"Content-Type\" content=\"text/html; charset=utf-8\" /></head><body>\n"
-        for i, element in enumerate(self.tree):
-            if filtered and i not in self.filtered_element_ids[-1]:
-                continue
-            html += "<table>\n"
-            table = [dict() for _ in range(len(
-                self.data_structure_type.flat_data_hierarchy))]
-            self._element_as_table(
-                element, self.data_structure_type.data_hierarchy, table, 0)
-            #print table
+            yield "<html><head><meta http-equiv=\"Content-Type\" content=\"text/html; charset=utf-8\" /></head><body>\n"
+        if filtered:
+            positions = self.filtered_element_positions()[start:stop]
+        else:
+            positions = range(len(self))[start:stop]
+        flat_data_hierarchy = self.data_structure_type.flat_data_hierarchy
+        layout = _table_layout(self.data_structure_type.data_hierarchy,
+            self.data_structure_type.type_rows)
+        # the parts of the rows that are the same for all elements
+        first_row = "<tr>\n<td rowspan=\"{0}\" class=\"element_id\">".format(
+            len(flat_data_hierarchy))
+        row_starts = ["<td class=\"ann_type\">{0}</td>".format(t)
+                      for t in flat_data_hierarchy]
+        row_starts = ["</td>\n" + row_starts[0]] + \
+            ["<tr>\n" + r for r in row_starts[1:]]
+        cells = ["<td colspan=\"{{1}}\" class=\"{0}\">{{0}}</td>\n".format(
+            t.replace("{", "{{").replace("}", "}}"))
+            for t in flat_data_hierarchy]
+        for i in positions:
+            table = [dict() for _ in flat_data_hierarchy]
+            self._table_columns(self.get_element_at(i), layout, table, 0)
+            html = ["<table>\n", first_row, str(i)]
             for j, row in enumerate(table):
-                html += "<tr>\n"
-                if j == 0:
-                    html += "<td rowspan=\"{0}\" "\
-                            "class=\"element_id\">{1}</td>\n".format(
-                        len(self.data_structure_type.flat_data_hierarchy), i)
-                html += "<td class=\"ann_type\">{0}</td>".format(
-                    self.data_structure_type.flat_data_hierarchy[j])
-                for _, column in sorted(row.items(), key=operator.itemgetter(0)):
-                    html += "<td colspan=\"{0}\" class=\"{2}\">{1}</td>\n".format(
-                        column[1], column[0],
-                        self.data_structure_type.flat_data_hierarchy[j])
-                html += "</tr>\n"
-            html += "</table>\n"
+                html.append(row_starts[j])
+                cell = cells[j]
+                for column in sorted(row):
+                    html.append(cell.format(*row[column]))
+                html.append("</tr>\n")
+            html.append("</table>\n")
+            yield "".join(html)
         if html_frame:
-            html += "</body></html>"
-        return html
+            yield "</body></html>"
 
     def _element_as_table(self, elements, hierarchy, table, column):
         """Insert an element into a table.
@@ -416,34 +1507,371 @@ class AnnotationTree():
 
         """
 
+        layout = _table_layout(hierarchy, self.data_structure_type.type_rows)
+        return self._table_columns(elements, layout, table, column)
+
+    def _table_columns(self, elements, layout, table, column):
+        """Insert an element into a table, with the rows of the
+        annotation types given by a table layout.
+
+        Parameters
+        ----------
+        elements : array_like
+            An array with the elements.
+        layout : tuple
+            The table layout of the data structure hierarchy.
+        table : array_like
+            Table number.
+        column: int
+            Column number.
+
+        Returns
+        -------
+        inserted = int
+            Number of elements inserted.
+
+        See Also
+        --------
+        _table_layout
+
+        """
+
         inserted = 0
-        for i, t in enumerate(hierarchy):
-            if type(t) is list:
+        entries, merge_rows = layout
+        for i, entry in enumerate(entries):
+            if type(entry) is tuple:
                 elements_list = elements[i]
-                for i, e in enumerate(elements_list):
-                    inserted += self._element_as_table(
-                        e, t, table, column + i + inserted)
+                for k, e in enumerate(elements_list):
+                    inserted += self._table_columns(
+                        e, entry, table, column + k + inserted)
                 inserted = inserted + len(elements_list) - 1
-                merge_rows = [ r for r in hierarchy if type(r) is not list]
-                for r in merge_rows:
-                    row = self.data_structure_type.flat_data_hierarchy.index(r)
+                for row in merge_rows:
                     if column in table[row]:
                         table[row][column] = (table[row][column][0], inserted + 1)
                     else:
                         table[row][column] = ("", inserted + 1)
             else:
-                row = self.data_structure_type.flat_data_hierarchy.index(t)
                 a = elements[i]["annotation"]
                 if a == "":
                     a = "&nbsp;"
-                #if (column + 1) > len(table[row]):
-                if column in table[row]:
-                    table[row][column] = (a, table[row][column][1])
+                if column in table[entry]:
+                    table[entry][column] = (a, table[entry][column][1])
                 else:
-                    table[row][column] = (a, 1)
+                    table[entry][column] = (a, 1)
 
         return inserted
 
+def append_filter_to_trees(trees, filters, workers = 1):
+    """Append a filter to each of several annotation trees and evaluate
+    the filters on the elements that passed the previous filters of the
+    trees. With more than one worker the elements of all trees are split
+    into chunks that are evaluated in a pool of processes.
+
+    Parameters
+    ----------
+    trees : array_like
+        The annotation trees.
+    filters : array_like
+        One AnnotationTreeFilter for each tree.
+    workers : int
+        The number of processes that evaluate the filters.
+
+    See Also
+    --------
+    evaluate_filter_jobs
+
+    """
+
+    jobs = []
+    bitmaps = []
+    for tree, filter in zip(trees, filters):
+        bitmap, positions = tree._filter_candidates(
+            filter, tree.filter_bitmaps[-1])
+        bitmaps.append(bitmap)
+        jobs.append((filter, tree.tree, positions))
+
+    results = evaluate_filter_jobs(jobs, workers)
+    for tree, filter, bitmap, passed in zip(trees, filters, bitmaps, results):
+        for i in passed:
+            bitmap[i] = 1
+        tree.filters.append(filter)
+        tree.filter_bitmaps.append(bitmap)
+
+# the elements of the filter jobs, inherited by forked worker processes
+_worker_elements = None
+
+def evaluate_filter_jobs(jobs, workers = 1, chunk_size = None):
+    """Evaluate filters on elements. Each job is a tuple (filter,
+    elements, positions), the filter is evaluated on the elements at the
+    given positions. With more than one worker the positions are split
+    into chunks that are evaluated in a pool of processes; the match
+    spans that the workers found are added to the match objects of the
+    filters in the order of the elements.
+
+    Parameters
+    ----------
+    jobs : array_like
+        A list of tuples (filter, elements, positions).
+    workers : int
+        The number of processes.
+    chunk_size : int
+        The number of elements that are sent to a process at once. By
+        default each process gets about four chunks.
+
+    Returns
+    -------
+    passed : array_like
+        For each job the list of positions of the elements that passed
+        the filter.
+
+    """
+
+    global _worker_elements
+
+    total = sum(len(positions) for _, _, positions in jobs)
+    if workers <= 1 or total < 2:
+        return [ [i for i in positions
+                  if filter.element_passes_filter(elements[i])]
+                 for filter, elements, positions in jobs ]
+
+    if chunk_size is None:
+        chunk_size = max(1, -(-total // (workers * 4)))
+
+    # forked processes inherit the elements, otherwise they are pickled
+    # with each chunk
+    context = _fork_context()
+    tasks = []
+    for j, (filter, elements, positions) in enumerate(jobs):
+        worker_filter = copy.copy(filter)
+        worker_filter.reset_match_object()
+        for k in range(0, len(positions), chunk_size):
+            chunk = positions[k:k + chunk_size]
+            if context is None:
+                tasks.append((worker_filter, j, chunk,
+                              [elements[i] for i in chunk]))
+            else:
+                tasks.append((worker_filter, j, chunk, None))
+
+    if context is None:
+        pool = multiprocessing.Pool(workers)
+    else:
+        _worker_elements = [elements for _, elements, _ in jobs]
+        pool = context.Pool(workers)
+    try:
+        results = pool.map(_evaluate_filter_chunk, tasks)
+    finally:
+        pool.close()
+        pool.join()
+        _worker_elements = None
+
+    passed = [ [] for _ in jobs ]
+    for (_, j, _, _), (chunk_passed, matchobject) in zip(tasks, results):
+        passed[j].extend(chunk_passed)
+        for ann_type, spans in matchobject.items():
+            jobs[j][0].matchobject[ann_type].update(spans)
+    return passed
+
+def _evaluate_filter_chunk(task):
+    """Evaluate a filter on a chunk of elements in a worker process.
+
+    Parameters
+    ----------
+    task : tuple
+        The filter, the index of the job, the positions of the elements
+        and the elements or None if the elements are inherited.
+
+    Returns
+    -------
+    passed : array_like
+        The positions of the elements that passed the filter.
+    matchobject : dict
+        The match spans that the filter found.
+
+    """
+
+    filter, j, positions, elements = task
+    if elements is None:
+        elements = [_worker_elements[j][i] for i in positions]
+    passed = [i for i, e in zip(positions, elements)
+              if filter.element_passes_filter(e)]
+    return passed, filter.matchobject
+
+def _fork_context():
+    """Return the multiprocessing context that forks processes or None
+    if processes cannot be forked.
+
+    """
+
+    if hasattr(multiprocessing, "get_context"):
+        try:
+            return multiprocessing.get_context("fork")
+        except ValueError:
+            return None
+    if sys.platform == "win32":
+        return None
+    return multiprocessing
+
+def _table_layout(hierarchy, rows):
+    """Return the table layout of a data structure hierarchy for
+    AnnotationTree.iter_html: a tuple of the entries of the hierarchy,
+    which are the table rows of the annotation types and the layouts of
+    the sub-hierarchies, and the rows of the annotation types of the
+    hierarchy, whose cells span the columns of a sub-hierarchy.
+
+    Parameters
+    ----------
+    hierarchy : array_like
+        The data structure hierarchy.
+    rows : dict
+        Maps the annotation types to their table rows.
+
+    Returns
+    -------
+    layout : tuple
+        The entries and the rows of the annotation types.
+
+    """
+
+    entries = []
+    merge_rows = []
+    for t in hierarchy:
+        if type(t) is list:
+            entries.append(_table_layout(t, rows))
+        else:
+            entries.append(rows[t])
+            merge_rows.append(rows[t])
+    return (entries, merge_rows)
+
+def _annotation_iterator(path):
+    """Return the compiled generator function that yields the annotations
+    at an access path of the data hierarchy. For the path (1, 0) the
+    function is
+
+        def annotations(elements):
+            for p, e in enumerate(elements):
+                for i1, e1 in enumerate(e[1]):
+                    a = e1[0]
+                    yield (p, (1, i1, 0), a["id"], a["annotation"])
+
+    Parameters
+    ----------
+    path : tuple
+        The access path of an annotation type, see
+        data.DataStructureType.type_paths.
+
+    Returns
+    -------
+    annotations : function
+        The generator function, which takes an iterable of elements.
+
+    """
+
+    if path not in _annotation_iterators:
+        lines = [ "def annotations(elements):",
+                  "    for p, e in enumerate(elements):" ]
+        item = "e"
+        indices = []
+        for depth, index in enumerate(path[:-1], 1):
+            lines.append("{0}for i{1}, e{1} in enumerate({2}[{3}]):".format(
+                "    " * (depth + 1), depth, item, index))
+            item = "e{0}".format(depth)
+            indices.extend([str(index), "i{0}".format(depth)])
+        indent = "    " * (len(path) + 1)
+        indices.append(str(path[-1]))
+        lines.append("{0}a = {1}[{2}]".format(indent, item, path[-1]))
+        lines.append("{0}yield (p, ({1},), a[\"id\"], a[\"annotation\"])".format(
+            indent, ", ".join(indices)))
+        namespace = dict()
+        exec(compile("\n".join(lines), "<annotationtree>", "exec"), namespace)
+        _annotation_iterators[path] = namespace["annotations"]
+    return _annotation_iterators[path]
+
+def _new_bitmap(size, value = 0):
+    """Return a bitmap with one entry per element of a tree. This is a
+    numpy array if numpy is available, otherwise a bytearray.
+
+    Parameters
+    ----------
+    size : int
+        The number of elements.
+    value : int
+        The initial value of all entries, 0 or 1.
+
+    Returns
+    -------
+    bitmap : array_like
+        The bitmap.
+
+    """
+
+    if numpy is not None:
+        if value:
+            return numpy.ones(size, dtype=bool)
+        return numpy.zeros(size, dtype=bool)
+    return bytearray([value]) * size
+
+def _bitmap_positions(bitmap):
+    """Return the positions of all entries that are set in a bitmap.
+
+    Parameters
+    ----------
+    bitmap : array_like
+        The bitmap.
+
+    Returns
+    -------
+    positions : array_like
+        The positions in ascending order.
+
+    """
+
+    if numpy is not None and isinstance(bitmap, numpy.ndarray):
+        return numpy.flatnonzero(bitmap).tolist()
+    positions = []
+    i = bitmap.find(b"\x01")
+    while i != -1:
+        positions.append(i)
+        i = bitmap.find(b"\x01", i + 1)
+    return positions
+
+class _FilterStrings(dict):
+    """
+    The filter strings of a filter for each annotation type. The
+    attribute changed is set by every change of the strings, so that
+    the filter compiles its patterns again only after a change.
+
+    """
+
+    changed = True
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self.changed = True
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.changed = True
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self.changed = True
+
+    def setdefault(self, key, default = None):
+        self.changed = True
+        return dict.setdefault(self, key, default)
+
+    def pop(self, *args):
+        self.changed = True
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self.changed = True
+        return dict.popitem(self)
+
+    def clear(self):
+        dict.clear(self)
+        self.changed = True
+
 class AnnotationTreeFilter():
     """
     AnnotationTreeFilter tree-like structure constructor.
@@ -454,6 +1882,9 @@ class AnnotationTreeFilter():
     """
     (AND, OR)  = range(2)
 
+    # defaults for filters that were pickled by older versions
+    short_circuit = False
+
     def __init__(self, data_structure_type):
         """Class constructor.
 
@@ -466,11 +1897,33 @@ class AnnotationTreeFilter():
         self.filter = dict()
         for e in self.data_structure_type.flat_data_hierarchy:
             self.filter[e] = ""
+        self._update_patterns()
 
         self.reset_match_object()
         self.inverted = False
         self.boolean_operation = self.AND
         self.contained_matches = False
+        self.short_circuit = False
+
+    def __setstate__(self, state):
+        # filters that were pickled by older versions store the filter
+        # strings in a dictionary and have no compiled patterns
+        if "filter" in state:
+            state["_filter"] = _FilterStrings(state.pop("filter"))
+        self.__dict__.update(state)
+
+    @property
+    def filter(self):
+        """The filter strings for each annotation type. The strings may
+        also be set directly in this dictionary.
+
+        """
+
+        return self._filter
+
+    @filter.setter
+    def filter(self, filter):
+        self._filter = _FilterStrings(filter)
 
     def reset_match_object(self):
         """Reset a match object.
@@ -494,6 +1947,77 @@ class AnnotationTreeFilter():
         """
 
         self.filter[ann_type] = filter_string
+        self._update_patterns()
+
+    def _update_patterns(self):
+        """Compile the patterns of the filter strings and prune the
+        hierarchy. The evaluation calls this method only if the filter
+        strings were changed directly in the dictionary filter or the
+        filter was pickled by an older version.
+
+        """
+
+        self._patterns = dict()
+        for ann_type, filter_string in self.filter.items():
+            if filter_string != "":
+                self._patterns[ann_type] = regex.compile(filter_string)
+            else:
+                self._patterns[ann_type] = None
+        self._all_filter_empty = all(
+            f == "" for f in self.filter.values())
+        self._filtered_hierarchy = self._prune_hierarchy(
+            self.data_structure_type.data_hierarchy)
+        # with the AND operation an empty list of sub-annotations fails
+        # the filter, even if there is no filter for its types
+        self._filtered_hierarchy_all = self._prune_hierarchy(
+            self.data_structure_type.data_hierarchy, True)
+        self._filter.changed = False
+
+    def _prune_hierarchy(self, hierarchy, keep_branches = False):
+        """Return the parts of a hierarchy that contain a filter, with
+        the compiled patterns. The annotation types of a level come
+        before its sub-hierarchies, so that they are evaluated first.
+
+        Parameters
+        ----------
+        hierarchy : array_like
+            Structure of the array.
+        keep_branches : bool
+            Keep the sub-hierarchies that contain no filter.
+
+        Returns
+        -------
+        pruned : array_like
+            A list of tuples (index, annotation type, pattern) for the
+            annotation types and (index, None, pruned sub-hierarchy) for
+            the sub-hierarchies.
+
+        """
+
+        types = []
+        branches = []
+        for i, t in enumerate(hierarchy):
+            if type(t) is list:
+                pruned = self._prune_hierarchy(t, keep_branches)
+                if len(pruned) > 0 or keep_branches:
+                    branches.append((i, None, pruned))
+            elif self._patterns[t] is not None:
+                types.append((i, t, self._patterns[t]))
+        return types + branches
+
+    def fingerprint(self):
+        """Return a value that identifies the settings of the filter,
+        for example to cache the results of a search.
+
+        Returns
+        -------
+        fingerprint : tuple
+            The filter strings and the options of the filter.
+
+        """
+
+        return (tuple(sorted(self.filter.items())), self.boolean_operation,
+                self.inverted, self.contained_matches, self.short_circuit)
 
     def set_inverted_filter(self, inverted):
         """Set the inverted value to a filter.
@@ -529,6 +2053,26 @@ class AnnotationTreeFilter():
 
         self.boolean_operation = type
 
+    def set_short_circuit(self, short_circuit):
+        """Set the short-circuit evaluation of the filter. In this mode
+        the evaluation of an element stops as soon as the result of the
+        boolean operation is known, only the parts of the hierarchy that
+        contain a filter are visited and the match spans are only
+        collected if contained matches are requested. The spans for
+        highlighting are collected with collect_matches().
+
+        Parameters
+        ----------
+        short_circuit : bool
+
+        See also
+        --------
+        collect_matches
+
+        """
+
+        self.short_circuit = short_circuit
+
     def element_passes_filter(self, element):
         """Verify if a specific element passes in through a filter.
 
@@ -548,23 +2092,29 @@ class AnnotationTreeFilter():
 
         """
 
+        if self._filter.changed:
+            self._update_patterns()
+
         # is there a filter defined?
-        all_filter_empty = True
-        for ann_type in self.filter.keys():
-            if self.filter[ann_type] != "":
-                all_filter_empty = False
-        if all_filter_empty:
+        if self._all_filter_empty:
             return True
 
         #if self.filter["utterance"] == "" and self.filter["translation"] == "" and self.filter["word"] == "" and self.filter["morpheme"] == "" and self.filter["gloss"] == "":
         #    return True
 
-        if self.boolean_operation == self.AND:
-            passed = True
+        if self.short_circuit and not self.contained_matches:
+            if self.boolean_operation == self.AND:
+                passed = self._passes_all(element,
+                                          self._filtered_hierarchy_all)
+            else:
+                passed = self._passes_any(element, self._filtered_hierarchy)
         else:
-            passed = False
+            if self.boolean_operation == self.AND:
+                passed = True
+            else:
+                passed = False
 
-        passed = self._passes_filter(passed, element, self.data_structure_type.data_hierarchy)
+            passed = self._passes_filter(passed, element, self.data_structure_type.data_hierarchy)
 
         if self.inverted:
             passed = not passed
@@ -604,13 +2154,12 @@ class AnnotationTreeFilter():
                     passed = (passed or local_passes)
             else:
                 passes = False
-                if self.filter[t] != "":
-                    match = regex.search(
-                        self.filter[t], elements[i]["annotation"])
-                    if match:
-                        self.matchobject[t][elements[i]["id"]] = \
-                            [ [m.start(), m.end()] for m in regex.finditer(
-                                self.filter[t], elements[i]["annotation"]) ]
+                pattern = self._patterns[t]
+                if pattern is not None:
+                    spans = [ [m.start(), m.end()] for m in
+                              pattern.finditer(elements[i]["annotation"]) ]
+                    if spans:
+                        self.matchobject[t][elements[i]["id"]] = spans
                         passes = True
                 elif self.boolean_operation == self.AND:
                     passes = True
@@ -622,3 +2171,94 @@ class AnnotationTreeFilter():
 
         return passed
 
+    def _passes_all(self, element, pruned):
+        """Verify if an element passes all filters, with short-circuit
+        evaluation.
+
+        Parameters
+        ----------
+        element : array_like
+            An element or a part of an element of the annotation tree.
+        pruned : array_like
+            The parts of the hierarchy that contain a filter.
+
+        Returns
+        -------
+        passed : bool
+            Passes or not.
+
+        See also
+        --------
+        _prune_hierarchy
+
+        """
+
+        for i, t, p in pruned:
+            if t is None:
+                for e in element[i]:
+                    if self._passes_all(e, p):
+                        break
+                else:
+                    return False
+            elif p.search(element[i]["annotation"]) is None:
+                return False
+        return True
+
+    def _passes_any(self, element, pruned):
+        """Verify if an element passes any filter, with short-circuit
+        evaluation.
+
+        Parameters
+        ----------
+        element : array_like
+            An element or a part of an element of the annotation tree.
+        pruned : array_like
+            The parts of the hierarchy that contain a filter.
+
+        Returns
+        -------
+        passed : bool
+            Passes or not.
+
+        See also
+        --------
+        _prune_hierarchy
+
+        """
+
+        for i, t, p in pruned:
+            if t is None:
+                for e in element[i]:
+                    if self._passes_any(e, p):
+                        return True
+            elif p.search(element[i]["annotation"]) is not None:
+                return True
+        return False
+
+    def collect_matches(self, element, pruned = None):
+        """Add the match spans of all annotations of an element to the
+        match object, for example to highlight the matches of an element
+        that passed a short-circuit evaluation.
+
+        Parameters
+        ----------
+        element : array_like
+            An element or a part of an element of the annotation tree.
+        pruned : array_like
+            The parts of the hierarchy that contain a filter.
+
+        """
+
+        if pruned is None:
+            if self._filter.changed:
+                self._update_patterns()
+            pruned = self._filtered_hierarchy
+        for i, t, p in pruned:
+            if t is None:
+                for e in element[i]:
+                    self.collect_matches(e, p)
+            else:
+                spans = [ [m.start(), m.end()] for m in
+                          p.finditer(element[i]["annotation"]) ]
+                if spans:
+                    self.matchobject[t][element[i]["id"]] = spans
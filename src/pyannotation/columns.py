@@ -0,0 +1,449 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module contains a columnar view of the annotations of an
+annotation tree. For every annotation type of the data structure
+type there is one column with the annotations of this type in
+all elements, in the order of the tree:
+
+* the ids of the annotations, -1 for annotations without id,
+* the row of the parent annotation in the column of the parent
+  type, for the types of the elements themselves the position
+  of the element,
+* the position of the element of each annotation,
+* the annotation values.
+
+The parent type of an annotation type is the first type of the
+level of the hierarchy above it; in the hierarchy
+['utterance', ['word'], 'translation'] the parent of each word
+is an utterance. The ids, parents and element positions are
+stored in contiguous integer arrays, which are copied into NumPy
+arrays with a single copy of their memory.
+
+Scans over one annotation type, for example the evaluation of
+a regular expression on the values of a type, only visit this
+column instead of walking through the elements. When elements
+are inserted, removed or changed only their rows are replaced,
+the rows after them are moved and their element positions and
+parent rows are shifted.
+"""
+
+from __future__ import unicode_literals
+
+import array
+
+import regex
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class AnnotationColumn(object):
+    """
+    The annotations of one annotation type.
+
+    Attributes
+    ----------
+    ann_type : str
+        The annotation type.
+    parent_type : str
+        The annotation type of the parents, None for the types of the
+        elements themselves.
+    ids : array.array
+        The ids of the annotations, -1 for annotations without id.
+    parents : array.array
+        The rows of the parent annotations in the column of the parent
+        type, or the positions of the elements if parent_type is None.
+    elements : array.array
+        The positions of the elements of the annotations.
+    strings : array_like
+        The annotation values.
+
+    """
+
+    def __init__(self, ann_type, parent_type):
+        """Class's constructor.
+
+        Parameters
+        ----------
+        ann_type : str
+            The annotation type.
+        parent_type : str
+            The annotation type of the parents.
+
+        """
+
+        self.ann_type = ann_type
+        self.parent_type = parent_type
+        self.ids = array.array("q")
+        self.parents = array.array("q")
+        self.elements = array.array("q")
+        self.strings = []
+
+    def __len__(self):
+        return len(self.strings)
+
+    def match_rows(self, pattern, rows=None):
+        """Return the rows of the annotations that contain a match of a
+        regular expression.
+
+        Parameters
+        ----------
+        pattern : str
+            The regular expression, or a compiled pattern.
+        rows : array_like
+            The rows to check in ascending order, None to check all
+            rows.
+
+        Returns
+        -------
+        rows : array_like
+            The rows in ascending order.
+
+        """
+
+        search = regex.compile(pattern).search
+        strings = self.strings
+        if rows is None:
+            return [i for i, s in enumerate(strings) if search(s)]
+        return [i for i in rows if search(strings[i])]
+
+    def as_arrays(self):
+        """Return copies of the integer arrays of the column as NumPy
+        arrays.
+
+        Returns
+        -------
+        arrays : tuple
+            The arrays ids, parents and elements.
+
+        Raises
+        ------
+        ImportError
+            If NumPy is not installed.
+
+        """
+
+        if numpy is None:
+            raise ImportError("NumPy is required for the arrays of a column")
+        return tuple(_numpy_copy(a)
+                     for a in (self.ids, self.parents, self.elements))
+
+class AnnotationColumns(object):
+    """
+    The columns of the annotations of the elements of an annotation
+    tree, one column for each annotation type.
+
+    Attributes
+    ----------
+    data_structure_type : data.DataStructureType
+        The data structure type of the elements.
+    columns : dict
+        The AnnotationColumn of each annotation type.
+
+    """
+
+    def __init__(self, data_structure_type):
+        """Class's constructor.
+
+        Parameters
+        ----------
+        data_structure_type : data.DataStructureType
+            The data structure type of the elements.
+
+        """
+
+        self.data_structure_type = data_structure_type
+        self.columns = dict()
+        self._plan = self._level_plan(data_structure_type.data_hierarchy,
+                                      None)
+        # the first row of each column for each element, and the number
+        # of rows after the last element
+        self._starts = dict((t, array.array("q", [0]))
+                            for t in self.columns)
+        # the annotation type and the row of each annotation id; the
+        # rows of the elements from _rows_valid_until on may have moved
+        self._rows = dict()
+        self._rows_valid_until = 0
+
+    def _level_plan(self, hierarchy, parent_type):
+        """Create the columns of a level of the hierarchy and return the
+        plan to add the annotations of the level.
+
+        Parameters
+        ----------
+        hierarchy : array_like
+            A level of the data structure hierarchy.
+        parent_type : str
+            The parent type of the annotation types of the level.
+
+        Returns
+        -------
+        plan : tuple
+            The list of (index, column) of the annotation types and the
+            list of (index, plan) of the sub-hierarchies.
+
+        """
+
+        level_types = [t for t in hierarchy if type(t) is not list]
+        types = []
+        sublevels = []
+        for i, t in enumerate(hierarchy):
+            if type(t) is list:
+                sublevels.append((i, self._level_plan(t, level_types[0])))
+            else:
+                self.columns[t] = AnnotationColumn(t, parent_type)
+                types.append((i, self.columns[t]))
+        return (types, sublevels)
+
+    def __len__(self):
+        """Return the number of elements in the columns.
+
+        """
+
+        return len(self._starts[self._plan[0][0][1].ann_type]) - 1
+
+    def add_element(self, element):
+        """Add the annotations of an element at the end of the columns.
+
+        Parameters
+        ----------
+        element : array_like
+            The element of the annotation tree.
+
+        """
+
+        position = len(self)
+        self._add_level(element, self._plan, position, position)
+        for t, column in self.columns.items():
+            self._starts[t].append(len(column))
+        if self._rows_valid_until == position:
+            self._rows_valid_until = position + 1
+
+    def _add_level(self, entry, plan, parent_row, position):
+        types, sublevels = plan
+        for i, column in types:
+            a = entry[i]
+            if a["id"] is None:
+                column.ids.append(-1)
+            else:
+                self._rows[a["id"]] = (column.ann_type, len(column))
+                column.ids.append(a["id"])
+            column.parents.append(parent_row)
+            column.elements.append(position)
+            column.strings.append(a["annotation"])
+        if len(sublevels) > 0:
+            row = len(types[0][1]) - 1
+            for i, sublevel in sublevels:
+                for e in entry[i]:
+                    self._add_level(e, sublevel, row, position)
+
+    def insert_element(self, position, element):
+        """Insert the annotations of an element before the element at a
+        position.
+
+        Parameters
+        ----------
+        position : int
+            The position of the new element.
+        element : array_like
+            The element of the annotation tree.
+
+        """
+
+        self._splice(position, 0, [element])
+
+    def remove_element(self, position):
+        """Remove the annotations of the element at a position.
+
+        Parameters
+        ----------
+        position : int
+            The position of the element.
+
+        """
+
+        self._splice(position, 1, [])
+
+    def replace_element(self, position, element):
+        """Replace the annotations of the element at a position with the
+        annotations of a changed element.
+
+        Parameters
+        ----------
+        position : int
+            The position of the element.
+        element : array_like
+            The changed element of the annotation tree.
+
+        """
+
+        self._splice(position, 1, [element])
+
+    def _splice(self, position, count, elements):
+        """Replace the rows of count elements from a position on with
+        the rows of other elements. The rows after them are moved, and
+        their element positions and parent rows are shifted.
+
+        Parameters
+        ----------
+        position : int
+            The position of the first element to replace.
+        count : int
+            The number of elements to replace.
+        elements : array_like
+            The new elements.
+
+        """
+
+        new_columns = AnnotationColumns(self.data_structure_type)
+        for element in elements:
+            new_columns.add_element(element)
+        shift = len(elements) - count
+        # the first row and the end of the replaced rows and the change
+        # of the number of rows of each type
+        bounds = dict()
+        for t, column in self.columns.items():
+            first = self._starts[t][position]
+            end = self._starts[t][position + count]
+            bounds[t] = (first, end,
+                         len(new_columns.columns[t]) - (end - first))
+        for t, column in self.columns.items():
+            first, end, row_shift = bounds[t]
+            new_column = new_columns.columns[t]
+            if column.parent_type is None:
+                parent_first, parent_shift = position, shift
+            else:
+                parent_first, _, parent_shift = bounds[column.parent_type]
+            for id_annotation in column.ids[first:end]:
+                self._rows.pop(id_annotation, None)
+            column.ids[first:end] = new_column.ids
+            column.strings[first:end] = new_column.strings
+            column.parents[first:] = (
+                _shifted(new_column.parents, parent_first) +
+                _shifted(column.parents[end:], parent_shift))
+            column.elements[first:] = (
+                _shifted(new_column.elements, position) +
+                _shifted(column.elements[end:], shift))
+            starts = self._starts[t]
+            starts[position:] = (
+                _shifted(new_columns._starts[t][:-1], first) +
+                _shifted(starts[position + count:], row_shift))
+        self._rows_valid_until = min(self._rows_valid_until, position)
+
+    def _update_rows(self):
+        """Update the rows of the annotation ids of the elements whose
+        rows have moved.
+
+        """
+
+        position = self._rows_valid_until
+        for t, column in self.columns.items():
+            ids = column.ids
+            for row in range(self._starts[t][position], len(column)):
+                if ids[row] != -1:
+                    self._rows[ids[row]] = (t, row)
+        self._rows_valid_until = len(self)
+
+    def _row_of_annotation(self, id_annotation):
+        entry = self._rows.get(id_annotation)
+        if entry is not None and \
+                self.columns[entry[0]].ids[entry[1]] == id_annotation:
+            return entry
+        if self._rows_valid_until < len(self):
+            self._update_rows()
+            return self._rows.get(id_annotation)
+        return None
+
+    def set_annotation(self, id_annotation, annotation):
+        """Change the value of an annotation in its column.
+
+        Parameters
+        ----------
+        id_annotation : int
+            Id of an annotation.
+        annotation : str
+            The new value of the annotation.
+
+        Returns
+        -------
+        set_annotation : bool
+            True if the annotation is in the columns.
+
+        """
+
+        entry = self._row_of_annotation(id_annotation)
+        if entry is None:
+            return False
+        ann_type, row = entry
+        self.columns[ann_type].strings[row] = annotation
+        return True
+
+    def filter_candidate_positions(self, filter, positions=None):
+        """Return the positions of the elements that may pass the
+        regular expressions of a filter, without its inversion: with the
+        AND operation the elements that contain a match of each regular
+        expression, with the OR operation the elements that contain a
+        match of any regular expression. Only the rows of the elements
+        at the given positions are checked, for example the candidates
+        of an n-gram index.
+
+        Parameters
+        ----------
+        filter : annotationtree.AnnotationTreeFilter
+            The filter.
+        positions : set
+            The positions of the elements to check, None to check all
+            elements.
+
+        Returns
+        -------
+        positions : set
+            The positions of the candidate elements or None if all
+            elements are candidates.
+
+        """
+
+        if positions is not None:
+            positions = sorted(positions)
+        candidates = None
+        for ann_type, pattern in filter.filter.items():
+            # types that are not in the hierarchy are not evaluated
+            if pattern == "" or ann_type not in self.columns:
+                continue
+            column = self.columns[ann_type]
+            rows = None
+            if positions is not None:
+                starts = self._starts[ann_type]
+                rows = [row for p in positions
+                        for row in range(starts[p], starts[p + 1])]
+            elements = column.elements
+            type_positions = set(
+                elements[i] for i in column.match_rows(pattern, rows))
+            if candidates is None:
+                candidates = type_positions
+            elif filter.boolean_operation == filter.AND:
+                candidates &= type_positions
+            else:
+                candidates |= type_positions
+        if candidates is None and positions is not None:
+            return set(positions)
+        return candidates
+
+def _shifted(integers, offset):
+    if offset == 0:
+        return array.array("q", integers)
+    return array.array("q", [i + offset for i in integers])
+
+def _numpy_copy(integers):
+    # the copy does not keep a buffer of the array, which could not grow
+    # anymore otherwise
+    if len(integers) == 0:
+        return numpy.zeros(0, dtype=numpy.int64)
+    return numpy.frombuffer(integers, dtype=numpy.int64).copy()
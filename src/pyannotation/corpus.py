@@ -17,20 +17,365 @@ work items.
 
 from __future__ import unicode_literals
 
+import sys
+import copy
+import time
+import collections
+import multiprocessing
+
 import pyannotation.data as data
+import pyannotation.treefile as treefile
 import pyannotation.annotationtree as annotationtree
 
 class CorpusTrees():
 
-    def __init__(self, data_structure_type):
-        self.items = []
+    def __init__(self, data_structure_type, max_trees = None,
+                 max_bytes = None):
+        # trees are loaded when they are accessed through items; at most
+        # max_trees trees or max_bytes estimated bytes are kept in memory,
+        # the least recently used trees that were not modified and are
+        # not pinned are dropped
+        self._items = []
+        self.items = CorpusItems(self)
         self.data_structure_type = data_structure_type
+        self.max_trees = max_trees
+        self.max_bytes = max_bytes
+        self._loaded = collections.OrderedDict()
+        self.filters = []
+        self.ngram_index_n = None
+        self.search_cache_size = 16
+        self._search_cache = collections.OrderedDict()
 
     def add_item(self, filepath, filetype):
-        if filetype == data.TREEPICKLE:
-            annotation_tree = annotationtree.AnnotationTree(self.data_structure_type)
-            annotation_tree.load_tree_from_pickle(filepath)
-            annotation_tree.init_filters()
-            self.items.append( (filepath, annotation_tree) )
+        if filetype in (data.TREEPICKLE, data.TREEBINARY):
+            self._items.append(CorpusItem(filepath, filetype))
         else:
             raise data.UnknownFileFormatError()
+
+    def add_items(self, filepaths, filetype, workers = 1):
+        # reads the files in a pool of processes and adds them in the
+        # given order; the trees are loaded at once. Files that cannot be
+        # read are not added, the list of (filepath, error) is returned.
+        tasks = [(filepath, filetype, self.data_structure_type)
+                 for filepath in filepaths]
+        if workers <= 1:
+            results = [_read_tree(task) for task in tasks]
+        else:
+            pool = multiprocessing.Pool(workers)
+            try:
+                results = pool.map(_read_tree, tasks, 1)
+            finally:
+                pool.close()
+                pool.join()
+
+        errors = []
+        for filepath, (result, error) in zip(filepaths, results):
+            if error is None:
+                item = CorpusItem(filepath, filetype)
+                try:
+                    self._load(item, result)
+                except Exception as load_error:
+                    error = load_error
+            if error is not None:
+                errors.append((filepath, error))
+                continue
+            self._items.append(item)
+        return errors
+
+    def _append_tree(self, filepath, annotation_tree):
+        # a tree that is not read from a file is never dropped
+        item = CorpusItem(filepath, None)
+        item.tree = annotation_tree
+        self._items.append(item)
+
+    def _tree_of_item(self, item):
+        if item.tree is None:
+            self._load(item)
+        if item in self._loaded:
+            self._loaded.pop(item)
+            self._loaded[item] = None
+        return item.tree
+
+    def _load(self, item, result = None):
+        # result is the tree that was read by _read_tree; the header and
+        # the journal of a binary file are applied here, so that the
+        # journal is attached to the tree
+        annotation_tree = annotationtree.AnnotationTree(self.data_structure_type)
+        if result is None:
+            _read_tree_file(annotation_tree, item.filepath, item.filetype)
+        elif item.filetype == data.TREEBINARY:
+            header, elements, annotations = result
+            annotation_tree.set_tree_from_binary(item.filepath, header,
+                                                 elements, annotations)
+        else:
+            annotation_tree.tree = result
+        if self.ngram_index_n is not None:
+            annotation_tree.build_ngram_index(self.ngram_index_n)
+        annotation_tree.init_filters()
+        for filter in self.filters:
+            annotation_tree.append_filter(copy.deepcopy(filter))
+        item.tree = annotation_tree
+        item.clean_version = annotation_tree.version
+        if self.max_bytes is not None:
+            item.estimated_bytes = _estimated_bytes(annotation_tree.tree)
+        self._loaded[item] = None
+        self._evict(item)
+
+    def _evict(self, keep = None):
+        # drops the least recently used trees until the limits are met
+        loaded_bytes = sum(item.estimated_bytes for item in self._loaded)
+        for item in list(self._loaded.keys()):
+            if (self.max_trees is None or len(self._loaded) <= self.max_trees) \
+                    and (self.max_bytes is None or loaded_bytes <= self.max_bytes):
+                break
+            if item is keep or item.pinned or item.modified():
+                continue
+            del self._loaded[item]
+            item.tree = None
+            loaded_bytes -= item.estimated_bytes
+
+    def _items_with_filepath(self, filepath):
+        items = [item for item in self._items if item.filepath == filepath]
+        if len(items) == 0:
+            raise KeyError(filepath)
+        return items
+
+    def pin(self, filepath):
+        # a pinned tree is never dropped, for example while it is edited
+        for item in self._items_with_filepath(filepath):
+            item.pinned = True
+
+    def unpin(self, filepath):
+        for item in self._items_with_filepath(filepath):
+            item.pinned = False
+        self._evict()
+
+    def loaded_filepaths(self):
+        return [item.filepath for item in self._items if item.tree is not None]
+
+    def build_ngram_indexes(self, n = 3):
+        # builds an n-gram index for each loaded tree; trees that are
+        # loaded later are indexed when they are loaded
+        self.ngram_index_n = n
+        for item in self._items:
+            if item.tree is not None:
+                item.tree.build_ngram_index(n)
+
+    def init_filters(self):
+        self.filters = []
+        for item in self._items:
+            if item.tree is not None:
+                item.tree.init_filters()
+
+    def append_filter(self, filter, workers = 1):
+        # appends a copy of the filter to each loaded tree; with more than
+        # one worker the elements of all trees are filtered in a process
+        # pool. Trees that are loaded later get the filters when they are
+        # loaded.
+        self.filters.append(filter)
+        trees = [item.tree for item in self._items if item.tree is not None]
+        annotationtree.append_filter_to_trees(
+            trees, [copy.deepcopy(filter) for _ in trees], workers)
+
+    def search(self, filter_chain, limit = None, page_size = 50):
+        # returns a lazy CorpusSearch for the elements of all trees that
+        # pass all filters of the chain
+        return CorpusSearch(self, filter_chain, limit, page_size)
+
+    def _search_cache_for(self, fingerprint):
+        # the cached hits per file of a filter chain; the least recently
+        # used filter chains are dropped
+        if fingerprint in self._search_cache:
+            cache = self._search_cache.pop(fingerprint)
+        else:
+            cache = dict()
+        self._search_cache[fingerprint] = cache
+        while len(self._search_cache) > self.search_cache_size:
+            self._search_cache.popitem(last = False)
+        return cache
+
+    def clear_search_cache(self):
+        self._search_cache.clear()
+
+class CorpusSearch():
+    """
+    The result of a search over the trees of a corpus. Iterating over
+    the search yields tuples (filepath, element id, spans) and evaluates
+    the trees only as far as the hits are consumed. The search stops
+    after limit hits. The hits of a tree are cached for the fingerprint
+    of the filter chain as long as the tree is not changed.
+    """
+
+    def __init__(self, corpus_trees, filter_chain, limit = None,
+                 page_size = 50):
+        self.corpus_trees = corpus_trees
+        self.filter_chain = list(filter_chain)
+        self.fingerprint = tuple(f.fingerprint() for f in self.filter_chain)
+        self.limit = limit
+        self.page_size = page_size
+        # seconds spent in the search of each file
+        self.timings = dict()
+        self._hits = []
+        self._generator = self._search()
+
+    def __iter__(self):
+        i = 0
+        while i < len(self._hits) or self._fetch():
+            yield self._hits[i]
+            i += 1
+
+    def _fetch(self):
+        try:
+            self._hits.append(next(self._generator))
+            return True
+        except StopIteration:
+            return False
+
+    def page(self, number):
+        # returns the hits of a page, pages start with 0
+        end = (number + 1) * self.page_size
+        while len(self._hits) < end and self._fetch():
+            pass
+        return self._hits[number * self.page_size:end]
+
+    def pages(self):
+        number = 0
+        page = self.page(number)
+        while len(page) > 0:
+            yield page
+            number += 1
+            page = self.page(number)
+
+    def _search(self):
+        if self.limit is not None and self.limit <= 0:
+            return
+        cache = self.corpus_trees._search_cache_for(self.fingerprint)
+        count = 0
+        for item in list(self.corpus_trees._items):
+            # the hits of a tree that was not changed since it was read
+            # from its file stay valid when the tree is dropped
+            entry = cache.get(item)
+            if entry is not None and entry[0] == item.state():
+                hits = entry[1]
+                self.timings[item.filepath] = 0.0
+            else:
+                hits = self._search_tree(item, cache)
+            for element_id, spans in hits:
+                yield (item.filepath, element_id, spans)
+                count += 1
+                if self.limit is not None and count >= self.limit:
+                    return
+
+    def _search_tree(self, item, cache):
+        # yields the hits of a tree and caches them once the tree was
+        # searched completely; the timing excludes the time the consumer
+        # spends between the hits
+        filepath = item.filepath
+        annotation_tree = self.corpus_trees._tree_of_item(item)
+        state = item.state()
+        version = annotation_tree.version
+        hits = []
+        seconds = 0.0
+        generator = annotation_tree.search(self.filter_chain)
+        while True:
+            start = time.time()
+            try:
+                hit = next(generator)
+            except StopIteration:
+                seconds += time.time() - start
+                break
+            seconds += time.time() - start
+            self.timings[filepath] = seconds
+            hits.append(hit)
+            yield hit
+        self.timings[filepath] = seconds
+        if annotation_tree.version == version:
+            cache[item] = (state, hits)
+
+class CorpusItem():
+    """
+    A file of a corpus and its tree, if the tree is loaded.
+    """
+
+    def __init__(self, filepath, filetype):
+        self.filepath = filepath
+        self.filetype = filetype
+        self.tree = None
+        self.pinned = False
+        # the version of the tree after it was read from the file; None
+        # if the tree was not read from a file
+        self.clean_version = None
+        self.estimated_bytes = 0
+
+    def modified(self):
+        return self.tree is not None and \
+            (self.clean_version is None or
+             self.tree.version != self.clean_version)
+
+    def state(self):
+        # None as long as the tree is the same as in the file
+        if self.modified():
+            return (id(self.tree), self.tree.version)
+        return None
+
+class CorpusItems():
+    """
+    The list of (filepath, tree) tuples of a corpus. The trees are loaded
+    when they are accessed.
+    """
+
+    def __init__(self, corpus_trees):
+        self.corpus_trees = corpus_trees
+
+    def __len__(self):
+        return len(self.corpus_trees._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        item = self.corpus_trees._items[index]
+        return (item.filepath, self.corpus_trees._tree_of_item(item))
+
+    def __iter__(self):
+        for item in list(self.corpus_trees._items):
+            yield (item.filepath, self.corpus_trees._tree_of_item(item))
+
+    def append(self, filepath_and_tree):
+        self.corpus_trees._append_tree(*filepath_and_tree)
+
+def _read_tree(task):
+    # reads a tree in a worker process and returns the elements, which
+    # are sent back as compact annotation records, or the error; for a
+    # binary file the header, the elements and the annotations of
+    # treefile.read_tree are returned
+    filepath, filetype, data_structure_type = task
+    try:
+        if filetype == data.TREEBINARY:
+            file = open(filepath, "rb")
+            try:
+                return treefile.read_tree(file), None
+            finally:
+                file.close()
+        annotation_tree = annotationtree.AnnotationTree(data_structure_type)
+        _read_tree_file(annotation_tree, filepath, filetype)
+        return annotation_tree.tree, None
+    except Exception as error:
+        return None, error
+
+def _read_tree_file(annotation_tree, filepath, filetype):
+    if filetype == data.TREEPICKLE:
+        annotation_tree.load_tree_from_pickle(filepath)
+    elif filetype == data.TREEBINARY:
+        annotation_tree.load_tree_from_binary(filepath)
+    else:
+        raise data.UnknownFileFormatError(filepath)
+
+def _estimated_bytes(element):
+    # estimates the memory of an element or a list of elements
+    if type(element) is list:
+        return sys.getsizeof(element) + \
+            sum(_estimated_bytes(e) for e in element)
+    try:
+        return sys.getsizeof(element) + sys.getsizeof(element["annotation"])
+    except (TypeError, KeyError, IndexError):
+        return sys.getsizeof(element)
@@ -19,10 +19,25 @@ from __future__ import unicode_literals
 
 import os, glob
 import re
+import multiprocessing
 
 import pyannotation.data as data
+import pyannotation.elan.data
+import pyannotation.toolbox.data
 
 # interlinear types: WORDS means "no interlinear"
+(WORDS, GLOSS, POS) = range(3)
+
+class AnnotationRecords(object):
+    """
+    The utterance records of a parsed file.
+    """
+    def __init__(self, filepath, records):
+        self.filepath = filepath
+        self.records = records
+
+    def getTree(self):
+        return self.records
 
 class CorpusReader(object):
     """
@@ -42,59 +57,43 @@ class CorpusReader(object):
         self.annotationtrees = []
 
     def addFile(self, filepath, filetype, locale = None, participant = None, utterancetierTypes = None, wordtierTypes = None, translationtierTypes = None, morphemetierTypes = None, glosstierTypes = None, postierTypes = None):
-        annotationFileObject = None
-        if filetype == data.EAF:
-            annotationFileObject = EafAnnotationFileObject(filepath)
-        elif filetype == data.EAFFROMTOOLBOX:
-            annotationFileObject = EafFromToolboxAnnotationFileObject(filepath)
-        elif filetype == data.TOOLBOX:
-            annotationFileObject = ToolboxAnnotationFileObject(filepath)
-        if annotationFileObject != None:
-            annotationTierHandler = annotationFileObject.create_tier_handler()
-
-            # create the parser
-            #if self.interlineartype == GLOSS:
-            #  annotationParser = annotationFileObject.create_parser(self.interlineartype)
-            #elif self.interlineartype == WORDS:
-            #  annotationParser = annotationFileObject.create_parser(self.interlineartype)
-
+        errors = self.add_items([filepath], filetype, 1, utterancetierTypes, wordtierTypes, translationtierTypes, morphemetierTypes, glosstierTypes, postierTypes)
+        if len(errors) > 0:
+            raise errors[0][1]
 
-            annotationTree = AnnotationTree(filepath, self.interlineartype)
-
-            if filetype == data.EAF:
-                # Setting the tier types for the parse
-                if utterancetierTypes != None:
-                    annotationTierHandler.setUtterancetierType(utterancetierTypes)
-                elif self.utterancetierTypes != None:
-                    annotationTierHandler.setUtterancetierType(self.utterancetierTypes)
-    
-                if wordtierTypes != None:
-                    annotationTierHandler.setWordtierType(wordtierTypes)
-                elif self.wordtierTypes != None:
-                    annotationTierHandler.setWordtierType(self.wordtierTypes)
-    
-                if morphemetierTypes != None:
-                    annotationTierHandler.setMorphemetierType(morphemetierTypes)
-                elif self.morphemetierTypes != None:
-                    annotationTierHandler.setMorphemetierType(self.morphemetierTypes)
-    
-                if glosstierTypes != None:
-                    annotationTierHandler.setGlosstierType(glosstierTypes)
-                elif self.glosstierTypes != None:
-                    annotationTierHandler.setGlosstierType(self.glosstierTypes)
-    
-                if postierTypes != None:
-                    annotationTierHandler.setPostierType(postierTypes)
-                elif self.postierTypes != None:
-                    annotationTierHandler.setPostierType(self.postierTypes)
-    
-                if translationtierTypes != None:
-                    annotationTierHandler.setTranslationtierType(translationtierTypes)
-                elif self.translationtierTypes != None:
-                    annotationTierHandler.setTranslationtierType(self.translationtierTypes)
+    def add_items(self, filepaths, filetype, workers = 1, utterancetierTypes = None, wordtierTypes = None, translationtierTypes = None, morphemetierTypes = None, glosstierTypes = None, postierTypes = None):
+        """
+        Parses the files in a pool of worker processes and adds them in
+        the given order. Files that cannot be parsed are not added, the
+        list of (filepath, error) tuples is returned.
+        """
+        tierTypes = {
+            "utterance": utterancetierTypes or self.utterancetierTypes,
+            "word": wordtierTypes or self.wordtierTypes,
+            "morpheme": morphemetierTypes or self.morphemetierTypes,
+            "gloss": glosstierTypes or self.glosstierTypes,
+            "pos": postierTypes or self.postierTypes,
+            "translation": translationtierTypes or self.translationtierTypes }
+        tasks = [(filepath, filetype, self.interlineartype, tierTypes)
+                 for filepath in filepaths]
+        if workers <= 1:
+            results = [_parse_annotation_file(task) for task in tasks]
+        else:
+            pool = multiprocessing.Pool(workers)
+            try:
+                results = pool.map(_parse_annotation_file, tasks, 1)
+            finally:
+                pool.close()
+                pool.join()
 
-            annotationTree.parse()
-            self.annotationtrees.append([filepath, annotationTree])
+        errors = []
+        for filepath, (records, error) in zip(filepaths, results):
+            if error is not None:
+                errors.append((filepath, error))
+            else:
+                self.annotationtrees.append(
+                    [filepath, AnnotationRecords(filepath, records)])
+        return errors
 
     def words(self):
         """
@@ -458,3 +457,28 @@ class GlossCorpusReader(CorpusReader):
                     sents.append((words, utterance[3]))
         return sents
 
+def _parse_annotation_file(task):
+    # parses a file in a worker process and returns the utterance
+    # records, or the error
+    filepath, filetype, interlineartype, tierTypes = task
+    try:
+        if filetype == data.EAF:
+            annotationFileObject = pyannotation.elan.data.EafAnnotationFileObject(filepath)
+        elif filetype == data.EAFFROMTOOLBOX:
+            annotationFileObject = pyannotation.elan.data.EafFromToolboxAnnotationFileObject(filepath)
+        elif filetype == data.TOOLBOX:
+            annotationFileObject = pyannotation.toolbox.data.ToolboxAnnotationFileObject(filepath)
+        else:
+            raise data.UnknownFileFormatError(filepath)
+        annotationParser = annotationFileObject.create_parser(interlineartype)
+
+        # Setting the tier types for the parse
+        if filetype == data.EAF:
+            for name, types in tierTypes.items():
+                if types != None:
+                    getattr(annotationParser.tier_handler,
+                            "set_{0}tier_type".format(name))(types)
+
+        return annotationParser.parse(), None
+    except Exception as error:
+        return None, error
@@ -16,20 +16,23 @@ Elan's .eaf files, Kura's .xml file, Toolbox's .txt files etc.
 from __future__ import unicode_literals
 
 import re as regex
+import types
 
 # File types
-(EAF, EAFFROMTOOLBOX, KURA, TOOLBOX, TREEPICKLE) = range(5)
+(EAF, EAFFROMTOOLBOX, KURA, TOOLBOX, TREEPICKLE, TREEBINARY) = range(6)
 
 # Data structure types
 (GLOSS, WORDS, GRAID) = range(3)
 
 class UnknownFileFormatError(Exception): pass
 class NoFileSpecifiedError(Exception): pass
+class ReadOnlyFileError(Exception): pass
 
 # Data structure types
 (WORDS, MORPHSYNT, GRAID) = range(3)
 class UnknownDataStructureTypeError(Exception): pass
 class DataStructureTypeNotSupportedError(Exception): pass
+DataStructureTypeNotSupportedException = DataStructureTypeNotSupportedError
 class UnknownAnnotationTypeError(Exception): pass
 
 class AnnotationFileObject(object):
@@ -111,6 +114,75 @@ class AnnotationFileParserMorphsynt(AnnotationFileParser):
         return ilElement
 
 
+class Annotation(object):
+    """
+    An annotation in an annotation tree, with its id and the
+    annotation string.
+
+    The annotations are stored in slots instead of a dictionary to
+    save memory. For compatibility with trees that contain dictionaries,
+    the fields can also be accessed as items, e.g. a["annotation"], and
+    annotations compare equal to dictionaries with the same values.
+
+    Attributes
+    ----------
+    id : int
+        The id of the annotation.
+    annotation : str
+        The annotation string.
+
+    """
+
+    __slots__ = [ 'id', 'annotation' ]
+
+    def __init__(self, id = None, annotation = ''):
+        self.id = id
+        self.annotation = annotation
+
+    # item access maps to the attributes, unknown keys raise a KeyError
+    # like the dictionaries of older trees
+    def __getitem__(self, key):
+        if key not in Annotation.__slots__:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    __setitem__ = object.__setattr__
+
+    def __eq__(self, other):
+        if isinstance(other, Annotation):
+            return self.id == other.id and self.annotation == other.annotation
+        if isinstance(other, dict):
+            return other == { 'id': self.id, 'annotation': self.annotation }
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "Annotation(id={0!r}, annotation={1!r})".format(
+            self.id, self.annotation)
+
+    def __getstate__(self):
+        return (self.id, self.annotation)
+
+    def __setstate__(self, state):
+        self.id, self.annotation = state
+
+
+# The hierarchy tables of the data structure type classes
+_hierarchy_tables = dict()
+
+_TABLE_NAMES = ("type_rows", "type_depths", "type_siblings", "type_parents",
+                "type_paths")
+
 class DataStructureType(object):
     """
     Data structure type constructor.
@@ -121,6 +193,23 @@ class DataStructureType(object):
         Name of the structure.
     data_hirerarchy : array
         Structure of the array.
+    type_rows : dict
+        Maps each annotation type to its position in
+        flat_data_hierarchy.
+    type_depths : dict
+        Maps each annotation type to its depth in the hierarchy, 0 for
+        the types of the elements themselves.
+    type_siblings : dict
+        Maps each annotation type to the types on the same level of the
+        hierarchy, including the type itself.
+    type_parents : dict
+        Maps each annotation type to the result of get_parents_of_type.
+    type_paths : dict
+        Maps each annotation type to the indices of its annotations in
+        an element: the first index selects an item of the element, each
+        further index an item of every entry of the list above.
+
+    The tables are computed once per class and cannot be changed.
 
     """
 
@@ -133,10 +222,98 @@ class DataStructureType(object):
 
         """
 
-        self.flat_data_hierarchy = self._flatten_hierarchy_elements(
-            self.data_hierarchy)
+        self._set_hierarchy_tables()
+        self.flat_data_hierarchy = list(self.flat_data_hierarchy)
         self.nr_of_types = len(self.flat_data_hierarchy)
 
+    def __getstate__(self):
+        """The read-only tables are not pickled, they are taken from the
+        tables of the class when the object is unpickled.
+
+        """
+
+        state = self.__dict__.copy()
+        for name in _TABLE_NAMES:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self._set_hierarchy_tables()
+        self.__dict__.update(state)
+
+    def _set_hierarchy_tables(self):
+        """Set the tables of the data hierarchy, they are computed for
+        the first object of a class.
+
+        """
+
+        cls = type(self)
+        if cls not in _hierarchy_tables:
+            _hierarchy_tables[cls] = self._hierarchy_tables()
+        (self.flat_data_hierarchy, self.type_rows, self.type_depths,
+            self.type_siblings, self.type_parents,
+            self.type_paths) = _hierarchy_tables[cls]
+
+    def _hierarchy_tables(self):
+        """Compute the tables of the data hierarchy.
+
+        Returns
+        -------
+        tables : tuple
+            The flat data hierarchy as a tuple and the read-only
+            dictionaries type_rows, type_depths, type_siblings,
+            type_parents and type_paths.
+
+        """
+
+        flat_data_hierarchy = tuple(
+            self._flatten_hierarchy_elements(self.data_hierarchy))
+        rows = dict((t, i) for i, t in enumerate(flat_data_hierarchy))
+        depths = dict()
+        siblings = dict()
+        paths = dict()
+        self._hierarchy_levels(self.data_hierarchy, 0, (), depths, siblings,
+                               paths)
+        parents = dict(
+            (t, tuple(self._get_parents_of_type_helper(
+                t, self.data_hierarchy)[1]))
+            for t in flat_data_hierarchy)
+        return (flat_data_hierarchy,) + tuple(
+            types.MappingProxyType(table)
+            for table in (rows, depths, siblings, parents, paths))
+
+    def _hierarchy_levels(self, hierarchy, depth, path, depths, siblings,
+                          paths):
+        """Add the depth, the siblings and the path of the annotation
+        types of a level of the hierarchy to the tables.
+
+        Parameters
+        ----------
+        hierarchy : array_like
+            A level of the data structure hierarchy.
+        depth : int
+            The depth of the level.
+        path : tuple
+            The path of the level in an element.
+        depths : dict
+            The depths of the annotation types.
+        siblings : dict
+            The siblings of the annotation types.
+        paths : dict
+            The paths of the annotation types.
+
+        """
+
+        level = tuple(t for t in hierarchy if type(t) is not list)
+        for i, t in enumerate(hierarchy):
+            if type(t) is list:
+                self._hierarchy_levels(t, depth + 1, path + (i,), depths,
+                                       siblings, paths)
+            else:
+                depths[t] = depth
+                siblings[t] = level
+                paths[t] = path + (i,)
+
     def get_siblings_of_type(self, ann_type):
         """Return all the siblings of a given type in the hierarchy
         including the given type itself.
@@ -159,16 +336,10 @@ class DataStructureType(object):
 
         """
 
-        if ann_type not in self.flat_data_hierarchy:
+        if ann_type not in self.type_siblings:
             raise UnknownAnnotationTypeError
 
-        if ann_type in self.data_hierarchy:
-            return [s for s in self.data_hierarchy if type(s) is str]
-
-        for e in self.data_hierarchy:
-            if type(e) is list:
-                if ann_type in e:
-                    return [s for s in e if type(s) is str]
+        return list(self.type_siblings[ann_type])
 
     def get_parents_of_type(self, ann_type):
         """Returns all the elements that are above a given type in the type
@@ -190,10 +361,10 @@ class DataStructureType(object):
 
         """
 
-        if ann_type not in self.flat_data_hierarchy:
+        if ann_type not in self.type_parents:
             raise UnknownAnnotationTypeError
 
-        return self._get_parents_of_type_helper(ann_type, self.data_hierarchy)[1]
+        return list(self.type_parents[ann_type])
 
     def _get_parents_of_type_helper(self, ann_type, hierarchy):
         """Helper function for get_parents_of_type.
@@ -261,7 +432,7 @@ class DataStructureType(object):
                 l = self._append_list(e)
                 ret.append([l])
             else:
-                ret.append({ 'id': None, 'annotation': '' })
+                ret.append(Annotation())
         return ret
 
     def _flatten_hierarchy_elements(self, elements):
@@ -20,8 +20,17 @@ EafTrees are read-/writeable.
 
 import re
 import operator
+import bisect
+
+try:
+    from sys import intern
+except ImportError:
+    pass
+
+from array import array
 
 import pyannotation.data
+import pyannotation.corpusreader
 
 from copy import deepcopy
 
@@ -32,18 +41,75 @@ from xml.parsers import expat
 ############################################# Builders
 
 class EafAnnotationFileObject(pyannotation.data.AnnotationFileObject):
-
-    def __init__(self, file_path):
+    """
+    Builder for .eaf files.
+
+    By default the file is read with EafPythonic, which is fast but
+    read-only. Set read_only to False to read the file with Eaf, if you
+    want to write the annotations back to a file. A file that was read
+    with EafPythonic is read again with Eaf when the parser or the tier
+    handler change it.
+
+    The parameters tiers and linguistic_types restrict the tiers that are
+    read from the file to the given tier ids and linguistic types and the
+    tiers they descend from through PARENT_REF, which the tier handler
+    needs to find them. A file that was read with a restriction should
+    not be written back, as all other tiers are missing.
+    """
+
+    def __init__(self, file_path, tiers = None, linguistic_types = None,
+                 read_only = True):
+        self.tiers = tiers
+        self.linguistic_types = linguistic_types
+        self.read_only = read_only
+        self.tier_handler = None
         pyannotation.data.AnnotationFileObject.__init__(self, file_path)
 
     @property
-    def file_path(self, file_path):
+    def file_path(self):
         return self._file_path
 
     @file_path.setter
     def file_path(self, file_path):
         self._file_path = file_path
-        self.file = Eaf(file_path)
+        self._file = None
+
+    @property
+    def file(self):
+        # the file is read on first access
+        if self._file is None:
+            self._file = self._read_file()
+        return self._file
+
+    @property
+    def writable_file(self):
+        # the writers and mutators need Eaf
+        if self.read_only:
+            self.read_only = False
+            self._file = None
+        return self.file
+
+    def _read_file(self):
+        tiers, linguistic_types = self._tier_selection()
+        if self.read_only:
+            return EafPythonic(self._file_path, tiers, linguistic_types)
+        return Eaf(self._file_path, tiers, linguistic_types)
+
+    def _tier_selection(self):
+        # the ids of the selected tiers and of their ancestors, the tier
+        # handler looks up the child tiers of the utterance tiers; the
+        # tier attributes are read in a first pass
+        if self.tiers is None and self.linguistic_types is None:
+            return None, None
+        tiers = _tier_attributes(self._file_path)
+        selected = set()
+        for id, (type, parent) in tiers.items():
+            if id in (self.tiers or []) or \
+                    type in (self.linguistic_types or []):
+                while id in tiers and id not in selected:
+                    selected.add(id)
+                    id = tiers[id][1]
+        return [ id for id in tiers if id in selected ], []
 
     def create_tier_handler(self):
         self.tier_handler = EafAnnotationFileTierHandler(self)
@@ -57,7 +123,31 @@ class EafAnnotationFileObject(pyannotation.data.AnnotationFileObject):
         else:
             raise(
                 pyannotation.data.DataStructureTypeNotSupportedException(
-                    "Data structure type {0} not supported".format(type)))
+                    "Data structure type {0} not supported".format(annotation_type)))
+        return self.parser
+
+
+class EafStreamAnnotationFileObject(EafAnnotationFileObject):
+    """
+    Reads .eaf files with EafStreamReader. Only the WORDS data structure
+    type is supported, and the file is read-only.
+    """
+
+    def _read_file(self):
+        return EafStreamReader(self._file_path)
+
+    @property
+    def writable_file(self):
+        raise pyannotation.data.ReadOnlyFileError(
+            "File {0} was opened read-only".format(self._file_path))
+
+    def create_parser(self, annotation_type):
+        if annotation_type == pyannotation.corpusreader.WORDS:
+            self.parser = EafAnnotationFileStreamParser(self, self.create_tier_handler())
+        else:
+            raise(
+                pyannotation.data.DataStructureTypeNotSupportedException(
+                    "Data structure type {0} not supported".format(annotation_type)))
         return self.parser
 
 
@@ -75,6 +165,13 @@ class EafFromToolboxAnnotationFileObject(pyannotation.data.AnnotationFileObject)
         self._file_path = file_path
         self.file = EafPythonic(file_path)
 
+    @property
+    def writable_file(self):
+        # the writers and mutators need Eaf
+        if not isinstance(self.file, Eaf):
+            self.file = Eaf(self._file_path)
+        return self.file
+
     def create_tier_handler(self):
         #if self.tier_handler == None:
         self.tier_handler = EafAnnotationFileTierHandler(self)
@@ -92,7 +189,7 @@ class EafFromToolboxAnnotationFileObject(pyannotation.data.AnnotationFileObject)
         else:
             raise(
                 pyannotation.data.DataStructureTypeNotSupportedException(
-                    "Data structure type {0} not supported".format(type)))
+                    "Data structure type {0} not supported".format(annotation_type)))
         return self.parser
 
 
@@ -100,7 +197,7 @@ class EafAnnotationFileTierHandler(pyannotation.data.AnnotationFileTierHandler):
 
     def __init__(self, annotation_file_object):
         #pyannotation.data.AnnotationFileTierHandler.__init__(self, annotation_file_object)
-        self.eaf = annotation_file_object.file
+        self.annotation_file_object = annotation_file_object
         self.UTTERANCETIER_TYPEREFS = [ "utterance", "utterances", "Äußerung", "Äußerungen" ]
         self.WORDTIER_TYPEREFS = [ "words", "word", "Wort", "Worte", "Wörter" ]
         self.MORPHEMETIER_TYPEREFS = [ "morpheme", "morphemes",  "Morphem", "Morpheme" ]
@@ -111,6 +208,10 @@ class EafAnnotationFileTierHandler(pyannotation.data.AnnotationFileTierHandler):
         self.GRAID2TIER_TYPEREFS = [ "graid2" ]
         self.TRANSLATIONTIER_TYPEREFS = [ "translation", "translations", "Übersetzung",  "Übersetzungen" ]
 
+    @property
+    def eaf(self):
+        return self.annotation_file_object.file
+
     def set_utterancetier_type(self, type):
         if isinstance(type, list):
             self.UTTERANCETIER_TYPEREFS = type
@@ -221,9 +322,10 @@ class EafAnnotationFileTierHandler(pyannotation.data.AnnotationFileTierHandler):
 
     def add_tier(self, tier_id, tier_type, tier_type_constraint, parent_tier,
                  tier_default_locale, tier_participant):
-        self.eaf.addTier(tier_id, tier_type, parent_tier, tier_default_locale, tier_participant)
-        if not self.eaf.hasLinguisticType(tier_type):
-            self.eaf.addLinguisticType(tier_type, tier_type_constraint)
+        eaf = self.annotation_file_object.writable_file
+        eaf.addTier(tier_id, tier_type, parent_tier, tier_default_locale, tier_participant)
+        if not eaf.hasLinguisticType(tier_type):
+            eaf.addLinguisticType(tier_type, tier_type_constraint)
 
     def get_locale_for_tier(self, id_tier):
         return self.eaf.getLocaleForTier(id_tier)
@@ -236,19 +338,25 @@ class EafAnnotationFileParser(pyannotation.data.AnnotationFileParser):
 
     def __init__(self, annotation_file_object, annotation_file_tiers):
         pyannotation.data.AnnotationFileParser.__init__(self, annotation_file_object, annotation_file_tiers)
+        self.annotation_file_object = annotation_file_object
         self.tier_handler = annotation_file_tiers
         self.eaf = annotation_file_object.file
         self.last_used_annotation_id = self.eaf.getLastUsedAnnotationId()
         self.empty_il_element = [ '', '', '' ]
 
+    def _writable_eaf(self):
+        # the file is read again with Eaf if it was opened read-only
+        self.eaf = self.annotation_file_object.writable_file
+        return self.eaf
+
     def remove_annotation_with_id(self, id_annotation):
-        self.eaf.removeAnnotationWithId(id_annotation)
+        self._writable_eaf().removeAnnotationWithId(id_annotation)
 
     def remove_annotations_with_ref(self, id_ref_ann):
-        self.eaf.removeAnnotationsWithRef(id_ref_ann)
+        self._writable_eaf().removeAnnotationsWithRef(id_ref_ann)
 
     def updatePrevAnnotationForAnnotation(self, id_annotation, id_prev_ann = None):
-        self.eaf.updatePrevAnnotationForAnnotation(id_annotation, id_prev_ann)
+        self._writable_eaf().updatePrevAnnotationForAnnotation(id_annotation, id_prev_ann)
 
     def _utterances_ids(self):
         utterance_tier_ids = self.tier_handler.get_utterancetier_ids()
@@ -302,6 +410,17 @@ class EafAnnotationFileParser(pyannotation.data.AnnotationFileParser):
 
         return tree
 
+class EafAnnotationFileStreamParser(EafAnnotationFileParser):
+
+    def records(self):
+        """Returns a generator of the utterance records, the file is read
+        while the records are consumed.
+        """
+        return self.eaf.utterance_records(self.tier_handler, self.empty_il_element)
+
+    def parse(self):
+        return list(self.records())
+
 class EafAnnotationFileParserMorphsynt(pyannotation.data.AnnotationFileParserMorphsynt, EafAnnotationFileParser):
 
     def __init__(self, annotation_file_object, annotation_file_tiers):
@@ -331,7 +450,7 @@ class EafAnnotationFileParserMorphsynt(pyannotation.data.AnnotationFileParserMor
         morpheme = self.eaf.getAnnotationValueForAnnotation(m_tier, m_id)
         morpheme = re.sub(r'^-', '', morpheme)
         morpheme = re.sub(r'-$', '', morpheme)
-        ilelement.append(morph_id)
+        ilelement.append(m_id)
         ilelement.append(morpheme)
         func_elements = []
         gloss_tier_ids = self.tier_handler.get_glosstier_ids(m_tier)
@@ -361,7 +480,7 @@ class EafAnnotationFileParserMorphsynt(pyannotation.data.AnnotationFileParserMor
 
     def get_file(self, tree, tier_utterances, tier_words, tier_morphemes, tier_glosses, tier_translations):
         # make local copy of eaf
-        eaf2 = deepcopy(self.eaf)
+        eaf2 = deepcopy(self._writable_eaf())
         utterances = [[u[0], u[1]] for u in tree if u[6] == tier_utterances]
         translations = [[u[3][0], u[0]] for u in tree if u[6] == tier_utterances and len(u[3][0])>=1]
         words = [[w[0], w[1]] for u in tree if u[6] == tier_utterances for w in u[2]]
@@ -517,10 +636,228 @@ class EafAnnotationFileParserGraid(EafAnnotationFileParser):
 
 ####################################### Files
 
+def _ref_annotation_chain(ids_by_prev, prevAnn):
+    # orders ref annotations of the same parent annotation: first the
+    # ones that follow prevAnn, then the chains that follow those
+    ret = []
+    foundann = ids_by_prev.get(prevAnn, [])
+    ret.extend(foundann)
+    for id in foundann:
+        ret.extend(_ref_annotation_chain(ids_by_prev, id))
+    return ret
+
+def _tier_attributes(file):
+    # returns the linguistic type and the parent of each tier, in
+    # document order, without reading the annotations
+    tiers = {}
+    def start_element(name, attributes):
+        if name == 'TIER':
+            tiers[attributes.get('TIER_ID')] = (
+                attributes.get('LINGUISTIC_TYPE_REF'),
+                attributes.get('PARENT_REF'))
+    parser = expat.ParserCreate("utf-8")
+    parser.buffer_text = True
+    parser.StartElementHandler = start_element
+    if hasattr(file, 'read'):
+        parser.ParseFile(file)
+        file.seek(0)
+    else:
+        f = open(file, "rb")
+        try:
+            parser.ParseFile(f)
+        finally:
+            f.close()
+    return tiers
+
+class TimeOrder(object):
+    """
+    The time slots of an .eaf file, stored in the order of the TIME_ORDER
+    element. Slot ids are mapped to their index once, the millisecond
+    values are kept in a compact integer array. Unaligned time slots get
+    the value of the last aligned time slot before them.
+    """
+
+    def __init__(self):
+        self.slot_indexes = {}
+        self.values = array('q')
+        self.aligned = bytearray()
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, idTs, value = None):
+        self.slot_indexes[idTs] = len(self.values)
+        if value is None:
+            if self.values:
+                self.values.append(self.values[-1])
+            else:
+                self.values.append(0)
+            self.aligned.append(0)
+        else:
+            self.values.append(int(value))
+            self.aligned.append(1)
+
+    def value(self, idTs):
+        return self.values[self.slot_indexes[idTs]]
+
+    def isAligned(self, idTs):
+        return self.aligned[self.slot_indexes[idTs]] == 1
+
+    def key(self, idTs):
+        # sort key of a time slot: its time value, then its position in
+        # TIME_ORDER for unaligned time slots. Aligned time slots with the
+        # same value are equal and come before the unaligned ones.
+        i = self.slot_indexes[idTs]
+        if self.aligned[i]:
+            return (self.values[i], -1)
+        return (self.values[i], i)
+
+    def end_key(self, idTs):
+        # upper bound of a time slot in the containment queries: an
+        # aligned time slot includes all time slots with the same value
+        i = self.slot_indexes[idTs]
+        if self.aligned[i]:
+            return (self.values[i], len(self.values))
+        return (self.values[i], i)
+
+
 class Eaf(object):
+    """
+    Low level API to .eaf files, based on ElementTree.
+
+    All tiers, linguistic types and annotations are indexed once when the
+    file is loaded, so the getters do not have to search the whole
+    document. The methods that change the document keep the indexes
+    up to date.
+    """
+
+    def __init__(self, file, tiers = None, linguistic_types = None):
+        if tiers is None and linguistic_types is None:
+            self.tree = ET.parse(file)
+        else:
+            self.tree = self._parse_selected_tiers(
+                file, tiers or [], linguistic_types or [])
+        self._build_index()
+
+    def _parse_selected_tiers(self, file, tiers, linguistic_types):
+        # reads only the tiers with the given ids or linguistic types,
+        # the annotations of all other tiers are dropped while parsing
+        root = None
+        skipped_tier = None
+        for event, elem in ET.iterparse(file, ('start', 'end')):
+            if root is None:
+                root = elem
+            if event == 'start':
+                if elem.tag == 'TIER' and \
+                        elem.attrib.get('TIER_ID') not in tiers and \
+                        elem.attrib.get('LINGUISTIC_TYPE_REF') not in linguistic_types:
+                    skipped_tier = elem
+            elif skipped_tier is not None:
+                if elem is skipped_tier:
+                    root.remove(elem)
+                    skipped_tier = None
+                elif elem.tag == 'ANNOTATION':
+                    skipped_tier.remove(elem)
+        return ET.ElementTree(root)
+
+    def __deepcopy__(self, memo):
+        eaf = Eaf.__new__(Eaf)
+        memo[id(self)] = eaf
+        eaf.tree = deepcopy(self.tree, memo)
+        eaf._build_index()
+        return eaf
+
+    def _build_index(self):
+        self._build_time_slot_index()
+        self._build_tier_index()
+        self._interval_index = {}
+        self._annotation_elements = {}
+        self._ref_annotation_ids_by_tier_and_ref = {}
+        for tier in self.tree.findall('TIER'):
+            idTier = tier.attrib['TIER_ID']
+            for eAnnotation in tier.findall('ANNOTATION'):
+                self._index_annotation(idTier, eAnnotation)
+
+    def _build_time_slot_index(self):
+        self.time_order = TimeOrder()
+        for ts in self.tree.findall('TIME_ORDER/TIME_SLOT'):
+            self.time_order.append(
+                ts.attrib['TIME_SLOT_ID'], ts.attrib.get('TIME_VALUE'))
+
+    def _interval_index_for_tier(self, idTier):
+        # returns the alignable annotations of a tier as three parallel
+        # lists (start keys, end keys, ids), sorted by start time
+        index = self._interval_index.get(idTier)
+        if index is None:
+            intervals = []
+            t = self._tier_elements.get(idTier)
+            if t is not None:
+                for a in t.findall("ANNOTATION/ALIGNABLE_ANNOTATION"):
+                    intervals.append((
+                        self.time_order.key(a.attrib['TIME_SLOT_REF1']),
+                        self.time_order.key(a.attrib['TIME_SLOT_REF2']),
+                        a.attrib['ANNOTATION_ID']))
+            intervals.sort(key=operator.itemgetter(0))
+            index = ([ i[0] for i in intervals ],
+                     [ i[1] for i in intervals ],
+                     [ i[2] for i in intervals ])
+            self._interval_index[idTier] = index
+        return index
+
+    def _alignable_annotation_ids_between(self, idTier, start, end):
+        starts, ends, ids = self._interval_index_for_tier(idTier)
+        ret = []
+        for i in range(bisect.bisect_left(starts, start), len(starts)):
+            if starts[i] > end:
+                break
+            if ends[i] <= end:
+                ret.append(ids[i])
+        return ret
 
-    def __init__(self, file):
-        self.tree = ET.parse(file)
+    def annotations_in_range(self, tier_id, start_ms, end_ms):
+        """Returns the ids of all alignable annotations of a tier that lie
+        between start_ms and end_ms, sorted by their start time.
+        """
+        return self._alignable_annotation_ids_between(
+            tier_id, (start_ms, -1), (end_ms, len(self.time_order)))
+
+    def _build_tier_index(self):
+        self._tier_elements = {}
+        self._tier_ids_by_linguistic_type = {}
+        self._linguistic_type_elements = {}
+        for lt in self.tree.findall('LINGUISTIC_TYPE'):
+            self._linguistic_type_elements[lt.attrib['LINGUISTIC_TYPE_ID']] = lt
+        for tier in self.tree.findall('TIER'):
+            idTier = tier.attrib['TIER_ID']
+            self._tier_elements[idTier] = tier
+            type = tier.attrib.get('LINGUISTIC_TYPE_REF')
+            self._tier_ids_by_linguistic_type.setdefault(type, []).append(idTier)
+
+    def _index_annotation(self, idTier, eAnnotation):
+        for a in eAnnotation:
+            idAnn = a.attrib['ANNOTATION_ID']
+            self._annotation_elements[idAnn] = (idTier, eAnnotation, a)
+            if a.tag == 'REF_ANNOTATION':
+                key = (idTier, a.attrib['ANNOTATION_REF'])
+                self._ref_annotation_ids_by_tier_and_ref.setdefault(key, []).append(idAnn)
+
+    def _unindex_annotation(self, idAnn):
+        idTier, eAnnotation, a = self._annotation_elements.pop(idAnn)
+        if a.tag == 'REF_ANNOTATION':
+            key = (idTier, a.attrib['ANNOTATION_REF'])
+            ids = self._ref_annotation_ids_by_tier_and_ref[key]
+            ids.remove(idAnn)
+            if not ids:
+                del(self._ref_annotation_ids_by_tier_and_ref[key])
+        return idTier, eAnnotation, a
+
+    def _annotation_element(self, idTier, idAnnotation, tag):
+        # returns the ALIGNABLE_ANNOTATION or REF_ANNOTATION element with
+        # the given id, if it exists in the given tier
+        entry = self._annotation_elements.get(idAnnotation)
+        if entry is None or entry[0] != idTier or entry[2].tag != tag:
+            return None
+        return entry[2]
 
     def tostring(self):
         return ET.tostring(self.tree.getroot(), encoding="utf-8")
@@ -528,13 +865,14 @@ class Eaf(object):
     def tiers(self):
         # returns tiers as dictionary: id -> type
         ret = {}
-        for tier in self.tree.findall('TIER'):
-            ret[tier.attrib['TIER_ID']] = tier.attrib['LINGUISTIC_TYPE_REF']
+        for id, tier in self._tier_elements.items():
+            ret[id] = tier.attrib['LINGUISTIC_TYPE_REF']
         return ret
-        
+
     def childTiersFor(self,  id):
         ret = {}
-        childTiers = self.tree.findall("TIER[@PARENT_REF='%s']" % id)
+        childTiers = [ tier for tier in self._tier_elements.values()
+                       if tier.attrib.get('PARENT_REF') == id ]
         for tier in childTiers:
             child_id = tier.attrib['TIER_ID']
             if child_id not in ret.keys():
@@ -570,15 +908,7 @@ class Eaf(object):
         if strId != None:
             lastId = int(strId)
         else:
-            annotations = self.tree.findall("TIER/ANNOTATION/ALIGNABLE_ANNOTATION")
-            for a in annotations:
-                i = a.attrib['ANNOTATION_ID']
-                i = int(re.sub(r"\D", "", i))
-                if i > lastId:
-                    lastId = i
-            annotations = self.tree.findall("TIER/ANNOTATION/REF_ANNOTATION")
-            for a in annotations:
-                i = a.attrib['ANNOTATION_ID']
+            for i in self._annotation_elements:
                 i = int(re.sub(r"\D", "", i))
                 if i > lastId:
                     lastId = i
@@ -586,36 +916,34 @@ class Eaf(object):
 
     def getTierIdsForLinguisticType(self, type, parent = None):
         ret = []
-        if parent == None:
-            tiers = self.tree.findall("TIER[@LINGUISTIC_TYPE_REF='%s']" % type) #.decode('utf-8')
-        else:
-            tiers = self.tree.findall("TIER[@LINGUISTIC_TYPE_REF='%s'][@PARENT_REF='%s']" % (type, parent)) #.decode('utf-8')
-        for tier in tiers:
-            ret.append(tier.attrib['TIER_ID'])
+        for id in self._tier_ids_by_linguistic_type.get(type, []):
+            if parent == None or \
+                    self._tier_elements[id].attrib.get('PARENT_REF') == parent:
+                ret.append(id)
         return ret
 
     def getParameterDictForTier(self, id):
-        tier = self.tree.find("TIER[@TIER_ID='%s']" % id)
+        tier = self._tier_elements.get(id)
         return tier.attrib
-        
+
     def getParameterDictForLinguisticType(self, id):
-        tier = self.tree.find("LINGUISTIC_TYPE[@LINGUISTIC_TYPE_ID='%s']" % id)
+        tier = self._linguistic_type_elements.get(id)
         return tier.attrib
 
     def getLinguisticTypeForTier(self, id):
-        tier = self.tree.find("TIER[@TIER_ID='%s']" % id)
+        tier = self._tier_elements.get(id)
         if 'LINGUISTIC_TYPE_REF' in tier.attrib:
             return tier.attrib['LINGUISTIC_TYPE_REF']
         return None
-        
+
     def getConstraintForLinguisticType(self, id):
-        tier = self.tree.find("LINGUISTIC_TYPE[@LINGUISTIC_TYPE_ID='%s']" % id)
+        tier = self._linguistic_type_elements.get(id)
         if 'CONSTRAINTS' in tier.attrib:
             return tier.attrib['CONSTRAINTS']
         return None
-        
+
     def linguisticTypeIsTimeAlignable(self, id):
-        tier = self.tree.find("LINGUISTIC_TYPE[@LINGUISTIC_TYPE_ID='%s']" % id)
+        tier = self._linguistic_type_elements.get(id)
         if 'TIME_ALIGNABLE' in tier.attrib:
             if tier.attrib['TIME_ALIGNABLE'] == 'true':
                 return True
@@ -636,16 +964,16 @@ class Eaf(object):
 
     def getLocaleForTier(self, id):
         locale = ''
-        tier = self.tree.find("TIER[@TIER_ID='%s']" % id)
+        tier = self._tier_elements.get(id)
         if 'DEFAULT_LOCALE' in tier.attrib:
             locale = tier.attrib['DEFAULT_LOCALE']
             if locale == None:
                 locale = ''
         return locale
-        
+
     def getParticipantForTier(self, id):
         participant = ''
-        tier = self.tree.find("TIER[@TIER_ID='%s']" % id)
+        tier = self._tier_elements.get(id)
         if 'PARTICIPANT' in tier.attrib:
             participant = tier.attrib['PARTICIPANT']
             if participant == None:
@@ -669,13 +997,10 @@ class Eaf(object):
             newtype.attrib['EXT_REF'] = extRef
         newIndex = self.getIndexOfLastLinguisticType()
         self.tree.getroot().insert(newIndex, newtype)
+        self._linguistic_type_elements[type] = newtype
 
     def hasLinguisticType(self, type):
-        node = self.tree.find("LINGUISTIC_TYPE[@LINGUISTIC_TYPE_ID='%s']" % type)
-        if node == None:
-            return False
-        else:
-            return True
+        return type in self._linguistic_type_elements
 
     def addTier(self,  id,  type,  parent = None, defaultLocale = None,  participant = ''):
         newtier = Element("TIER")
@@ -691,18 +1016,35 @@ class Eaf(object):
             i = self.getIndexOfTier(parent)
             if i != None:
                 newIndex = i
-        self.tree.getroot().insert(newIndex, newtier)                
+        self.tree.getroot().insert(newIndex, newtier)
+        # tier order in the index follows document order
+        self._build_tier_index()
 
     def getStartTsForAnnotation(self,  idTier,  idAnnotation):
-        a = self.tree.find("TIER[@TIER_ID='%s']/ANNOTATION/ALIGNABLE_ANNOTATION[@ANNOTATION_ID='%s']" % (idTier,  idAnnotation))
+        a = self._annotation_element(idTier, idAnnotation, 'ALIGNABLE_ANNOTATION')
         ret = a.attrib['TIME_SLOT_REF1']
         return ret
 
     def getEndTsForAnnotation(self,  idTier,  idAnnotation):
-        a = self.tree.find("TIER[@TIER_ID='%s']/ANNOTATION/ALIGNABLE_ANNOTATION[@ANNOTATION_ID='%s']" % (idTier,  idAnnotation))
+        a = self._annotation_element(idTier, idAnnotation, 'ALIGNABLE_ANNOTATION')
         ret = a.attrib['TIME_SLOT_REF2']
         return ret
 
+    def getTimeValueForTimeSlot(self, idTs):
+        return self.time_order.value(idTs)
+
+    def getStartTimeForAnnotation(self, idTier, idAnnotation):
+        return self.time_order.value(
+            self.getStartTsForAnnotation(idTier, idAnnotation))
+
+    def getEndTimeForAnnotation(self, idTier, idAnnotation):
+        return self.time_order.value(
+            self.getEndTsForAnnotation(idTier, idAnnotation))
+
+    def getDurationForAnnotation(self, idTier, idAnnotation):
+        return self.getEndTimeForAnnotation(idTier, idAnnotation) - \
+            self.getStartTimeForAnnotation(idTier, idAnnotation)
+
     def getSubAnnotationIdsForAnnotationInTier(self, idAnn, idTier, idSubTier):
         type = self.getLinguisticTypeForTier(idSubTier)
         ret = []
@@ -724,36 +1066,31 @@ class Eaf(object):
         return ret
 
     def getRefAnnotationIdForAnnotationId(self, idTier, idAnnotation):
-        a = self.tree.find( "TIER[@TIER_ID='%s']/ANNOTATION/REF_ANNOTATION[@ANNOTATION_ID='%s']" % (idTier, idAnnotation) )
+        a = self._annotation_element(idTier, idAnnotation, 'REF_ANNOTATION')
         if a is not None:
             return a.attrib["ANNOTATION_REF"]
         else:
             return None
-        
+
     def getRefAnnotationIdsForTier(self, idTier, annRef = None,  prevAnn = None):
         ret = []
-        foundann = []
-        prevs = {}
         if annRef == None:
-            allAnnotations = self.tree.findall("TIER[@TIER_ID='%s']/ANNOTATION/REF_ANNOTATION" % idTier)
-            for a in allAnnotations:
-                ret.append(a.attrib['ANNOTATION_ID'])
+            t = self._tier_elements.get(idTier)
+            if t is not None:
+                for a in t.findall("ANNOTATION/REF_ANNOTATION"):
+                    ret.append(a.attrib['ANNOTATION_ID'])
         else:
-            if prevAnn == None:
-                allAnnotations = self.tree.findall("TIER[@TIER_ID='%s']/ANNOTATION/REF_ANNOTATION[@ANNOTATION_REF='%s']" % (idTier, annRef))
-            else:
-                allAnnotations = self.tree.findall("TIER[@TIER_ID='%s']/ANNOTATION/REF_ANNOTATION[@ANNOTATION_REF='%s'][@PREVIOUS_ANNOTATION='%s']" % (idTier, annRef, prevAnn))
-            for a in allAnnotations:
-                if prevAnn == None and 'PREVIOUS_ANNOTATION' in a.attrib:
-                    continue
-                ret.append(a.attrib['ANNOTATION_ID'])
-                foundann.append(a.attrib['ANNOTATION_ID'])
-            for id in foundann:
-                ret.extend(self.getRefAnnotationIdsForTier(idTier, annRef,  id))
+            # group the annotations that refer to annRef by their previous
+            # annotation and follow the chains from prevAnn
+            ids_by_prev = {}
+            for id in self._ref_annotation_ids_by_tier_and_ref.get((idTier, annRef), []):
+                a = self._annotation_elements[id][2]
+                ids_by_prev.setdefault(a.attrib.get('PREVIOUS_ANNOTATION'), []).append(id)
+            ret = _ref_annotation_chain(ids_by_prev, prevAnn)
         return ret
 
     def appendRefAnnotationToTier(self, idTier, idAnnotation, strAnnotation, annRef, prevAnn = None):
-        t = self.tree.find("TIER[@TIER_ID='%s']" % idTier)
+        t = self._tier_elements.get(idTier)
         if t == None:
             return False
         eAnnotation = Element("ANNOTATION")
@@ -764,65 +1101,49 @@ class Eaf(object):
         eAnnVal = ET.SubElement(eRefAnn, "ANNOTATION_VALUE")
         eAnnVal.text = strAnnotation
         t.append(eAnnotation)
+        self._index_annotation(idTier, eAnnotation)
         return True
 
     def getAlignableAnnotationIdsForTier(self, id, startTs = None,  endTs = None):
-        ret = []
-        ts = {}
         if startTs != None and endTs != None:
-            iStartTs = int(re.sub(r"\D", '', startTs))
-            iEndTs = int(re.sub(r"\D", '', endTs))
-        allAnnotations = self.tree.findall("TIER[@TIER_ID='%s']/ANNOTATION/ALIGNABLE_ANNOTATION" % id)
-        for a in allAnnotations:
-            aStartTs = a.attrib['TIME_SLOT_REF1']
-            aEndTs = a.attrib['TIME_SLOT_REF2']
-            iAStartTs = int(re.sub(r"\D", '', aStartTs))
-            iAEndTs = int(re.sub(r"\D", '', aEndTs))
-            if startTs != None and endTs != None:
-                if iStartTs > iAStartTs or iEndTs < iAEndTs:
-                    continue
-            id = None
-            v = []
-            id = a.attrib['ANNOTATION_ID']
-            if id:
-                ts[id] = iAStartTs
-        # sort ids via start timestamp
-        alist = sorted(ts.items(), key=operator.itemgetter(1))
-        for k, v in alist:
-            ret.append(k)
-        return ret
+            return self._alignable_annotation_ids_between(
+                id, self.time_order.key(startTs), self.time_order.end_key(endTs))
+        return list(self._interval_index_for_tier(id)[2])
 
     def removeAllAnnotationsFromTier(self, idTier):
-        t = self.tree.find("TIER[@TIER_ID='%s']" % idTier)
-        annotations = self.tree.findall("TIER[@TIER_ID='%s']/ANNOTATION" % idTier)
-        if t == None or annotations == None:
+        t = self._tier_elements.get(idTier)
+        if t == None:
             return False
+        annotations = t.findall("ANNOTATION")
+        self._interval_index.pop(idTier, None)
         for a in annotations:
+            for e in a:
+                self._unindex_annotation(e.attrib['ANNOTATION_ID'])
             t.remove(a)
         return True
 
     def removeAnnotationWithId(self, idAnnotation):
-        a = self.tree.find("TIER/ANNOTATION/ALIGNABLE_ANNOTATION[@ANNOTATION_ID='%s']" % idAnnotation)
-        if a != None:
-            a.getparent().getparent().remove(a.getparent())
-        else:
-            a = self.tree.find("TIER/ANNOTATION/REF_ANNOTATION[@ANNOTATION_ID='%s']" % idAnnotation)
-            if a != None:
-                a.getparent().getparent().remove(a.getparent())
+        if idAnnotation in self._annotation_elements:
+            idTier, eAnnotation, a = self._unindex_annotation(idAnnotation)
+            self._tier_elements[idTier].remove(eAnnotation)
+            if a.tag == 'ALIGNABLE_ANNOTATION':
+                self._interval_index.pop(idTier, None)
 
     def removeAnnotationsWithRef(self, idRefAnn):
-        allAnnotations = self.tree.findall("TIER/ANNOTATION/REF_ANNOTATION[@ANNOTATION_REF='%s']" % idRefAnn)
-        for a in allAnnotations:
-            a.getparent().getparent().remove(a.getparent())
+        allAnnotations = [ id for (idTier, annRef), ids
+                           in self._ref_annotation_ids_by_tier_and_ref.items()
+                           if annRef == idRefAnn for id in ids ]
+        for id in allAnnotations:
+            self.removeAnnotationWithId(id)
 
     def getAnnotationValueForAnnotation(self, idTier, idAnnotation):
         type = self.getLinguisticTypeForTier(idTier)
         ret = ''
         if self.linguisticTypeIsTimeAlignable(type):
-            a = self.tree.find("TIER[@TIER_ID='%s']/ANNOTATION/ALIGNABLE_ANNOTATION[@ANNOTATION_ID='%s']" % (idTier,  idAnnotation))
+            a = self._annotation_element(idTier, idAnnotation, 'ALIGNABLE_ANNOTATION')
             ret = a.findtext('ANNOTATION_VALUE')
         else:
-            a = self.tree.find("TIER[@TIER_ID='%s']/ANNOTATION/REF_ANNOTATION[@ANNOTATION_ID='%s']" % (idTier,  idAnnotation))
+            a = self._annotation_element(idTier, idAnnotation, 'REF_ANNOTATION')
             ret = a.findtext('ANNOTATION_VALUE')
         if ret == None:
             ret = ''
@@ -833,9 +1154,11 @@ class Eaf(object):
         ret = ''
         a = None
         if self.linguisticTypeIsTimeAlignable(type):
-            a = self.tree.find("TIER[@TIER_ID='%s']/ANNOTATION/ALIGNABLE_ANNOTATION[@ANNOTATION_ID='%s']/ANNOTATION_VALUE" % (idTier,  idAnnotation))
+            a = self._annotation_element(idTier, idAnnotation, 'ALIGNABLE_ANNOTATION')
         else:
-            a = self.tree.find("TIER[@TIER_ID='%s']/ANNOTATION/REF_ANNOTATION[@ANNOTATION_ID='%s']/ANNOTATION_VALUE" % (idTier,  idAnnotation))
+            a = self._annotation_element(idTier, idAnnotation, 'REF_ANNOTATION')
+        if a is not None:
+            a = a.find('ANNOTATION_VALUE')
         if a == None:
             return False
         a.text = strAnnotation
@@ -844,7 +1167,10 @@ class Eaf(object):
     def updatePrevAnnotationForAnnotation(self, idAnnotation, idPrevAnn = None):
         # this will just do nothing for time-aligned tiers
         # if idPrevAnn is None, then the attribute will be removed
-        a = self.tree.find("TIER/ANNOTATION/REF_ANNOTATION[@ANNOTATION_ID='%s']" % idAnnotation)
+        a = None
+        entry = self._annotation_elements.get(idAnnotation)
+        if entry is not None and entry[2].tag == 'REF_ANNOTATION':
+            a = entry[2]
         if a != None:
             if idPrevAnn == None:
                 del(a.attrib['PREVIOUS_ANNOTATION'])
@@ -852,76 +1178,179 @@ class Eaf(object):
                 a.attrib['PREVIOUS_ANNOTATION'] = idPrevAnn
 
 
+class AlignableAnnotation(object):
+    """
+    A time-aligned annotation as stored by EafPythonic. The fields can
+    also be accessed with the keys of the dictionaries that were used
+    before, e.g. annotation["ts1"].
+    """
+
+    __slots__ = [ 'id', 'tierId', 'ts1', 'ts2', 'value' ]
+
+    def __init__(self, id, tierId, ts1, ts2, value):
+        self.id = id
+        self.tierId = tierId
+        self.ts1 = ts1
+        self.ts2 = ts2
+        self.value = value
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+
+class RefAnnotation(object):
+    """
+    A reference annotation as stored by EafPythonic. The fields can
+    also be accessed with the keys of the dictionaries that were used
+    before, e.g. annotation["annRef"].
+    """
+
+    __slots__ = [ 'id', 'tierId', 'annRef', 'prevAnn', 'value' ]
+
+    def __init__(self, id, tierId, annRef, prevAnn, value):
+        self.id = id
+        self.tierId = tierId
+        self.annRef = annRef
+        self.prevAnn = prevAnn
+        self.value = value
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+
 class EafPythonic(object):
-    
-    def __init__(self, filename):
+    """
+    Read-only API to .eaf files. The file is parsed once into
+    dictionaries, and the annotations are indexed by tier, by parent
+    annotation and by time slots, so that all getters are lookups.
+    """
+
+    def __init__(self, filename, tiers = None, linguistic_types = None):
         self.tiersDict = {}
         self.alignableAnnotationsDict = {}
         self.refAnnotationsDict = {}
         self.refAnnotationsDictByTierAndAnnRef = {}
         self.linguistictypesDict = {}
-        
-        parser = Xml2Obj()
-        rootElement = parser.parse(filename)
-
-        for ltElement in rootElement.getElements("LINGUISTIC_TYPE"):
-            ta = False
-            idLt = ltElement.getAttribute("LINGUISTIC_TYPE_ID")
-            if ltElement.getAttribute("TIME_ALIGNABLE") == "true":
-                ta = True
-            self.linguistictypesDict[idLt] = ta
-
-        for tierElement in rootElement.getElements("TIER"):
-            idTier = tierElement.getAttribute("TIER_ID")
-            linguisticType = tierElement.getAttribute("LINGUISTIC_TYPE_REF")
-            timeAlignable = self.linguistictypesDict[linguisticType]
-            participant = tierElement.getAttribute("PARTICIPANT")
-            locale = tierElement.getAttribute("PARTICIPANT")
-            parent = tierElement.getAttribute("PARENT_REF")
-            
-            self.tiersDict[idTier] = {
-                'linguistic_type' : linguisticType,
-                'time_alignable' : timeAlignable,
-                'participant' : participant,
-                'locale' : locale,
-                'parent' : parent
-            }
-            
-            for annotationElement in tierElement.getElements("ANNOTATION"):
-                if timeAlignable:
-                    for alignableElement in annotationElement.getElements("ALIGNABLE_ANNOTATION"):
-                        idAnn = alignableElement.getAttribute("ANNOTATION_ID")
-                        ts1 = alignableElement.getAttribute("TIME_SLOT_REF1")
-                        ts2 = alignableElement.getAttribute("TIME_SLOT_REF2")
-                        value = alignableElement.getElements("ANNOTATION_VALUE")[0].getData()
-                        self.alignableAnnotationsDict[idAnn] = {
-                            'id' : idAnn,
-                            'tierId' : idTier,
-                            'ts1' : ts1,
-                            'ts2' : ts2,
-                            'value' : value
-                        }
-                else:
-                    for refElement in annotationElement.getElements("REF_ANNOTATION"):
-                        idAnn = refElement.getAttribute("ANNOTATION_ID")
-                        annRef = refElement.getAttribute("ANNOTATION_REF")
-                        prevAnn = refElement.getAttribute("PREVIOUS_ANNOTATION")
-                        value = refElement.getElements("ANNOTATION_VALUE")[0].getData()
-                        self.refAnnotationsDict[idAnn] = {
-                            'id' : idAnn,
-                            'tierId' : idTier,
-                            'annRef' : annRef,
-                            'prevAnn' : prevAnn,
-                            'value' : value
-                        }
-                        idByTierAndAnnRef = "%s.%s" % (idTier, annRef)
-                        if idByTierAndAnnRef in self.refAnnotationsDictByTierAndAnnRef:
-                            self.refAnnotationsDictByTierAndAnnRef[idByTierAndAnnRef].append(idAnn)
-                        else:
-                            self.refAnnotationsDictByTierAndAnnRef[idByTierAndAnnRef] = [ idAnn ]
-                            
+        self.time_order = TimeOrder()
+        self.lastUsedAnnotationId = 0
+
+        # secondary indexes
+        self.tierIdsByLinguisticType = {}
+        self.alignableAnnotationIdsByTier = {}
+        self.refAnnotationIdsByTier = {}
+        self.alignableAnnotationIdsByTierAndTs = {}
+        self._intervalsByTier = {}
+
+        self.tiers_whitelist = tiers
+        self.linguistic_types_whitelist = linguistic_types
+
+        handler = EafExpatHandler(self)
+        handler.parse(filename)
+
+        self._build_indexes()
+
+    def _add_linguistic_type(self, idLt, timeAlignable):
+        self.linguistictypesDict[idLt] = (timeAlignable == "true")
+
+    def _tier_is_selected(self, idTier, linguisticType):
+        if self.tiers_whitelist is None and self.linguistic_types_whitelist is None:
+            return True
+        return idTier in (self.tiers_whitelist or []) or \
+            linguisticType in (self.linguistic_types_whitelist or [])
+
+    def _add_tier(self, idTier, linguisticType, participant, locale, parent):
+        # returns False if the tier is not selected
+        if not self._tier_is_selected(idTier, linguisticType):
+            return False
+        idTier = intern(idTier)
+        linguisticType = intern(linguisticType)
+        participant = intern(participant or '')
+        locale = intern(locale or '')
+        self.tiersDict[idTier] = {
+            'linguistic_type' : linguisticType,
+            'time_alignable' : None,
+            'participant' : participant,
+            'locale' : locale,
+            'parent' : parent
+        }
+        self.tierIdsByLinguisticType.setdefault(linguisticType, []).append(idTier)
+        self.alignableAnnotationIdsByTier[idTier] = []
+        self.refAnnotationIdsByTier[idTier] = []
+        return True
+
+    def _add_alignable_annotation(self, idTier, idAnn, ts1, ts2, value):
+        ts1 = intern(ts1)
+        ts2 = intern(ts2)
+        self.alignableAnnotationsDict[idAnn] = AlignableAnnotation(
+            idAnn, idTier, ts1, ts2, value)
+        self.alignableAnnotationIdsByTier[idTier].append(idAnn)
+        self.alignableAnnotationIdsByTierAndTs.setdefault(
+            (idTier, ts1, ts2), []).append(idAnn)
+
+    def _add_ref_annotation(self, idTier, idAnn, annRef, prevAnn, value):
+        self.refAnnotationsDict[idAnn] = RefAnnotation(
+            idAnn, idTier, annRef, prevAnn, value)
+        self.refAnnotationIdsByTier[idTier].append(idAnn)
+        idByTierAndAnnRef = "%s.%s" % (idTier, annRef)
+        if idByTierAndAnnRef in self.refAnnotationsDictByTierAndAnnRef:
+            self.refAnnotationsDictByTierAndAnnRef[idByTierAndAnnRef].append(idAnn)
+        else:
+            self.refAnnotationsDictByTierAndAnnRef[idByTierAndAnnRef] = [ idAnn ]
+
+    def _build_indexes(self):
+        # called once after all annotations were added
+        for idTier, tier in self.tiersDict.items():
+            tier['time_alignable'] = self.linguistictypesDict.get(
+                tier['linguistic_type'], False)
+
+        # alignable annotations sorted by start time, with their start and
+        # end keys for the containment queries
+        for idTier, ids in self.alignableAnnotationIdsByTier.items():
+            ids.sort(key=lambda id:
+                self.time_order.key(self.alignableAnnotationsDict[id].ts1))
+            self._intervalsByTier[idTier] = (
+                [ self.time_order.key(self.alignableAnnotationsDict[id].ts1) for id in ids ],
+                [ self.time_order.key(self.alignableAnnotationsDict[id].ts2) for id in ids ])
+        for key, ids in self.alignableAnnotationIdsByTierAndTs.items():
+            ids.sort(key=lambda id:
+                self.time_order.key(self.alignableAnnotationsDict[id].ts1))
+
+        # ref annotations of the same parent in the order of their
+        # PREVIOUS_ANNOTATION chains
+        for key, ids in self.refAnnotationsDictByTierAndAnnRef.items():
+            ids_by_prev = {}
+            for id in ids:
+                ids_by_prev.setdefault(
+                    self.refAnnotationsDict[id].prevAnn, []).append(id)
+            ids[:] = _ref_annotation_chain(ids_by_prev, None)
+
+    def _alignable_annotation_ids_between(self, idTier, start, end):
+        if idTier not in self._intervalsByTier:
+            return []
+        starts, ends = self._intervalsByTier[idTier]
+        ids = self.alignableAnnotationIdsByTier[idTier]
+        ret = []
+        for i in range(bisect.bisect_left(starts, start), len(starts)):
+            if starts[i] > end:
+                break
+            if ends[i] <= end:
+                ret.append(ids[i])
+        return ret
+
+    def annotations_in_range(self, tier_id, start_ms, end_ms):
+        """Returns the ids of all alignable annotations of a tier that lie
+        between start_ms and end_ms, sorted by their start time.
+        """
+        return self._alignable_annotation_ids_between(
+            tier_id, (start_ms, -1), (end_ms, len(self.time_order)))
+
     def getLastUsedAnnotationId(self):
-        return 0
+        return self.lastUsedAnnotationId
+
+    def tiers(self):
+        # returns tiers as dictionary: id -> type
+        return dict((id, tier['linguistic_type'])
+                    for id, tier in self.tiersDict.items())
 
     def getLocaleForTier(self, idTier):
         return self.tiersDict[idTier]["locale"]
@@ -930,126 +1359,388 @@ class EafPythonic(object):
         return self.tiersDict[idTier]["participant"]
 
     def getTierIdsForLinguisticType(self, type, parent = None):
-        return [ id for id in self.tiersDict
-                if self.tiersDict[id]["linguistic_type"] == type
-                and (parent == None or self.tiersDict[id]["parent"] == parent)]
+        return [ id for id in self.tierIdsByLinguisticType.get(type, [])
+                if parent == None or self.tiersDict[id]["parent"] == parent ]
+
+    def getLinguisticTypeForTier(self, idTier):
+        return self.tiersDict[idTier]["linguistic_type"]
+
+    def linguisticTypeIsTimeAlignable(self, id):
+        return self.linguistictypesDict.get(id)
 
     def getRefAnnotationIdForAnnotationId(self, idTier, idAnnotation):
-        return self.refAnnotationsDict[idAnnotation]["annRef"]
+        return self.refAnnotationsDict[idAnnotation].annRef
 
     def getRefAnnotationIdsForTier(self, idTier, annRef = None,  prevAnn = None):
-        if annRef != None and prevAnn == None:
-            idByTierIdAndAnnRef = "%s.%s" % (idTier, annRef)
-            if idByTierIdAndAnnRef in self.refAnnotationsDictByTierAndAnnRef:
-                ret = self.refAnnotationsDictByTierAndAnnRef[idByTierIdAndAnnRef]
-                #ret.sort()
-                return ret
-            else:
-                return []
-        else:
-            ret = [ id for id in self.refAnnotationsDict
-                    if self.refAnnotationsDict[id]["tierId"] == idTier
-                    and (annRef == None or self.refAnnotationsDict[id]["annRef"] == annRef)
-                    and (prevAnn == None or self.refAnnotationsDict[id]["prevAnn"] == prevAnn)]
-            #ret.sort()
-            return ret
+        if annRef == None:
+            return list(self.refAnnotationIdsByTier.get(idTier, []))
+        idByTierIdAndAnnRef = "%s.%s" % (idTier, annRef)
+        ret = self.refAnnotationsDictByTierAndAnnRef.get(idByTierIdAndAnnRef, [])
+        if prevAnn != None:
+            ids_by_prev = {}
+            for id in ret:
+                ids_by_prev.setdefault(
+                    self.refAnnotationsDict[id].prevAnn, []).append(id)
+            return _ref_annotation_chain(ids_by_prev, prevAnn)
+        return list(ret)
 
     def getAlignableAnnotationIdsForTier(self, idTier, startTs = None,  endTs = None):
-        ret = [ id for id in self.alignableAnnotationsDict
-                if self.alignableAnnotationsDict[id]["tierId"] == idTier
-                and (startTs == None or self.alignableAnnotationsDict[id]["ts1"] == startTs)
-                and (endTs == None or self.alignableAnnotationsDict[id]["ts2"] == endTs)]
-        #ret.sort()
-        return ret
+        if startTs == None and endTs == None:
+            return list(self.alignableAnnotationIdsByTier.get(idTier, []))
+        if startTs != None and endTs != None:
+            return list(self.alignableAnnotationIdsByTierAndTs.get(
+                (idTier, startTs, endTs), []))
+        return [ id for id in self.alignableAnnotationIdsByTier.get(idTier, [])
+                 if (startTs == None or self.alignableAnnotationsDict[id].ts1 == startTs)
+                 and (endTs == None or self.alignableAnnotationsDict[id].ts2 == endTs) ]
+
+    def getAnnotationIdsForTier(self, idTier):
+        if self.tiersDict[idTier]["time_alignable"]:
+            return self.getAlignableAnnotationIdsForTier(idTier)
+        else:
+            return self.getRefAnnotationIdsForTier(idTier)
 
     def getStartTsForAnnotation(self, idTier, idAnn):
-        return self.alignableAnntotationsDict[idAnn]["ts1"]
-        
+        return self.alignableAnnotationsDict[idAnn].ts1
+
     def getEndTsForAnnotation(self, idTier, idAnn):
-        return self.alignableAnntotationsDict[idAnn]["ts2"]
+        return self.alignableAnnotationsDict[idAnn].ts2
+
+    def getTimeValueForTimeSlot(self, idTs):
+        return self.time_order.value(idTs)
+
+    def getStartTimeForAnnotation(self, idTier, idAnn):
+        return self.time_order.value(self.getStartTsForAnnotation(idTier, idAnn))
+
+    def getEndTimeForAnnotation(self, idTier, idAnn):
+        return self.time_order.value(self.getEndTsForAnnotation(idTier, idAnn))
+
+    def getDurationForAnnotation(self, idTier, idAnn):
+        return self.getEndTimeForAnnotation(idTier, idAnn) - \
+            self.getStartTimeForAnnotation(idTier, idAnn)
 
     def getAnnotationValueForAnnotation(self, idTier, idAnn):
         if self.tiersDict[idTier]["time_alignable"]:
-            return self.alignableAnnotationsDict[idAnn]["value"]
+            return self.alignableAnnotationsDict[idAnn].value
         else:
-            return self.refAnnotationsDict[idAnn]["value"]
-
-    def getLinguisticTypeForTier(self, idTier):
-        return self.tiersDict[idTier]["linguistic_type"]
+            return self.refAnnotationsDict[idAnn].value
 
     def getSubAnnotationIdsForAnnotationInTier(self, idAnn, idTier, idSubTier):
         ret = []
         if self.tiersDict[idSubTier]["time_alignable"]:
             startTs = self.getStartTsForAnnotation(idTier, idAnn)
             endTs = self.getEndTsForAnnotation(idTier, idAnn)
-            ret = self.getAlignableAnnotationIdsForTier(idSubTier, startTs, endTs)
+            ret = self._alignable_annotation_ids_between(idSubTier,
+                self.time_order.key(startTs), self.time_order.end_key(endTs))
         else:
             ret = self.getRefAnnotationIdsForTier(idSubTier, idAnn)
         return ret
 
-class XmlElement(object):
-    ''' A parsed XML element '''
-    
-    def __init__(self, name, attributes):
-        # Record tagname and attributes dictionary
-        self.name = name
-        self.attributes = attributes
-        # Initialize the element's cdata and children to empty
-        self.cdata = ''
-        self.children = [  ]
-        
-    def addChild(self, element):
-        self.children.append(element)
-        
-    def getAttribute(self, key):
-        return self.attributes.get(key)
-        
-    def getData(self):
-        return self.cdata
-    
-    def getElements(self, name=''):
-        if name:
-            return [c for c in self.children if c.name == name]
-        else:
-            return list(self.children)
+class EafStreamReader(object):
+    """
+    Reads .eaf files with iterparse instead of loading the whole document.
+
+    A first pass only collects the TIER attributes, so that the tier
+    handler can look up tier ids by linguistic type as with Eaf. The
+    second pass keeps the annotations of the tiers that are needed
+    as tuples, frees each element as soon as it was read and emits the
+    utterances of an utterance tier as soon as the utterance tier and
+    all its word and translation tiers were read.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.tiersDict = {}
+        self.tierIds = []
+        self.lastUsedAnnotationId = 0
+        self._read_tiers()
+
+    def _iterparse(self, events):
+        if hasattr(self.file, 'seek'):
+            self.file.seek(0)
+        return ET.iterparse(self.file, events)
+
+    def _read_tiers(self):
+        root = None
+        for event, elem in self._iterparse(('start', 'end')):
+            if root is None:
+                root = elem
+            if event == 'start':
+                if elem.tag == 'TIER':
+                    idTier = elem.attrib['TIER_ID']
+                    self.tierIds.append(idTier)
+                    self.tiersDict[idTier] = {
+                        'linguistic_type' : elem.attrib.get('LINGUISTIC_TYPE_REF'),
+                        'participant' : elem.attrib.get('PARTICIPANT', ''),
+                        'locale' : elem.attrib.get('DEFAULT_LOCALE', ''),
+                        'parent' : elem.attrib.get('PARENT_REF')
+                    }
+            elif elem.tag == 'PROPERTY':
+                if elem.attrib.get('NAME') == 'lastUsedAnnotationId':
+                    self.lastUsedAnnotationId = int(elem.text)
+            elif elem is not root and elem.tag in ('TIER', 'TIME_ORDER', 'HEADER'):
+                root.remove(elem)
+            elif elem.tag == 'ANNOTATION':
+                elem.clear()
+
+    def getLastUsedAnnotationId(self):
+        return self.lastUsedAnnotationId
+
+    def getLocaleForTier(self, idTier):
+        return self.tiersDict[idTier]['locale']
+
+    def getParticipantForTier(self, idTier):
+        return self.tiersDict[idTier]['participant']
+
+    def getTierIdsForLinguisticType(self, type, parent = None):
+        return [ id for id in self.tierIds
+                if self.tiersDict[id]['linguistic_type'] == type
+                and (parent == None or self.tiersDict[id]['parent'] == parent)]
+
+    def utterance_records(self, tier_handler, empty_il_element = None):
+        """Returns a generator of utterance records, in the same format as
+        the rows returned by EafAnnotationFileParser.parse():
+        [ u_id, utterance, ilelements, annotations, locale, participant,
+        u_tier ].
+        """
+
+        if empty_il_element is None:
+            empty_il_element = [ '', '', '' ]
+
+        # for each utterance tier the word and translation tiers it needs
+        groups = []
+        for u_tier in tier_handler.get_utterancetier_ids():
+            groups.append((u_tier,
+                           tier_handler.get_wordtier_ids(u_tier),
+                           tier_handler.get_translationtier_ids(u_tier)))
+        needed = set()
+        for u_tier, w_tiers, t_tiers in groups:
+            needed.add(u_tier)
+            needed.update(w_tiers)
+            needed.update(t_tiers)
+
+        time_order = TimeOrder()
+        tiers = {}
+        root = None
+        parent = None
+        idTier = None
+        for event, elem in self._iterparse(('start', 'end')):
+            if root is None:
+                root = elem
+            if event == 'start':
+                if elem.tag in ('TIER', 'TIME_ORDER'):
+                    parent = elem
+                if elem.tag == 'TIER':
+                    idTier = elem.attrib['TIER_ID']
+                    if idTier in needed:
+                        tiers[idTier] = _EafStreamTier()
+                continue
+            if elem.tag == 'TIME_SLOT':
+                time_order.append(elem.attrib['TIME_SLOT_ID'],
+                                  elem.attrib.get('TIME_VALUE'))
+                parent.remove(elem)
+            elif elem.tag == 'ANNOTATION':
+                if idTier in tiers:
+                    tiers[idTier].add(elem[0], time_order)
+                parent.remove(elem)
+            elif elem.tag == 'TIER':
+                root.remove(elem)
+                if idTier in tiers:
+                    tiers[idTier].finish()
+                idTier = None
+                pending = []
+                for group in groups:
+                    if all(id in tiers and tiers[id].complete
+                           for id in [group[0]] + group[1] + group[2]):
+                        for record in self._records_for_group(
+                                tiers, group, empty_il_element):
+                            yield record
+                    else:
+                        pending.append(group)
+                groups = pending
+                # free all tiers that no pending utterance tier needs
+                needed = set()
+                for u_tier, w_tiers, t_tiers in groups:
+                    needed.add(u_tier)
+                    needed.update(w_tiers)
+                    needed.update(t_tiers)
+                for id in list(tiers.keys()):
+                    if id not in needed:
+                        del(tiers[id])
+            elif elem is not root and elem.tag in ('TIME_ORDER', 'HEADER'):
+                root.remove(elem)
+
+    def _records_for_group(self, tiers, group, empty_il_element):
+        u_tier, w_tiers, t_tiers = group
+        locale = self.getLocaleForTier(u_tier)
+        participant = self.getParticipantForTier(u_tier)
+        utterances = tiers[u_tier]
+        for u_id in utterances.alignable_ids() + utterances.ref_ids():
+            translations = []
+            for t_tier in t_tiers:
+                for id_trans in tiers[t_tier].sub_annotation_ids(utterances, u_id):
+                    trans = tiers[t_tier].values[id_trans]
+                    if trans != '':
+                        translations.append([id_trans, trans, t_tier])
+            ilelements = []
+            for w_tier in w_tiers:
+                for word_id in tiers[w_tier].sub_annotation_ids(utterances, u_id):
+                    ilelements.append(
+                        [word_id, tiers[w_tier].values[word_id], w_tier])
+            if not ilelements:
+                ilelements = empty_il_element
+            yield [ u_id, utterances.values[u_id], ilelements, [ translations ],
+                    locale, participant, u_tier ]
+
+
+class _EafStreamTier(object):
+    # the annotations of one tier as read by EafStreamReader
 
-class Xml2Obj(object):
-    
     def __init__(self):
-        self.root = None
-        self.nodeStack = [  ]
+        self.complete = False
+        self.values = {}
+        self.intervals = []
+        self.keys = {}
+        self.ref_order = []
+        self.ref_ids_by_ann_ref = {}
+        self.prev_anns = {}
+
+    def finish(self):
+        self.intervals.sort(key=operator.itemgetter(0))
+        self.complete = True
+
+    def add(self, a, time_order):
+        idAnn = a.attrib['ANNOTATION_ID']
+        self.values[idAnn] = a.findtext('ANNOTATION_VALUE') or ''
+        if a.tag == 'ALIGNABLE_ANNOTATION':
+            start = time_order.key(a.attrib['TIME_SLOT_REF1'])
+            end = time_order.key(a.attrib['TIME_SLOT_REF2'])
+            self.keys[idAnn] = (
+                start, time_order.end_key(a.attrib['TIME_SLOT_REF2']))
+            self.intervals.append((start, end, idAnn))
+        else:
+            self.ref_order.append(idAnn)
+            self.ref_ids_by_ann_ref.setdefault(
+                a.attrib['ANNOTATION_REF'], []).append(idAnn)
+            self.prev_anns[idAnn] = a.attrib.get('PREVIOUS_ANNOTATION')
+
+    def alignable_ids(self):
+        return [ i[2] for i in self.intervals ]
+
+    def ref_ids(self):
+        return list(self.ref_order)
+
+    def sub_annotation_ids(self, parent_tier, idAnn):
+        if self.intervals:
+            if idAnn not in parent_tier.keys:
+                return []
+            start, end = parent_tier.keys[idAnn]
+            i = bisect.bisect_left(self.intervals, (start,))
+            ret = []
+            while i < len(self.intervals) and self.intervals[i][0] <= end:
+                if self.intervals[i][1] <= end:
+                    ret.append(self.intervals[i][2])
+                i += 1
+            return ret
+        ids_by_prev = {}
+        for id in self.ref_ids_by_ann_ref.get(idAnn, []):
+            ids_by_prev.setdefault(self.prev_anns[id], []).append(id)
+        return _ref_annotation_chain(ids_by_prev, None)
+
+
+class EafExpatHandler(object):
+    """
+    Expat event handler that reads an .eaf file in one pass directly into
+    the dictionaries and indexes of an EafPythonic object.
+    """
+
+    def __init__(self, eaf):
+        self.eaf = eaf
+        # id of the current tier, None outside of tiers and in tiers
+        # that were not selected
+        self.idTier = None
+        # element name and attributes of the current annotation
+        self.annotation = None
+        self.property_name = None
+        self.value = ''
+        # character data of the current ANNOTATION_VALUE or PROPERTY,
+        # None if the character data is not needed
+        self.cdata = None
 
     def startElement(self, name, attributes):
         'Expat start element event handler'
-        # Instantiate an Element object
-        element = XmlElement(name.encode( ), attributes)
-        # Push element onto the stack and make it a child of parent
-        if self.nodeStack:
-            parent = self.nodeStack[-1]
-            parent.addChild(element)
-        else:
-            self.root = element
-        self.nodeStack.append(element)
+        if name == 'ANNOTATION_VALUE':
+            if self.idTier is not None:
+                self.cdata = []
+        elif name == 'ALIGNABLE_ANNOTATION' or name == 'REF_ANNOTATION':
+            self.annotation = (name, attributes)
+            self.value = ''
+        elif name == 'TIME_SLOT':
+            self.eaf.time_order.append(attributes.get('TIME_SLOT_ID'),
+                                       attributes.get('TIME_VALUE'))
+        elif name == 'TIER':
+            idTier = attributes.get('TIER_ID')
+            if self.eaf._add_tier(idTier,
+                    attributes.get('LINGUISTIC_TYPE_REF'),
+                    attributes.get('PARTICIPANT'),
+                    attributes.get('DEFAULT_LOCALE'),
+                    attributes.get('PARENT_REF')):
+                self.idTier = intern(idTier)
+        elif name == 'LINGUISTIC_TYPE':
+            self.eaf._add_linguistic_type(attributes.get('LINGUISTIC_TYPE_ID'),
+                                          attributes.get('TIME_ALIGNABLE'))
+        elif name == 'PROPERTY':
+            self.property_name = attributes.get('NAME')
+            self.cdata = []
 
     def endElement(self, name):
         'Expat end element event handler'
-        self.nodeStack.pop( )
+        if name == 'ANNOTATION_VALUE':
+            if self.cdata is not None:
+                self.value = ''.join(self.cdata)
+                self.cdata = None
+        elif name == 'ALIGNABLE_ANNOTATION':
+            if self.idTier is not None:
+                attributes = self.annotation[1]
+                self.eaf._add_alignable_annotation(self.idTier,
+                    attributes.get('ANNOTATION_ID'),
+                    attributes.get('TIME_SLOT_REF1'),
+                    attributes.get('TIME_SLOT_REF2'),
+                    self.value)
+            self.annotation = None
+        elif name == 'REF_ANNOTATION':
+            if self.idTier is not None:
+                attributes = self.annotation[1]
+                self.eaf._add_ref_annotation(self.idTier,
+                    attributes.get('ANNOTATION_ID'),
+                    attributes.get('ANNOTATION_REF'),
+                    attributes.get('PREVIOUS_ANNOTATION'),
+                    self.value)
+            self.annotation = None
+        elif name == 'TIER':
+            self.idTier = None
+        elif name == 'PROPERTY':
+            if self.property_name == 'lastUsedAnnotationId':
+                self.eaf.lastUsedAnnotationId = int(''.join(self.cdata))
+            self.cdata = None
 
     def characterData(self, data):
         'Expat character data event handler'
-        if data: # .strip( )
-            #data = data.decode("utf-8")
-            #data = data.encode( )
-            element = self.nodeStack[-1]
-            element.cdata += data
-
-    def parse(self, filename):
-        # Create an Expat parser
-        Parser = expat.ParserCreate("utf-8")
-        # Set the Expat event handlers to our methods
-        Parser.StartElementHandler = self.startElement
-        Parser.EndElementHandler = self.endElement
-        Parser.CharacterDataHandler = self.characterData
-        # Parse the XML File
-        ParserStatus = Parser.Parse(open(filename).read( ), 1)
-        return self.root
+        if self.cdata is not None:
+            self.cdata.append(data)
+
+    def parse(self, file):
+        """Parse a file, given as file path or binary file object."""
+        parser = expat.ParserCreate("utf-8")
+        parser.buffer_text = True
+        parser.StartElementHandler = self.startElement
+        parser.EndElementHandler = self.endElement
+        parser.CharacterDataHandler = self.characterData
+        if hasattr(file, 'read'):
+            parser.ParseFile(file)
+        else:
+            f = open(file, "rb")
+            try:
+                parser.ParseFile(f)
+            finally:
+                f.close()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module contains the append-only journal of the changes
+of an annotation tree that was saved as a binary tree file. The
+journal is stored next to the tree file and starts with a token
+that is also stored in the header of the tree file, so that a
+journal is only replayed on the tree file it was written for.
+
+Each save of the tree appends one record with the list of the
+changes since the last save. A record stores its length and a
+CRC-32 checksum, so that a record that was not written
+completely, for example because the program crashed, is
+detected: reading stops at the first incomplete or corrupt
+record, and the next save overwrites it.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import zlib
+import pickle
+import struct
+
+import pyannotation.data as data
+
+MAGIC = b"PYANJRNL"
+
+FORMAT_VERSION = 1
+
+SUFFIX = ".journal"
+
+_HEADER = struct.Struct("<8sH32s")
+
+_RECORD = struct.Struct("<II")
+
+class TreeJournal(object):
+    """
+    Append-only journal file of the changes of an annotation tree.
+
+    Attributes
+    ----------
+    filepath : str
+        The path of the journal file.
+    valid_length : int
+        The number of bytes of the header and the complete records,
+        None if the journal was not read or created.
+
+    """
+
+    def __init__(self, filepath):
+        """Class's constructor.
+
+        Parameters
+        ----------
+        filepath : str
+            The path of the journal file.
+
+        """
+
+        self.filepath = filepath
+        self.valid_length = None
+
+    def create(self, token):
+        """Create an empty journal for the tree file with the given
+        token. An existing journal is replaced.
+
+        Parameters
+        ----------
+        token : str
+            The journal token of the tree file.
+
+        """
+
+        temporary_filepath = self.filepath + ".tmp"
+        file = open(temporary_filepath, "wb")
+        try:
+            file.write(_HEADER.pack(MAGIC, FORMAT_VERSION,
+                                    token.encode("ascii")))
+            file.flush()
+            os.fsync(file.fileno())
+        finally:
+            file.close()
+        os.replace(temporary_filepath, self.filepath)
+        self.valid_length = _HEADER.size
+
+    def read(self, token):
+        """Read the records of the journal.
+
+        Parameters
+        ----------
+        token : str
+            The journal token of the tree file.
+
+        Returns
+        -------
+        records : array_like
+            The records in the order they were written, each record is
+            the list of the changes of one save. Empty if there is no
+            journal or the journal was written for another tree file.
+
+        Raises
+        ------
+        data.UnknownFileFormatError
+            If the journal has a newer format version.
+
+        """
+
+        self.valid_length = None
+        if not os.path.exists(self.filepath):
+            return []
+        file = open(self.filepath, "rb")
+        try:
+            content = file.read()
+        finally:
+            file.close()
+        if len(content) < _HEADER.size:
+            return []
+        magic, version, journal_token = _HEADER.unpack_from(content)
+        if magic != MAGIC or journal_token != token.encode("ascii"):
+            return []
+        if version > FORMAT_VERSION:
+            raise data.UnknownFileFormatError(
+                "Not a journal of format version {0} or older".format(
+                    FORMAT_VERSION))
+
+        records = []
+        position = _HEADER.size
+        while position + _RECORD.size <= len(content):
+            length, checksum = _RECORD.unpack_from(content, position)
+            start = position + _RECORD.size
+            payload = content[start:start + length]
+            # a record is never empty; a tail that was filled with zeros
+            # has a valid checksum
+            if length == 0 or len(payload) != length or \
+                    zlib.crc32(payload) != checksum:
+                break
+            records.append(pickle.loads(payload))
+            position = start + length
+        self.valid_length = position
+        return records
+
+    def append(self, record):
+        """Append a record to the journal. An incomplete record at the
+        end of the journal is overwritten.
+
+        Parameters
+        ----------
+        record : array_like
+            The list of the changes of one save.
+
+        """
+
+        if self.valid_length is None:
+            raise IOError("The journal was not read or created")
+        payload = pickle.dumps(record, 2)
+        file = open(self.filepath, "r+b")
+        try:
+            file.truncate(self.valid_length)
+            file.seek(self.valid_length)
+            file.write(_RECORD.pack(len(payload), zlib.crc32(payload)))
+            file.write(payload)
+            file.flush()
+            os.fsync(file.fileno())
+            self.valid_length = file.tell()
+        finally:
+            file.close()
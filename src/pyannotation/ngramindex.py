@@ -0,0 +1,502 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module contains an inverted n-gram index over the
+annotation values of an annotation tree. For every annotation
+type of the data structure type the index maps each n-gram
+(by default trigrams) to the ids of the elements that contain
+it in an annotation of this type.
+
+The index is used by the annotation tree to find the candidate
+elements of a filter before the regular expressions of the
+filter are evaluated: the literal strings that every match of
+a pattern has to contain are extracted from the pattern, and
+only the elements that contain all n-grams of these literals
+are candidates. Patterns without literals fall back to a full
+scan.
+"""
+
+from __future__ import unicode_literals
+
+import regex
+
+_QUANTIFIER = regex.compile(r"\{(\d*)(,?)(\d*)\}")
+
+_ESCAPES = { "n": "\n", "t": "\t", "r": "\r", "f": "\f", "v": "\v",
+             "a": "\a" }
+
+class NgramIndex(object):
+    """
+    Inverted n-gram index over the annotation values of the
+    elements of an annotation tree.
+
+    Attributes
+    ----------
+    n : int
+        The length of the n-grams.
+    postings : dict
+        For each annotation type a dictionary that maps the n-grams to
+        the ids of the elements.
+
+    """
+
+    def __init__(self, data_structure_type, n = 3):
+        """Class's constructor.
+
+        Parameters
+        ----------
+        data_structure_type : data.DataStructureType
+            The data structure type of the indexed elements.
+        n : int
+            The length of the n-grams.
+
+        """
+
+        self.data_structure_type = data_structure_type
+        self.n = n
+        self.postings = dict()
+        for ann_type in data_structure_type.flat_data_hierarchy:
+            self.postings[ann_type] = dict()
+        self._removed_ids = set()
+        # the id of the element of each annotation
+        self._element_ids = dict()
+
+    def add_element(self, id_element, element):
+        """Add the annotations of an element to the index.
+
+        Parameters
+        ----------
+        id_element : int
+            Id of the element.
+        element : array_like
+            The element of the annotation tree.
+
+        """
+
+        self._removed_ids.discard(id_element)
+        for ann_type, ngrams in self._ngrams_of_element(
+                id_element, element).items():
+            postings = self.postings[ann_type]
+            for ngram in ngrams:
+                if ngram in postings:
+                    postings[ngram].append(id_element)
+                else:
+                    postings[ngram] = [id_element]
+
+    def remove_element(self, id_element):
+        """Remove an element from the index. The id is only marked as
+        removed, it is dropped from the postings when the index is
+        rebuilt.
+
+        Parameters
+        ----------
+        id_element : int
+            Id of the element.
+
+        """
+
+        self._removed_ids.add(id_element)
+
+    def element_of_annotation(self, id_annotation):
+        """Return the id of the element of an annotation.
+
+        Parameters
+        ----------
+        id_annotation : int
+            Id of an annotation.
+
+        Returns
+        -------
+        id_element : int
+            The id of the element or None if the annotation is not in an
+            element of the index.
+
+        """
+
+        id_element = self._element_ids.get(id_annotation)
+        if id_element in self._removed_ids:
+            return None
+        return id_element
+
+    def _ngrams_of_element(self, id_element, element):
+        """Return the n-grams of an element for each annotation type
+        and record the element of its annotations.
+
+        Parameters
+        ----------
+        id_element : int
+            Id of the element.
+        element : array_like
+            The element of the annotation tree.
+
+        Returns
+        -------
+        ngrams : dict
+            A set of n-grams for each annotation type.
+
+        """
+
+        ngrams = dict()
+        for ann_type, a in _annotations_of_element(
+                element, self.data_structure_type.data_hierarchy):
+            if a["id"] is not None:
+                self._element_ids[a["id"]] = id_element
+            value = a["annotation"]
+            type_ngrams = ngrams.setdefault(ann_type, set())
+            for i in range(len(value) - self.n + 1):
+                type_ngrams.add(value[i:i + self.n])
+        return ngrams
+
+    def candidate_ids(self, ann_type, pattern):
+        """Return the ids of the elements that may contain a match of a
+        pattern in an annotation of a given type.
+
+        Parameters
+        ----------
+        ann_type : str
+            Value of the field in the data structure hierarchy.
+        pattern : str
+            The regular expression.
+
+        Returns
+        -------
+        ids : set
+            The ids of the candidate elements or None if the pattern has
+            no literals that can be looked up in the index.
+
+        """
+
+        ngrams = set()
+        for literal in required_literals(pattern):
+            for i in range(len(literal) - self.n + 1):
+                ngrams.add(literal[i:i + self.n])
+        if len(ngrams) == 0:
+            return None
+
+        postings = self.postings[ann_type]
+        lists = []
+        for ngram in ngrams:
+            if ngram not in postings:
+                return set()
+            lists.append(postings[ngram])
+        lists.sort(key=len)
+        ids = set(lists[0])
+        for l in lists[1:]:
+            if len(ids) == 0:
+                break
+            ids.intersection_update(l)
+        ids.difference_update(self._removed_ids)
+        return ids
+
+    def filter_candidate_ids(self, filter):
+        """Return the ids of the elements that may pass the regular
+        expressions of a filter, without its inversion.
+
+        Parameters
+        ----------
+        filter : annotationtree.AnnotationTreeFilter
+            The filter.
+
+        Returns
+        -------
+        ids : set
+            The ids of the candidate elements or None if all elements are
+            candidates.
+
+        """
+
+        ids = None
+        for ann_type, pattern in filter.filter.items():
+            # types that are not in the hierarchy are not evaluated
+            if pattern == "" or ann_type not in self.postings:
+                continue
+            type_ids = self.candidate_ids(ann_type, pattern)
+            if filter.boolean_operation == filter.AND:
+                # each type with a filter must match somewhere
+                if type_ids is not None:
+                    if ids is None:
+                        ids = type_ids
+                    else:
+                        ids = ids & type_ids
+            else:
+                # one match of any type is enough
+                if type_ids is None:
+                    return None
+                if ids is None:
+                    ids = type_ids
+                else:
+                    ids = ids | type_ids
+        return ids
+
+def _annotations_of_element(element, hierarchy):
+    """Return the annotation types and annotations of an element.
+
+    Parameters
+    ----------
+    element : array_like
+        An element or a part of an element of the annotation tree.
+    hierarchy : array_like
+        The data structure hierarchy of the element.
+
+    Returns
+    -------
+    annotations : array_like
+        A list of tuples (annotation type, annotation).
+
+    """
+
+    annotations = []
+    if type(element) is not list:
+        return annotations
+    for i, t in enumerate(hierarchy):
+        if i >= len(element):
+            break
+        if type(t) is list:
+            for e in element[i]:
+                annotations.extend(_annotations_of_element(e, t))
+        else:
+            annotations.append((t, element[i]))
+    return annotations
+
+def _parse_quantifier(pattern, i):
+    """Return the minimal repetition of a quantifier at a position of a
+    pattern and the position after the quantifier.
+
+    Parameters
+    ----------
+    pattern : str
+        The regular expression.
+    i : int
+        The position after an atom of the pattern.
+
+    Returns
+    -------
+    min_repeat : int
+        The minimal repetition or None if there is no quantifier.
+    i : int
+        The position after the quantifier.
+
+    """
+
+    if i >= len(pattern):
+        return None, i
+    c = pattern[i]
+    min_repeat = None
+    if c in "*?":
+        min_repeat = 0
+        i += 1
+    elif c == "+":
+        min_repeat = 1
+        i += 1
+    elif c == "{":
+        match = _QUANTIFIER.match(pattern, i)
+        if match is None or (match.group(1) == "" and match.group(3) == ""):
+            return None, i
+        min_repeat = int(match.group(1) or 0)
+        i = match.end()
+    else:
+        return None, i
+    # lazy and possessive quantifiers
+    if i < len(pattern) and pattern[i] in "?+":
+        i += 1
+    return min_repeat, i
+
+def _skip_escape(pattern, i):
+    """Return the literal character of an escape sequence at a position
+    of a pattern and the position after the escape.
+
+    Parameters
+    ----------
+    pattern : str
+        The regular expression.
+    i : int
+        The position of the backslash.
+
+    Returns
+    -------
+    char : str
+        The literal character or None if the escape is not a literal.
+    i : int
+        The position after the escape.
+
+    """
+
+    d = pattern[i + 1]
+    i += 2
+    if not (d.isalnum() or d == "_"):
+        return d, i
+    if d in _ESCAPES:
+        return _ESCAPES[d], i
+    if d == "L" and i < len(pattern) and pattern[i] == "<":
+        # named list of the regex module
+        end = pattern.find(">", i)
+        if end != -1:
+            i = end + 1
+    elif d in "pPNgxuU" and i < len(pattern) and pattern[i] == "{":
+        end = pattern.find("}", i)
+        if end != -1:
+            i = end + 1
+    elif d == "x":
+        i += 2
+    elif d == "u":
+        i += 4
+    elif d == "U":
+        i += 8
+    elif d.isdigit():
+        while i < len(pattern) and pattern[i].isdigit():
+            i += 1
+    return None, i
+
+def _skip_class(pattern, i):
+    """Return the position after a character class.
+
+    Parameters
+    ----------
+    pattern : str
+        The regular expression.
+    i : int
+        The position of the opening bracket.
+
+    Returns
+    -------
+    i : int
+        The position after the closing bracket or None if the class is
+        not closed.
+
+    """
+
+    i += 1
+    if i < len(pattern) and pattern[i] == "^":
+        i += 1
+    if i < len(pattern) and pattern[i] == "]":
+        i += 1
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+        elif c == "[" and pattern.startswith("[:", i):
+            end = pattern.find(":]", i + 2)
+            if end == -1:
+                return None
+            i = end + 2
+        elif c == "]":
+            return i + 1
+        else:
+            i += 1
+    return None
+
+def required_literals(pattern):
+    """Return literal strings that every match of a regular expression
+    contains. The extraction is conservative: patterns with alternations,
+    inline flags, fuzzy constraints, braces that are not numeric
+    quantifiers or unknown constructs return no literals.
+
+    Parameters
+    ----------
+    pattern : str
+        The regular expression.
+
+    Returns
+    -------
+    literals : array_like
+        The list of literal strings.
+
+    """
+
+    literals = []
+    current = []
+    groups = []
+
+    def flush():
+        if len(current) > 0:
+            literals.append("".join(current))
+            del current[:]
+
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        char = None
+        if c == "|":
+            return []
+        elif c == "(":
+            flush()
+            lookaround = False
+            if pattern.startswith("(?", i):
+                if pattern.startswith("(?#", i):
+                    end = pattern.find(")", i)
+                    if end == -1:
+                        return []
+                    i = end + 1
+                    continue
+                elif pattern.startswith("(?:", i) or \
+                        pattern.startswith("(?>", i):
+                    i += 3
+                elif pattern.startswith("(?P<", i) or \
+                        (pattern.startswith("(?<", i) and
+                         not pattern.startswith("(?<=", i) and
+                         not pattern.startswith("(?<!", i)):
+                    end = pattern.find(">", i)
+                    if end == -1:
+                        return []
+                    i = end + 1
+                elif pattern.startswith("(?=", i) or \
+                        pattern.startswith("(?!", i):
+                    lookaround = True
+                    i += 3
+                elif pattern.startswith("(?<=", i) or \
+                        pattern.startswith("(?<!", i):
+                    lookaround = True
+                    i += 4
+                else:
+                    # inline flags, conditionals and other extensions
+                    return []
+            else:
+                i += 1
+            groups.append((len(literals), lookaround))
+            continue
+        elif c == ")":
+            flush()
+            if len(groups) == 0:
+                return []
+            start, lookaround = groups.pop()
+            min_repeat, i = _parse_quantifier(pattern, i + 1)
+            if lookaround or min_repeat == 0:
+                del literals[start:]
+            continue
+        elif c == "[":
+            i = _skip_class(pattern, i)
+            if i is None:
+                return []
+        elif c == "\\":
+            if i + 1 >= len(pattern):
+                return []
+            char, i = _skip_escape(pattern, i)
+        elif c in "*+?":
+            return []
+        elif c in ".^$":
+            i += 1
+        elif c == "{":
+            # not a numeric quantifier: fuzzy constraints of the regex
+            # module or a brace that is not a quantifier
+            return []
+        else:
+            char = c
+            i += 1
+
+        min_repeat, i = _parse_quantifier(pattern, i)
+        if char is None or min_repeat == 0:
+            flush()
+        else:
+            current.append(char)
+            if min_repeat is not None:
+                flush()
+
+    flush()
+    if len(groups) > 0:
+        return []
+    return literals
@@ -0,0 +1,743 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module contains frequency, co-occurrence and n-gram
+counts and concordances over the annotations of a corpus, of a
+corpus.CorpusTrees or a corpusreader.CorpusReader.
+
+The annotation values are interned: each distinct value gets an
+integer code in a Vocabulary, and the tokens of an annotation
+type are stored as one array of codes with the offsets where
+the utterances and the files start. The counts are computed
+with NumPy on these arrays, and a concordance is an array of
+the codes around each hit, so no Python object is created for
+a token until the results are turned into strings.
+
+Empty annotations are not tokens. NumPy is required; the
+co-occurrence counts can be converted to a SciPy sparse matrix
+if SciPy is installed.
+"""
+
+from __future__ import unicode_literals
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class Vocabulary(object):
+    """
+    The integer codes of annotation values. The codes are given in the
+    order the values are first interned, starting with 0.
+
+    Attributes
+    ----------
+    strings : array_like
+        The value of each code.
+
+    """
+
+    def __init__(self):
+        """Class's constructor.
+
+        Raises
+        ------
+        ImportError
+            If NumPy is not installed.
+
+        """
+
+        if numpy is None:
+            raise ImportError("NumPy is required for the statistics")
+        self.strings = []
+        self._codes = dict()
+
+    def __len__(self):
+        return len(self.strings)
+
+    def code(self, string):
+        """Return the code of a value.
+
+        Parameters
+        ----------
+        string : str
+            The annotation value.
+
+        Returns
+        -------
+        code : int
+            The code or None if the value was not interned.
+
+        """
+
+        return self._codes.get(string)
+
+    def intern(self, strings):
+        """Return the codes of a list of values. Values without a code
+        get a new code.
+
+        Parameters
+        ----------
+        strings : array_like
+            The annotation values.
+
+        Returns
+        -------
+        codes : numpy.ndarray
+            The codes of the values.
+
+        """
+
+        if len(strings) == 0:
+            return numpy.zeros(0, dtype=numpy.int64)
+        # the distinct values are looked up once
+        uniques, inverse = numpy.unique(numpy.array(strings, dtype=object),
+                                        return_inverse=True)
+        codes = numpy.empty(len(uniques), dtype=numpy.int64)
+        for i, string in enumerate(uniques):
+            code = self._codes.get(string)
+            if code is None:
+                code = len(self.strings)
+                self._codes[string] = code
+                self.strings.append(string)
+            codes[i] = code
+        return codes[inverse.reshape(-1)]
+
+class Tokens(object):
+    """
+    The tokens of one annotation type of a corpus as integer codes.
+
+    Attributes
+    ----------
+    vocabulary : Vocabulary
+        The vocabulary of the codes.
+    codes : numpy.ndarray
+        The code of each token, in the order of the corpus.
+    utterance_starts : numpy.ndarray
+        The position of the first token of each utterance, followed by
+        the number of tokens.
+    document_starts : numpy.ndarray
+        The position of the first token of each file, followed by the
+        number of tokens.
+    filepaths : array_like
+        The path of each file.
+
+    """
+
+    def __init__(self, vocabulary, codes, utterance_starts, document_starts,
+                 filepaths):
+        """Class's constructor.
+
+        Parameters
+        ----------
+        vocabulary : Vocabulary
+            The vocabulary of the codes.
+        codes : numpy.ndarray
+            The code of each token.
+        utterance_starts : numpy.ndarray
+            The position of the first token of each utterance, followed
+            by the number of tokens.
+        document_starts : numpy.ndarray
+            The position of the first token of each file, followed by the
+            number of tokens.
+        filepaths : array_like
+            The path of each file.
+
+        """
+
+        self.vocabulary = vocabulary
+        self.codes = codes
+        self.utterance_starts = utterance_starts
+        self.document_starts = document_starts
+        self.filepaths = filepaths
+
+    def __len__(self):
+        return len(self.codes)
+
+    def frequencies(self):
+        """Return the number of tokens of each code.
+
+        Returns
+        -------
+        counts : numpy.ndarray
+            The count of each code of the vocabulary.
+
+        """
+
+        return numpy.bincount(self.codes, minlength=len(self.vocabulary))
+
+    def most_common(self, number = None):
+        """Return the most frequent values.
+
+        Parameters
+        ----------
+        number : int
+            The number of values, None for all values with a token.
+
+        Returns
+        -------
+        frequencies : array_like
+            A list of (value, count) tuples, the most frequent first.
+
+        """
+
+        counts = self.frequencies()
+        codes = _most_common(counts, number)
+        return [(self.vocabulary.strings[c], int(counts[c])) for c in codes]
+
+    def ngram_counts(self, n):
+        """Count the n-grams of the tokens. An n-gram does not span
+        utterances.
+
+        Parameters
+        ----------
+        n : int
+            The length of the n-grams.
+
+        Returns
+        -------
+        ngrams : numpy.ndarray
+            The distinct n-grams as rows of n codes.
+        counts : numpy.ndarray
+            The count of each n-gram.
+
+        """
+
+        size = len(self.codes) - n + 1
+        if size <= 0:
+            return (numpy.zeros((0, n), dtype=numpy.int64),
+                    numpy.zeros(0, dtype=numpy.int64))
+        # the utterance of each token; an n-gram starts at a token whose
+        # utterance is the utterance of the token n - 1 later
+        utterances = numpy.searchsorted(self.utterance_starts[1:],
+            numpy.arange(len(self.codes)), side="right")
+        starts = numpy.flatnonzero(
+            utterances[:size] == utterances[n - 1:n - 1 + size])
+        ngrams = numpy.stack([self.codes[starts + i] for i in range(n)],
+                             axis=1)
+        if len(ngrams) == 0:
+            return ngrams, numpy.zeros(0, dtype=numpy.int64)
+        return numpy.unique(ngrams, axis=0, return_counts=True)
+
+    def most_common_ngrams(self, n, number = None):
+        """Return the most frequent n-grams.
+
+        Parameters
+        ----------
+        n : int
+            The length of the n-grams.
+        number : int
+            The number of n-grams, None for all n-grams.
+
+        Returns
+        -------
+        frequencies : array_like
+            A list of (n-gram, count) tuples, the most frequent first,
+            where an n-gram is a tuple of values.
+
+        """
+
+        ngrams, counts = self.ngram_counts(n)
+        strings = self.vocabulary.strings
+        return [(tuple(strings[c] for c in ngrams[i]), int(counts[i]))
+                for i in _most_common(counts, number)]
+
+    def concordance(self, string, width = 5):
+        """Return the keyword in context windows of a value. A window does
+        not span files.
+
+        Parameters
+        ----------
+        string : str
+            The annotation value.
+        width : int
+            The number of tokens before and after the value.
+
+        Returns
+        -------
+        concordance : Concordance
+            The windows of the tokens of the value.
+
+        """
+
+        code = self.vocabulary.code(string)
+        if code is None:
+            positions = numpy.zeros(0, dtype=numpy.int64)
+        else:
+            positions = numpy.flatnonzero(self.codes == code)
+        return Concordance(self, positions, width)
+
+class Concordance(object):
+    """
+    The keyword in context windows of the tokens at some positions.
+
+    Attributes
+    ----------
+    tokens : Tokens
+        The tokens of the corpus.
+    positions : numpy.ndarray
+        The positions of the keywords.
+    documents : numpy.ndarray
+        The file of each keyword.
+    windows : numpy.ndarray
+        One row of 2 * width + 1 codes for each keyword, with the
+        keyword in the middle; -1 where the window reaches beyond the
+        file.
+    width : int
+        The number of tokens before and after a keyword.
+
+    """
+
+    def __init__(self, tokens, positions, width):
+        """Class's constructor.
+
+        Parameters
+        ----------
+        tokens : Tokens
+            The tokens of the corpus.
+        positions : numpy.ndarray
+            The positions of the keywords.
+        width : int
+            The number of tokens before and after a keyword.
+
+        """
+
+        self.tokens = tokens
+        self.positions = positions
+        self.width = width
+        self.documents = numpy.searchsorted(tokens.document_starts[1:],
+                                            positions, side="right")
+        offsets = positions[:, numpy.newaxis] + \
+            numpy.arange(-width, width + 1)
+        inside = (offsets >= tokens.document_starts[self.documents, None]) & \
+            (offsets < tokens.document_starts[self.documents + 1, None])
+        self.windows = numpy.where(inside,
+            tokens.codes[numpy.clip(offsets, 0, max(len(tokens) - 1, 0))],
+            -1)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def lines(self):
+        """Return the windows as strings.
+
+        Returns
+        -------
+        lines : array_like
+            A list of (filepath, left context, keyword, right context)
+            tuples, the values of the contexts are separated by spaces.
+
+        """
+
+        strings = self.tokens.vocabulary.strings
+        lines = []
+        for document, window in zip(self.documents, self.windows):
+            values = [strings[c] if c >= 0 else None for c in window]
+            lines.append((self.tokens.filepaths[document],
+                " ".join(v for v in values[:self.width] if v is not None),
+                values[self.width],
+                " ".join(v for v in values[self.width + 1:]
+                         if v is not None)))
+        return lines
+
+class Cooccurrences(object):
+    """
+    The counts of the pairs of values of two annotation types, as a
+    sparse matrix in coordinate format.
+
+    Attributes
+    ----------
+    vocabulary_a : Vocabulary
+        The vocabulary of the rows.
+    vocabulary_b : Vocabulary
+        The vocabulary of the columns.
+    rows : numpy.ndarray
+        The code of the first value of each distinct pair.
+    columns : numpy.ndarray
+        The code of the second value of each distinct pair.
+    counts : numpy.ndarray
+        The count of each distinct pair.
+
+    """
+
+    def __init__(self, vocabulary_a, vocabulary_b, codes_a, codes_b):
+        """Class's constructor.
+
+        Parameters
+        ----------
+        vocabulary_a : Vocabulary
+            The vocabulary of the first values.
+        vocabulary_b : Vocabulary
+            The vocabulary of the second values.
+        codes_a : numpy.ndarray
+            The code of the first value of each pair.
+        codes_b : numpy.ndarray
+            The code of the second value of each pair.
+
+        """
+
+        self.vocabulary_a = vocabulary_a
+        self.vocabulary_b = vocabulary_b
+        keys, self.counts = numpy.unique(
+            codes_a * len(vocabulary_b) + codes_b, return_counts=True)
+        self.rows, self.columns = numpy.divmod(keys, max(len(vocabulary_b), 1))
+
+    def count(self, string_a, string_b):
+        """Return the count of a pair of values.
+
+        Parameters
+        ----------
+        string_a : str
+            The first value.
+        string_b : str
+            The second value.
+
+        Returns
+        -------
+        count : int
+            The number of times the values occur together.
+
+        """
+
+        code_a = self.vocabulary_a.code(string_a)
+        code_b = self.vocabulary_b.code(string_b)
+        if code_a is None or code_b is None:
+            return 0
+        i = numpy.flatnonzero((self.rows == code_a) &
+                              (self.columns == code_b))
+        if len(i) == 0:
+            return 0
+        return int(self.counts[i[0]])
+
+    def most_common(self, number = None):
+        """Return the most frequent pairs.
+
+        Parameters
+        ----------
+        number : int
+            The number of pairs, None for all pairs.
+
+        Returns
+        -------
+        frequencies : array_like
+            A list of ((value, value), count) tuples, the most frequent
+            first.
+
+        """
+
+        strings_a = self.vocabulary_a.strings
+        strings_b = self.vocabulary_b.strings
+        return [((strings_a[self.rows[i]], strings_b[self.columns[i]]),
+                 int(self.counts[i]))
+                for i in _most_common(self.counts, number)]
+
+    def as_array(self):
+        """Return the counts as a dense matrix.
+
+        Returns
+        -------
+        matrix : numpy.ndarray
+            The counts, with a row for each code of vocabulary_a and a
+            column for each code of vocabulary_b.
+
+        """
+
+        matrix = numpy.zeros((len(self.vocabulary_a), len(self.vocabulary_b)),
+                             dtype=numpy.int64)
+        matrix[self.rows, self.columns] = self.counts
+        return matrix
+
+    def as_sparse(self):
+        """Return the counts as a sparse matrix.
+
+        Returns
+        -------
+        matrix : scipy.sparse.csr_matrix
+            The counts, with a row for each code of vocabulary_a and a
+            column for each code of vocabulary_b.
+
+        Raises
+        ------
+        ImportError
+            If SciPy is not installed.
+
+        """
+
+        import scipy.sparse
+        return scipy.sparse.csr_matrix((self.counts, (self.rows, self.columns)),
+            shape=(len(self.vocabulary_a), len(self.vocabulary_b)))
+
+def tokens_of_trees(corpus_trees, ann_type, vocabulary = None):
+    """Return the tokens of an annotation type in the trees of a corpus.
+    Each element of a tree is an utterance.
+
+    Parameters
+    ----------
+    corpus_trees : corpus.CorpusTrees
+        The corpus.
+    ann_type : str
+        The annotation type.
+    vocabulary : Vocabulary
+        The vocabulary of the codes, a new vocabulary if None.
+
+    Returns
+    -------
+    tokens : Tokens
+        The tokens of the annotation type.
+
+    Raises
+    ------
+    data.UnknownAnnotationTypeError
+        If the ann_type doesn't exist.
+
+    """
+
+    if vocabulary is None:
+        vocabulary = Vocabulary()
+    codes = []
+    utterance_starts = []
+    document_starts = [0]
+    filepaths = []
+    size = 0
+    for filepath, tree in corpus_trees.items:
+        column = tree.get_column(ann_type)
+        nonempty = numpy.array([s != "" for s in column.strings], dtype=bool)
+        elements = column.as_arrays()[2][nonempty]
+        tree_codes = vocabulary.intern(
+            [s for s in column.strings if s != ""])
+        utterance_starts.append(size + numpy.searchsorted(
+            elements, numpy.arange(len(tree)), side="left"))
+        codes.append(tree_codes)
+        size += len(tree_codes)
+        document_starts.append(size)
+        filepaths.append(filepath)
+    return Tokens(vocabulary, _concatenate(codes),
+                  numpy.append(_concatenate(utterance_starts), size),
+                  numpy.array(document_starts, dtype=numpy.int64), filepaths)
+
+def tokens_of_reader(corpus_reader, tier = "word", vocabulary = None):
+    """Return the tokens of a tier of the files of a corpus reader. The
+    locale and participant of the reader are respected.
+
+    Parameters
+    ----------
+    corpus_reader : corpusreader.CorpusReader
+        The corpus reader.
+    tier : str
+        "word", or "morpheme" and "gloss" for a GlossCorpusReader.
+    vocabulary : Vocabulary
+        The vocabulary of the codes, a new vocabulary if None.
+
+    Returns
+    -------
+    tokens : Tokens
+        The tokens of the tier.
+
+    Raises
+    ------
+    ValueError
+        If the tier is unknown.
+
+    """
+
+    if tier not in ("word", "morpheme", "gloss"):
+        raise ValueError("Unknown tier {0}".format(tier))
+    if vocabulary is None:
+        vocabulary = Vocabulary()
+    strings = []
+    utterance_starts = []
+    document_starts = []
+    filepaths = []
+    for filepath, utterance in _utterances_of_reader(corpus_reader):
+        if filepath is not None:
+            document_starts.append(len(strings))
+            filepaths.append(filepath)
+            continue
+        utterance_starts.append(len(strings))
+        for word in utterance[2]:
+            if len(word) == 0:
+                continue
+            if tier == "word":
+                strings.append(word[1])
+                continue
+            for morpheme in word[2]:
+                if morpheme[1] == "":
+                    continue
+                if tier == "morpheme":
+                    strings.append(morpheme[1])
+                else:
+                    strings.extend(g[1] for g in morpheme[2] if g[1] != "")
+    utterance_starts.append(len(strings))
+    document_starts.append(len(strings))
+    return Tokens(vocabulary, vocabulary.intern(strings),
+                  numpy.array(utterance_starts, dtype=numpy.int64),
+                  numpy.array(document_starts, dtype=numpy.int64), filepaths)
+
+def cooccurrences_of_trees(corpus_trees, type_a, type_b,
+                           vocabulary_a = None, vocabulary_b = None):
+    """Count the pairs of values of two annotation types in the trees of
+    a corpus. An annotation is paired with the annotation of the other
+    type on the same level of the hierarchy or on a level above it, for
+    example a 'gloss' with its 'morpheme' or a 'wfw' with its 'word'.
+    Pairs with an empty value are not counted.
+
+    Parameters
+    ----------
+    corpus_trees : corpus.CorpusTrees
+        The corpus.
+    type_a : str
+        The annotation type of the first values.
+    type_b : str
+        The annotation type of the second values.
+    vocabulary_a : Vocabulary
+        The vocabulary of the first values, a new vocabulary if None.
+    vocabulary_b : Vocabulary
+        The vocabulary of the second values, a new vocabulary if None.
+
+    Returns
+    -------
+    cooccurrences : Cooccurrences
+        The counts of the pairs.
+
+    Raises
+    ------
+    ValueError
+        If the types are on different branches of the hierarchy.
+
+    """
+
+    if vocabulary_a is None:
+        vocabulary_a = Vocabulary()
+    if vocabulary_b is None:
+        vocabulary_b = Vocabulary()
+    codes_a = []
+    codes_b = []
+    for filepath, tree in corpus_trees.items:
+        column_a = tree.get_column(type_a)
+        column_b = tree.get_column(type_b)
+        rows = _aligned_rows(tree, type_a, type_b)
+        if rows is not None:
+            rows_a, rows_b = rows, numpy.arange(len(column_b))
+        else:
+            rows = _aligned_rows(tree, type_b, type_a)
+            if rows is None:
+                raise ValueError("{0} and {1} are on different branches "
+                                 "of the hierarchy".format(type_a, type_b))
+            rows_a, rows_b = numpy.arange(len(column_a)), rows
+        strings_a = numpy.array(column_a.strings, dtype=object)[rows_a]
+        strings_b = numpy.array(column_b.strings, dtype=object)[rows_b]
+        nonempty = (strings_a != "") & (strings_b != "")
+        codes_a.append(vocabulary_a.intern(strings_a[nonempty]))
+        codes_b.append(vocabulary_b.intern(strings_b[nonempty]))
+    return Cooccurrences(vocabulary_a, vocabulary_b, _concatenate(codes_a),
+                         _concatenate(codes_b))
+
+def cooccurrences_of_reader(corpus_reader, vocabulary_a = None,
+                            vocabulary_b = None):
+    """Count the pairs of morphemes and their glosses in the files of a
+    GlossCorpusReader. The locale and participant of the reader are
+    respected.
+
+    Parameters
+    ----------
+    corpus_reader : corpusreader.GlossCorpusReader
+        The corpus reader.
+    vocabulary_a : Vocabulary
+        The vocabulary of the morphemes, a new vocabulary if None.
+    vocabulary_b : Vocabulary
+        The vocabulary of the glosses, a new vocabulary if None.
+
+    Returns
+    -------
+    cooccurrences : Cooccurrences
+        The counts of the (morpheme, gloss) pairs.
+
+    """
+
+    if vocabulary_a is None:
+        vocabulary_a = Vocabulary()
+    if vocabulary_b is None:
+        vocabulary_b = Vocabulary()
+    morphemes = []
+    glosses = []
+    for filepath, utterance in _utterances_of_reader(corpus_reader):
+        if filepath is not None:
+            continue
+        for word in utterance[2]:
+            if len(word) == 0:
+                continue
+            for morpheme in word[2]:
+                if morpheme[1] == "":
+                    continue
+                for gloss in morpheme[2]:
+                    if gloss[1] != "":
+                        morphemes.append(morpheme[1])
+                        glosses.append(gloss[1])
+    return Cooccurrences(vocabulary_a, vocabulary_b,
+                         vocabulary_a.intern(morphemes),
+                         vocabulary_b.intern(glosses))
+
+def _utterances_of_reader(corpus_reader):
+    # yields (filepath, None) at the start of each file and
+    # (None, utterance) for the utterances of the locale and participant
+    # of the reader
+    for filepath, tree in corpus_reader.annotationtrees:
+        yield filepath, None
+        for utterance in tree.getTree():
+            if corpus_reader.locale != None and \
+                    utterance[4] != corpus_reader.locale:
+                continue
+            if corpus_reader.participant != None and \
+                    utterance[5] != corpus_reader.participant:
+                continue
+            yield None, utterance
+
+def _aligned_rows(tree, type_a, type_b):
+    """Return the row of the annotation of type_a that belongs to each
+    annotation of type_b.
+
+    Parameters
+    ----------
+    tree : annotationtree.AnnotationTree
+        The tree with the columns.
+    type_a : str
+        The annotation type on the same level or above type_b.
+    type_b : str
+        The annotation type.
+
+    Returns
+    -------
+    rows : numpy.ndarray
+        The rows in the column of type_a, or None if type_a is not on
+        the same level or above type_b.
+
+    """
+
+    siblings = tree.data_structure_type.type_siblings[type_a]
+    column = tree.get_column(type_b)
+    rows = numpy.arange(len(column))
+    while column.ann_type not in siblings:
+        if column.parent_type is None:
+            return None
+        rows = column.as_arrays()[1][rows]
+        column = tree.get_column(column.parent_type)
+    return rows
+
+def _most_common(counts, number):
+    # the indices of the largest counts, equal counts in the order of the
+    # indices
+    order = numpy.argsort(-counts, kind="stable")
+    order = order[counts[order] > 0]
+    if number is not None:
+        order = order[:number]
+    return order
+
+def _concatenate(arrays):
+    if len(arrays) == 0:
+        return numpy.zeros(0, dtype=numpy.int64)
+    return numpy.concatenate(arrays).astype(numpy.int64)
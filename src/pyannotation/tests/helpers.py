@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module contains the functions that build the
+elements and trees of the tests.
+
+Note: The elements and trees use Data Structure
+Graid.
+"""
+
+from pyannotation import data
+from pyannotation import annotationtree
+
+# Initialize the DataStructureType class
+data_class = data.DataStructureTypeGraid()
+
+def graid_element(id, utterance, words, translation):
+    element = [{'id': id, 'annotation': utterance},
+        [[{'id': id + 1, 'annotation': ''},
+            [ [{'id': id + 2 + 3 * i, 'annotation': w},
+               {'id': id + 3 + 3 * i, 'annotation': ''},
+               {'id': id + 4 + 3 * i, 'annotation': ''}]
+              for i, w in enumerate(words) ],
+            {'id': id + 2 + 3 * len(words), 'annotation': ''}]],
+        {'id': id + 3 + 3 * len(words), 'annotation': translation},
+        {'id': id + 4 + 3 * len(words), 'annotation': ''}]
+    return element
+
+def graid_elements():
+    # three elements with words, the ids of the elements are
+    # 1, 100 and 200
+    return [graid_element(1, 'the dog barks',
+                ['the', 'dog', 'barks'], 'a dog'),
+            graid_element(100, 'a cat', ['a', 'cat'], 'a cat'),
+            graid_element(200, 'dogs and cats',
+                ['dogs', 'and', 'cats'], '')]
+
+def graid_words_tree():
+    # a tree of the three elements with words
+    tree = annotationtree.AnnotationTree(data_class)
+    for element in graid_elements():
+        tree.append_element(element)
+    return tree
+
+def graid_tree(utterances):
+    # a tree of empty elements with the utterances
+    tree = annotationtree.AnnotationTree(data_class)
+    tree.structure_type_handler = data.DataStructureTypeGraid()
+    for utterance in utterances:
+        element = tree.empty_element()
+        element[0]['annotation'] = utterance
+        tree.append_element(element)
+    return tree
@@ -20,8 +20,13 @@ Graid.
 
 from pyannotation import data
 from pyannotation import annotationtree
+from pyannotation.tests import helpers
 
+import io
+import os
 import pickle
+import shutil
+import tempfile
 
 # Initialize the DataStructureType class
 data_class = data.DataStructureTypeGraid()
@@ -32,10 +37,20 @@ annotationtree_class = annotationtree.AnnotationTree(data_class)
 # Initialize the AnnotationTreeFilter class
 anntreefilter_class = annotationtree.AnnotationTreeFilter(data_class)
 
+# Save the elements in a pickle file in a temporary directory
+tempdir = tempfile.mkdtemp()
+filepath = os.path.join(tempdir, 'Balochi Text1.pickle')
+file = open(filepath, "wb")
+pickle.dump(helpers.graid_elements(), file)
+file.close()
+
 # Open the file and set it to the AnnotationTree
-filepath = 'C:\TESTS\Balochi Text1.pickle'
 file = open(filepath, "rb")
 annotationtree_class.tree = pickle.load(file)
+file.close()
+
+def teardown_module(module):
+    shutil.rmtree(tempdir)
 
 class TestAnnotationTree:
 
@@ -91,11 +106,12 @@ class TestAnnotationTree:
         """
 
         # If the filepath variable value equal like this
-        filepath = 'C:\TESTS\save_test_file.pickle'
+        save_filepath = os.path.join(tempdir, 'save_test_file.pickle')
 
         error_message = 'Fail - Save pickle as tree'
 
-        assert(annotationtree_class.save_tree_as_pickle(filepath),error_message)
+        assert(annotationtree_class.save_tree_as_pickle(save_filepath),
+               error_message)
 
     def test_load_tree_from_pickle(self):
         """Raise an assertion if can't load the file.
@@ -110,9 +126,6 @@ class TestAnnotationTree:
 
         """
 
-        # If the filepath variable value equal like this
-        filepath = 'C:\TESTS\Balochi Text1.pickle'
-
         error_message = 'Fail - Load the tree from pickle file'
 
         assert(annotationtree_class.load_tree_from_pickle(filepath),
@@ -281,7 +294,8 @@ class TestAnnotationTree:
                     {'id': 6, 'annotation': ''}]],
                 {'id': 7, 'annotation': ''},
                 {'id': 8, 'annotation': ''}]
-        id_element = 20
+        # The id of the second element of helpers.graid_elements
+        id_element = 100
         after = False
         update_ids = False
 
@@ -290,6 +304,66 @@ class TestAnnotationTree:
 
         assert(annotationtree_class.insert_element(element, id_element, after, update_ids) == expected_result)
 
+    def test_get_element(self):
+        """Raise an assertion if can't get an element.
+
+        Return the element with a certain id.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        tree = annotationtree.AnnotationTree(data_class)
+        tree.structure_type_handler = data.DataStructureTypeGraid()
+        tree.append_empty_element()
+        tree.append_empty_element()
+        element = tree.empty_element()
+        id_element = tree.tree[1][0]['id']
+        tree.insert_element(element, tree.tree[0][0]['id'])
+        tree.remove_element(tree.tree[1][0]['id'])
+
+        # The result expected should be
+        expected_result = tree.tree[1]
+
+        assert(tree.get_element(id_element) == expected_result)
+        assert(tree.get_element(element[0]['id']) == element)
+        assert(tree.get_element(-1) == None)
+
+    def test_get_annotation(self):
+        """Raise an assertion if can't get an annotation.
+
+        Return the annotation with a certain id.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        tree = annotationtree.AnnotationTree(data_class)
+        tree.structure_type_handler = data.DataStructureTypeGraid()
+        tree.append_element([{'id': 1, 'annotation': 'u'},
+            [[{'id': 2, 'annotation': 'c'},
+                [[{'id': 3, 'annotation': 'w'},
+                        {'id': 4, 'annotation': 'a'},
+                        {'id': 5, 'annotation': 'g'}]],
+                    {'id': 6, 'annotation': 'g2'}]],
+                {'id': 7, 'annotation': 't'},
+                {'id': 8, 'annotation': ''}])
+
+        # The result expected should be
+        expected_result = {'id': 3, 'annotation': 'w'}
+
+        assert(tree.get_annotation(3) == expected_result)
+        tree.remove_element(1)
+        assert(tree.get_annotation(3) == None)
+
     def __len__(self):
         """Raise an assertion if doesn't exist any tree.
 
@@ -324,6 +398,81 @@ class TestAnnotationTree:
         assert(annotationtree_class.append_filter(filter),
             error_message)
 
+    def test_filtered_element_ids(self):
+        """Raise an assertion if the filtered ids and positions aren't
+        correct.
+
+        Return the ids of the elements that passed all filters.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        tree = annotationtree.AnnotationTree(data_class)
+        tree.structure_type_handler = data.DataStructureTypeGraid()
+        for utterance in ['one dog', 'two cats', 'three dogs']:
+            element = tree.empty_element()
+            element[0]['annotation'] = utterance
+            tree.append_element(element)
+        tree.init_filters()
+        filter = annotationtree.AnnotationTreeFilter(data_class)
+        filter.set_filter_for_type('utterance', 'dog')
+        tree.append_filter(filter)
+        filter = annotationtree.AnnotationTreeFilter(data_class)
+        filter.set_filter_for_type('utterance', 't')
+        tree.append_filter(filter)
+
+        # The result expected should be
+        expected_result = [tree.tree[2][0]['id']]
+
+        assert(tree.get_filtered_element_ids() == expected_result)
+        assert(tree.filtered_element_positions() == [2])
+        assert(tree.filtered_element_ids == [[0, 1, 2], [0, 2], [2]])
+        assert(tree.filtered_element_ids[-1] == [2])
+        assert(tree.filtered_element_ids[1] is tree.filtered_element_ids[1])
+        tree.pop_filter()
+        assert(tree.filtered_element_positions() == [0, 2])
+        assert(tree.filtered_element_ids == [[0, 1, 2], [0, 2]])
+
+        # The positions can be assigned as before the bitmaps
+        tree.filtered_element_ids = [range(len(tree.tree)), [1]]
+        assert(tree.filtered_element_positions() == [1])
+        assert(tree.get_filtered_element_ids() == [tree.tree[1][0]['id']])
+        assert(tree.filtered_element_ids == [[0, 1, 2], [1]])
+
+    def test_append_filter_workers(self):
+        """Raise an assertion if the filter results of a process pool
+        aren't the same as in a single process.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        tree = annotationtree.AnnotationTree(data_class)
+        tree.structure_type_handler = data.DataStructureTypeGraid()
+        for i in range(20):
+            element = tree.empty_element()
+            element[0]['annotation'] = 'utterance {0}'.format(i)
+            tree.append_element(element)
+        filter = annotationtree.AnnotationTreeFilter(data_class)
+        filter.set_filter_for_type('utterance', '1')
+        tree.init_filters()
+        tree.append_filter(filter, workers = 2)
+
+        # The result expected should be
+        expected_result = [1, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19]
+
+        assert(tree.filtered_element_positions() == expected_result)
+        assert(len(filter.matchobject['utterance']) == 11)
+
     def test_last_filter(self):
         """Raise an assertion if can't return the
         last filter.
@@ -337,6 +486,9 @@ class TestAnnotationTree:
 
         """
 
+        # Initialize the filters, test_append_filter appends a filter
+        annotationtree_class.init_filters()
+
         # The result expected should be
         expected_result = anntreefilter_class.data_structure_type
 
@@ -380,6 +532,7 @@ class TestAnnotationTree:
 
         # Set some values to filters
         #annotationtree_class.filters.append('text')
+        annotationtree_class.init_filters()
 
         # The result expected should be
         expected_result = None
@@ -437,9 +590,9 @@ class TestAnnotationTree:
         annotationtree_class.structure_type_handler = data.DataStructureTypeGraid()
 
         # Open the file and set it to the AnnotationTree
-        filepath = 'C:\TESTS\Balochi Text1.pickle'
         file = open(filepath, "rb")
         annotationtree_class.tree = pickle.load(file)
+        file.close()
 
         # If the variables value equal like this
         filtered = False
@@ -449,6 +602,73 @@ class TestAnnotationTree:
         assert(annotationtree_class.as_html(filtered, html_frame),
             error_message)
 
+    def test_iter_html(self):
+        """Raise an assertion if the html page in chunks or a page of
+        the elements isn't the same as the html page.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # Open the file and set it to the AnnotationTree
+        file = open(filepath, "rb")
+        annotationtree_class.tree = pickle.load(file)
+        file.close()
+
+        # If the variables value equal like this
+        html = annotationtree_class.as_html()
+        chunks = list(annotationtree_class.iter_html())
+        output = io.StringIO()
+        annotationtree_class.write_html(output)
+
+        # The result expected should be
+        assert("".join(chunks) == html)
+        assert(len(chunks) == len(annotationtree_class) + 2)
+        assert(output.getvalue() == html)
+        assert(annotationtree_class.as_html(html_frame = False, start = 1,
+                                            stop = 3) ==
+               "".join(chunks[2:4]))
+
+    def test_iter_annotations(self):
+        """Raise an assertion if the annotations of a type aren't the
+        annotations at their paths in the elements.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # Open the file and set it to the AnnotationTree
+        file = open(filepath, "rb")
+        annotationtree_class.tree = pickle.load(file)
+        file.close()
+
+        # If the variables value equal like this
+        words = list(annotationtree_class.iter_annotations('word'))
+        utterances = list(annotationtree_class.iter_annotations('utterance'))
+
+        # The result expected should be
+        expected_result = []
+        for i, element in enumerate(annotationtree_class.tree):
+            for j, clause_unit in enumerate(element[1]):
+                for k, word in enumerate(clause_unit[1]):
+                    expected_result.append((i, (1, j, 1, k, 0),
+                        word[0]['id'], word[0]['annotation']))
+        assert(words == expected_result)
+        assert(len(utterances) == len(annotationtree_class))
+        assert(utterances[1] == (1, (0,), annotationtree_class.tree[1][0]['id'],
+                                 annotationtree_class.tree[1][0]['annotation']))
+        try:
+            annotationtree_class.iter_annotations('gloss')
+            assert(False)
+        except data.UnknownAnnotationTypeError:
+            pass
+
     def test__element_as_table(self):
         """Raise an assertion if can't insert an element into
         a table.
@@ -466,9 +686,9 @@ class TestAnnotationTree:
         annotationtree_class.structure_type_handler = data.DataStructureTypeGraid()
 
         # Open the file and set it to the AnnotationTree
-        filepath = 'C:\TESTS\Balochi Text1.pickle'
         file = open(filepath, "rb")
         annotationtree_class.tree = pickle.load(file)
+        file.close()
 
         # If the variables value equal like this
         elements = [{'id': 6, 'annotation': 'gu\u0161-\u012bt:'},
@@ -542,6 +762,162 @@ class TestAnnotationTreeFilter:
         assert(anntreefilter_class.set_filter_for_type(
             ann_type,filter_string), error_message)
 
+    def test_matchobject(self):
+        """Raise an assertion if the match spans aren't correct.
+
+        Record the spans of all matches of a filter.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        filter = annotationtree.AnnotationTreeFilter(data_class)
+        filter.set_filter_for_type('utterance', 'og')
+        element = [{'id': 1, 'annotation': 'dog dog'},
+            [[{'id': 2, 'annotation': ''},
+                [[{'id': 3, 'annotation': ''},
+                        {'id': 4, 'annotation': ''},
+                        {'id': 5, 'annotation': ''}]],
+                    {'id': 6, 'annotation': ''}]],
+                {'id': 7, 'annotation': ''},
+                {'id': 8, 'annotation': ''}]
+
+        # The result expected should be
+        expected_result = {1: [[1, 3], [5, 7]]}
+
+        assert(filter.element_passes_filter(element) == True)
+        assert(filter.matchobject['utterance'] == expected_result)
+
+    def test_short_circuit(self):
+        """Raise an assertion if the short-circuit evaluation differs
+        from the full evaluation.
+
+        Verify if an element passes a filter with short-circuit
+        evaluation and collect the matches afterwards.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        element = [{'id': 1, 'annotation': 'dog dog'},
+            [[{'id': 2, 'annotation': ''},
+                [[{'id': 3, 'annotation': 'dog'},
+                        {'id': 4, 'annotation': 'DOG'},
+                        {'id': 5, 'annotation': 'np'}],
+                 [{'id': 6, 'annotation': 'dog'},
+                        {'id': 7, 'annotation': 'DOG'},
+                        {'id': 8, 'annotation': ''}]],
+                    {'id': 9, 'annotation': ''}]],
+                {'id': 10, 'annotation': 'two dogs'},
+                {'id': 11, 'annotation': ''}]
+
+        for operation in [annotationtree.AnnotationTreeFilter.AND,
+                          annotationtree.AnnotationTreeFilter.OR]:
+            for word, graid1 in [('dog', 'np'), ('dog', 'v'), ('cat', 'v')]:
+                filter = annotationtree.AnnotationTreeFilter(data_class)
+                filter.set_filter_for_type('word', word)
+                filter.set_filter_for_type('graid1', graid1)
+                filter.set_boolean_operation(operation)
+
+                # The result expected should be
+                expected_result = filter.element_passes_filter(element)
+
+                filter.set_short_circuit(True)
+                assert(filter.element_passes_filter(element) ==
+                       expected_result)
+
+        # Elements with empty lists of sub-annotations
+        empty_words = [{'id': 1, 'annotation': 'dog'},
+            [[{'id': 2, 'annotation': ''}, [],
+                {'id': 3, 'annotation': ''}]],
+            {'id': 4, 'annotation': 'a dog'},
+            {'id': 5, 'annotation': ''}]
+        empty_clause_units = [{'id': 1, 'annotation': 'dog'}, [],
+            {'id': 4, 'annotation': 'a dog'},
+            {'id': 5, 'annotation': ''}]
+        for e in [empty_words, empty_clause_units]:
+            for operation in [annotationtree.AnnotationTreeFilter.AND,
+                              annotationtree.AnnotationTreeFilter.OR]:
+                for ann_type in ['utterance', 'word']:
+                    filter = annotationtree.AnnotationTreeFilter(data_class)
+                    filter.set_filter_for_type(ann_type, 'dog')
+                    filter.set_boolean_operation(operation)
+
+                    expected_result = filter.element_passes_filter(e)
+
+                    filter.set_short_circuit(True)
+                    assert(filter.element_passes_filter(e) ==
+                           expected_result)
+
+        # The spans are only collected on request
+        filter = annotationtree.AnnotationTreeFilter(data_class)
+        filter.set_filter_for_type('word', 'o')
+        filter.set_short_circuit(True)
+        assert(filter.element_passes_filter(element) == True)
+        assert(filter.matchobject['word'] == {})
+        filter.collect_matches(element)
+        assert(filter.matchobject['word'] == {3: [[1, 2]], 6: [[1, 2]]})
+
+    def test_filter_set_directly(self):
+        """Raise an assertion if a filter string that was set directly
+        in the dictionary or a filter pickled without its compiled
+        patterns isn't used.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        element = [{'id': 1, 'annotation': 'dog dog'},
+            [[{'id': 2, 'annotation': ''},
+                [[{'id': 3, 'annotation': 'dog'},
+                        {'id': 4, 'annotation': ''},
+                        {'id': 5, 'annotation': ''}]],
+                    {'id': 6, 'annotation': ''}]],
+                {'id': 7, 'annotation': ''},
+                {'id': 8, 'annotation': ''}]
+        filter = annotationtree.AnnotationTreeFilter(data_class)
+        filter.set_filter_for_type('word', 'dog')
+        filter.filter['word'] = 'cat'
+        old_filter = annotationtree.AnnotationTreeFilter(data_class)
+        old_filter.filter['word'] = 'dog'
+        old_state = { 'filter': dict(old_filter.filter) }
+        for name in ['data_structure_type', 'matchobject', 'inverted',
+                     'boolean_operation', 'contained_matches']:
+            old_state[name] = old_filter.__dict__[name]
+        old_filter.__dict__.clear()
+        old_filter.__dict__.update(old_state)
+        old_filter = pickle.loads(pickle.dumps(old_filter))
+
+        # The result expected should be
+        assert(filter.element_passes_filter(element) == False)
+        filter.set_short_circuit(True)
+        assert(filter.element_passes_filter(element) == False)
+        filter.filter['word'] = ''
+        assert(filter.element_passes_filter(element) == True)
+        assert(old_filter.element_passes_filter(element) == True)
+        assert(old_filter.matchobject['word'] == {3: [[0, 3]]})
+
+        # Types that are not in the hierarchy are not evaluated
+        filter = annotationtree.AnnotationTreeFilter(data_class)
+        filter.set_filter_for_type('gloss', 'dog')
+        filter.set_filter_for_type('word', 'dog')
+        assert(filter.element_passes_filter(element) == True)
+        filter.set_boolean_operation(filter.OR)
+        filter.filter['word'] = ''
+        assert(filter.element_passes_filter(element) == False)
+
     def test_set_inverted_filter(self):
         """Raise an assertion if can't set the filter.
 
@@ -616,9 +992,9 @@ class TestAnnotationTreeFilter:
         """
 
         # Open the file and set it to the AnnotationTree
-        filepath = 'C:\TESTS\Balochi Text1.pickle'
         file = open(filepath, "rb")
         annotationtree_class.tree = pickle.load(file)
+        file.close()
 
         # If the variables value equal like this
         element = [{'id': 6, 'annotation': 'gu\u0161-\u012bt:'},
@@ -650,9 +1026,9 @@ class TestAnnotationTreeFilter:
         """
 
         # Open the file and set it to the AnnotationTree
-        filepath = 'C:\TESTS\Balochi Text1.pickle'
         file = open(filepath, "rb")
         annotationtree_class.tree = pickle.load(file)
+        file.close()
 
         # If the variables value equal like this
         elements = [{'id': 6, 'annotation': 'gu\u0161-\u012bt:'},
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module contains the tests to the class
+AnnotationColumns in the columns.py module and to
+the columns of the class AnnotationTree.
+
+Note: The tests made on this use Data Structure
+Graid.
+"""
+
+from pyannotation import data
+from pyannotation import annotationtree
+from pyannotation import columns
+from pyannotation.tests import helpers
+
+# Initialize the DataStructureType class
+data_class = data.DataStructureTypeGraid()
+
+def column_content(column):
+    return (column.parent_type, list(column.ids), list(column.parents),
+            list(column.elements), list(column.strings))
+
+class TestAnnotationColumns:
+
+    def test_columns(self):
+        """Raise an assertion if the columns don't contain the
+        annotations of their types in the order of the tree.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        tree = helpers.graid_words_tree()
+        words = tree.get_column('word')
+        clause_units = tree.get_column('clause unit')
+
+        # The result expected should be
+        assert(words.parent_type == 'clause unit')
+        assert(list(words.strings) == ['the', 'dog', 'barks', 'a', 'cat',
+                                       'dogs', 'and', 'cats'])
+        assert(list(words.ids) == [3, 6, 9, 102, 105, 202, 205, 208])
+        assert(list(words.parents) == [0, 0, 0, 1, 1, 2, 2, 2])
+        assert(list(words.elements) == [0, 0, 0, 1, 1, 2, 2, 2])
+        assert(clause_units.parent_type == 'utterance')
+        assert(list(clause_units.parents) == [0, 1, 2])
+        assert(tree.get_column('utterance').parent_type is None)
+        assert(words.match_rows('^dog') == [1, 5])
+
+    def test_columns_follow_changes(self):
+        """Raise an assertion if the columns of a changed tree aren't
+        the same as the columns built from the changed tree.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        tree = helpers.graid_words_tree()
+        tree.build_columns()
+        tree.remove_element(1)
+        tree.insert_element(helpers.graid_element(300, 'one dog',
+            ['one', 'dog'], 'a cat'), 100)
+        tree.set_annotation(102, 'one')
+        tree.set_annotation(303, 'two')
+        tree.tree[-1][1][0][1][0][0]['annotation'] = 'cat'
+        tree.mark_element_changed(200)
+        tree.append_element(helpers.graid_element(400, 'a bird', ['bird'], ''))
+        tree.insert_element(helpers.graid_element(500, 'birds', ['birds'],
+            ''), 300)
+        tree.set_annotation(402, 'birds')
+
+        # The result expected should be
+        expected_result = columns.AnnotationColumns(data_class)
+        for e in tree.tree:
+            expected_result.add_element(e)
+        assert(len(tree.columns) == len(tree.tree))
+        assert(tree.columns._starts == expected_result._starts)
+        for ann_type in data_class.flat_data_hierarchy:
+            assert(column_content(tree.columns.columns[ann_type]) ==
+                   column_content(expected_result.columns[ann_type]))
+
+    def test_set_annotation(self):
+        """Raise an assertion if the value of an annotation isn't
+        changed in its column, or if an annotation of a removed element
+        is found.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        annotation_columns = columns.AnnotationColumns(data_class)
+        for e in helpers.graid_elements():
+            annotation_columns.add_element(e)
+        annotation_columns.remove_element(2)
+
+        # The result expected should be
+        assert(annotation_columns.set_annotation(102, 'the') == True)
+        assert(annotation_columns.columns['word'].strings[3] == 'the')
+        assert(annotation_columns.set_annotation(109, 'a cat') == True)
+        assert(annotation_columns.columns['translation'].strings[1] ==
+               'a cat')
+        assert(annotation_columns.set_annotation(202, 'dogs') == False)
+        annotation_columns.add_element(helpers.graid_element(200,
+            'dogs and cats', ['dogs', 'and', 'cats'], ''))
+        assert(annotation_columns.set_annotation(202, 'dog') == True)
+        assert(annotation_columns.columns['word'].strings[5] == 'dog')
+        assert(annotation_columns.set_annotation(-1, '') == False)
+
+        # The rows after an inserted element are moved
+        annotation_columns.insert_element(0, helpers.graid_element(300,
+            'a bird', ['a', 'bird'], ''))
+        assert(annotation_columns.set_annotation(202, 'dogs') == True)
+        assert(annotation_columns.columns['word'].strings[7] == 'dogs')
+        assert(annotation_columns.set_annotation(305, 'birds') == True)
+        assert(annotation_columns.columns['word'].strings[1] == 'birds')
+
+    def test_filter_with_columns(self):
+        """Raise an assertion if the filter and search results with
+        columns aren't the same as without the columns.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        tree = helpers.graid_words_tree()
+
+        for inverted in [False, True]:
+            for operation in [annotationtree.AnnotationTreeFilter.AND,
+                              annotationtree.AnnotationTreeFilter.OR]:
+                filter = annotationtree.AnnotationTreeFilter(data_class)
+                filter.set_filter_for_type('word', 'dog')
+                filter.set_filter_for_type('translation', 'cat')
+                filter.set_inverted_filter(inverted)
+                filter.set_boolean_operation(operation)
+
+                tree.columns = None
+                tree.init_filters()
+                tree.append_filter(filter)
+                expected_result = tree.get_filtered_element_ids()
+                expected_hits = list(tree.search([filter]))
+
+                tree.build_columns()
+                tree.init_filters()
+                tree.append_filter(filter)
+
+                # The result expected should be
+                assert(tree.get_filtered_element_ids() == expected_result)
+                assert(list(tree.search([filter])) == expected_hits)
+
+                tree.build_ngram_index()
+                tree.init_filters()
+                tree.append_filter(filter)
+                assert(tree.get_filtered_element_ids() == expected_result)
+                assert(list(tree.search([filter])) == expected_hits)
+                tree.ngram_index = None
+
+    def test_candidates_of_ngram_index(self):
+        """Raise an assertion if the columns check other rows than the
+        rows of the candidates of the n-gram index.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        tree = helpers.graid_words_tree()
+        filter = annotationtree.AnnotationTreeFilter(data_class)
+        filter.set_filter_for_type('word', 'dog')
+        annotation_columns = columns.AnnotationColumns(data_class)
+        for e in tree.tree:
+            annotation_columns.add_element(e)
+
+        # The result expected should be
+        assert(annotation_columns.filter_candidate_positions(filter) ==
+               set([0, 2]))
+        assert(annotation_columns.filter_candidate_positions(filter,
+            set([1, 2])) == set([2]))
+        assert(annotation_columns.filter_candidate_positions(filter,
+            set()) == set())
+        assert(annotation_columns.columns['word'].match_rows('^d',
+            [3, 4, 5]) == [5])
+
+        tree.build_ngram_index()
+        tree.build_columns()
+        assert(tree._filter_candidate_positions(filter) == set([0, 2]))
+        filter.set_filter_for_type('word', '')
+        assert(tree._filter_candidate_positions(filter) is None)
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module contains the tests to the class
+CorpusTrees in the corpus.py module.
+
+Note: The tests made on this use Data Structure
+Graid.
+"""
+
+from pyannotation import data
+from pyannotation import corpus
+from pyannotation import annotationtree
+from pyannotation.tests import helpers
+
+import os
+import shutil
+import tempfile
+
+# Initialize the DataStructureType class
+data_class = data.DataStructureTypeGraid()
+
+def graid_corpus():
+    corpus_trees = corpus.CorpusTrees(data_class)
+    corpus_trees.items.append(('a.pickle',
+        helpers.graid_tree(['one dog', 'two cats', 'three dogs'])))
+    corpus_trees.items.append(('b.pickle',
+        helpers.graid_tree(['a bird', 'a dog'])))
+    return corpus_trees
+
+def dog_filter():
+    filter = annotationtree.AnnotationTreeFilter(data_class)
+    filter.set_filter_for_type('utterance', 'dog')
+    return filter
+
+def pickle_corpus(max_trees = None, max_bytes = None):
+    directory = tempfile.mkdtemp()
+    corpus_trees = corpus.CorpusTrees(data_class, max_trees, max_bytes)
+    for name, utterances in [('a.pickle', ['one dog', 'two cats']),
+                             ('b.pickle', ['a bird', 'a dog']),
+                             ('c.pickle', ['no animals'])]:
+        filepath = os.path.join(directory, name)
+        helpers.graid_tree(utterances).save_tree_as_pickle(filepath)
+        corpus_trees.add_item(filepath, data.TREEPICKLE)
+    return directory, corpus_trees
+
+class TestCorpusTrees:
+
+    def test_search(self):
+        """Raise an assertion if the search results aren't correct.
+
+        Search the elements of all trees that pass a filter chain.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        corpus_trees = graid_corpus()
+        a = corpus_trees.items[0][1]
+        b = corpus_trees.items[1][1]
+
+        # The result expected should be
+        expected_result = [
+            ('a.pickle', a.tree[0][0]['id'],
+             {'utterance': {a.tree[0][0]['id']: [[4, 7]]}}),
+            ('a.pickle', a.tree[2][0]['id'],
+             {'utterance': {a.tree[2][0]['id']: [[6, 9]]}}),
+            ('b.pickle', b.tree[1][0]['id'],
+             {'utterance': {b.tree[1][0]['id']: [[2, 5]]}}) ]
+
+        search = corpus_trees.search([dog_filter()], page_size = 2)
+        assert(list(search) == expected_result)
+        assert(sorted(search.timings.keys()) == ['a.pickle', 'b.pickle'])
+        assert(search.page(1) == expected_result[2:])
+        assert(list(search.pages()) == [expected_result[:2],
+                                        expected_result[2:]])
+
+        search = corpus_trees.search([dog_filter()], limit = 1)
+        assert(list(search) == expected_result[:1])
+
+    def test_search_cache(self):
+        """Raise an assertion if the search cache isn't invalidated when
+        a tree changes.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        corpus_trees = graid_corpus()
+        assert(len(list(corpus_trees.search([dog_filter()]))) == 3)
+        search = corpus_trees.search([dog_filter()])
+        assert(len(list(search)) == 3)
+        assert(search.timings == {'a.pickle': 0.0, 'b.pickle': 0.0})
+
+        tree = corpus_trees.items[1][1]
+        element = tree.empty_element()
+        element[0]['annotation'] = 'the last dog'
+        tree.append_element(element)
+        search = corpus_trees.search([dog_filter()])
+
+        # The result expected should be
+        expected_result = 4
+
+        assert(len(list(search)) == expected_result)
+        assert(search.timings['a.pickle'] == 0.0)
+
+    def test_add_item(self):
+        """Raise an assertion if the trees aren't loaded lazily.
+
+        Register a file and load its tree on the first access.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        directory, corpus_trees = pickle_corpus()
+        try:
+            # The result expected should be
+            assert(corpus_trees.loaded_filepaths() == [])
+            assert(len(corpus_trees.items) == 3)
+            filepath, tree = corpus_trees.items[1]
+            assert(tree.tree[1][0]['annotation'] == 'a dog')
+            assert(corpus_trees.loaded_filepaths() == [filepath])
+
+            binary_filepath = os.path.join(directory, 'b.tree')
+            tree.save_tree_as_binary(binary_filepath)
+            corpus_trees.add_item(binary_filepath, data.TREEBINARY)
+            assert(corpus_trees.items[3][1].tree == tree.tree)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_add_items(self):
+        """Raise an assertion if the trees read in a pool of processes
+        aren't added in order or if a file that cannot be read stops
+        the other files.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        directory, corpus_trees = pickle_corpus()
+        try:
+            filepaths = [filepath for filepath, _ in corpus_trees.items]
+            missing = os.path.join(directory, 'missing.pickle')
+            corpus_trees = corpus.CorpusTrees(data_class, max_trees = 2)
+            errors = corpus_trees.add_items(
+                [filepaths[2], missing, filepaths[0], filepaths[1]],
+                data.TREEPICKLE, workers = 2)
+
+            # The result expected should be
+            assert([filepath for filepath, _ in errors] == [missing])
+            assert([filepath for filepath, _ in corpus_trees.items] ==
+                   [filepaths[2], filepaths[0], filepaths[1]])
+            assert(corpus_trees.loaded_filepaths() == filepaths[:2])
+            assert(corpus_trees.items[0][1].tree[0][0]['annotation'] ==
+                   'no animals')
+            corpus_trees.init_filters()
+            corpus_trees.append_filter(dog_filter())
+            assert(corpus_trees.items[2][1].filtered_element_positions() ==
+                   [1])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_add_items_binary(self):
+        """Raise an assertion if the trees of binary files read in a pool
+        of processes don't have the next annotation id and the journal
+        of the files.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        directory = tempfile.mkdtemp()
+        filepath = os.path.join(directory, 'a.tree')
+        try:
+            tree = helpers.graid_tree(['one dog', 'two cats'])
+            tree.journal_compaction_ratio = 100
+            tree.save_tree_with_journal(filepath)
+            tree.set_annotation(tree.tree[0][0]['id'], 'one big dog')
+            tree.append_empty_element()
+            tree.save_tree_with_journal(filepath)
+
+            for workers in [1, 2]:
+                corpus_trees = corpus.CorpusTrees(data_class)
+                errors = corpus_trees.add_items([filepath], data.TREEBINARY,
+                                                workers = workers)
+                loaded = corpus_trees.items[0][1]
+
+                # The result expected should be
+                assert(errors == [])
+                assert(loaded.tree == tree.tree)
+                assert(loaded._next_annotation_id == tree._next_annotation_id)
+                assert(loaded.journal is not None)
+
+            # The changes of the loaded tree are appended to the journal
+            loaded.set_annotation(tree.tree[1][0]['id'], 'two big cats')
+            loaded.save_tree_with_journal(filepath)
+            reloaded = annotationtree.AnnotationTree(data_class)
+            reloaded.load_tree_from_binary(filepath)
+            assert(reloaded.tree == loaded.tree)
+
+            # A tree of another data structure type is an error
+            corpus_trees = corpus.CorpusTrees(data.DataStructureTypeMorphsynt())
+            errors = corpus_trees.add_items([filepath], data.TREEBINARY)
+            assert([f for f, _ in errors] == [filepath])
+            assert(len(corpus_trees.items) == 0)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_tree_cache(self):
+        """Raise an assertion if the least recently used trees aren't
+        dropped or if modified or pinned trees are dropped.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        directory, corpus_trees = pickle_corpus(max_trees = 1)
+        try:
+            a, b, c = [filepath for filepath, _ in corpus_trees.items]
+            assert(corpus_trees.loaded_filepaths() == [c])
+
+            # a modified tree is kept
+            tree = corpus_trees.items[0][1]
+            tree.remove_element(tree.tree[1][0]['id'])
+            corpus_trees.items[1]
+            assert(corpus_trees.loaded_filepaths() == [a, b])
+            corpus_trees.items[2]
+            assert(corpus_trees.loaded_filepaths() == [a, c])
+            assert(len(corpus_trees.items[0][1]) == 1)
+
+            # a pinned tree is kept
+            corpus_trees.pin(c)
+            corpus_trees.items[1]
+            assert(corpus_trees.loaded_filepaths() == [a, b, c])
+            corpus_trees.unpin(c)
+            assert(corpus_trees.loaded_filepaths() == [a])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_tree_cache_filters(self):
+        """Raise an assertion if a reloaded tree doesn't get the filters
+        of the corpus or if the search cache of an unmodified tree isn't
+        used after it was dropped.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        directory, corpus_trees = pickle_corpus(max_bytes = 1)
+        try:
+            corpus_trees.init_filters()
+            corpus_trees.append_filter(dog_filter())
+            filepath, tree = corpus_trees.items[0]
+            assert(tree.filtered_element_positions() == [0])
+
+            assert(len(list(corpus_trees.search([dog_filter()]))) == 2)
+            search = corpus_trees.search([dog_filter()])
+            assert(len(list(search)) == 2)
+            assert(search.timings[filepath] == 0.0)
+        finally:
+            shutil.rmtree(directory)
@@ -157,4 +157,95 @@ class TestDataStructureType:
                            'translation',
                            'comment']
 
-        assert(data_class._flatten_hierarchy_elements(elements) == expected_result)
\ No newline at end of file
+        assert(data_class._flatten_hierarchy_elements(elements) == expected_result)
+
+    def test_hierarchy_tables(self):
+        """Raise an assertion if the precomputed tables of the hierarchy
+        aren't correct, or if they aren't shared by the objects of a
+        class.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        import pickle
+
+        # If the data structure type is like this
+        graid = data.DataStructureTypeGraid()
+
+        # The result expected should be
+        assert(graid.type_rows['word'] == 2)
+        assert(graid.type_depths['utterance'] == 0)
+        assert(graid.type_depths['graid2'] == 1)
+        assert(graid.type_depths['graid1'] == 2)
+        assert(graid.type_paths['clause unit'] == (1, 0))
+        assert(graid.type_paths['wfw'] == (1, 1, 1))
+        assert(graid.get_siblings_of_type('wfw') == ['word', 'wfw', 'graid1'])
+        assert(graid.get_parents_of_type('graid2') ==
+               graid._get_parents_of_type_helper('graid2',
+                                                 graid.data_hierarchy)[1])
+        assert(data.DataStructureTypeGraid().type_paths is graid.type_paths)
+        assert(pickle.loads(pickle.dumps(graid)).type_rows == graid.type_rows)
+
+
+class TestAnnotation:
+
+    def test_item_access(self):
+        """Raise an assertion if the fields can't be accessed as items.
+
+        Annotations support the dictionary access of older trees.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        annotation = data.Annotation(1, 'word')
+        annotation['annotation'] = 'other word'
+
+        assert(annotation['id'] == 1)
+        assert(annotation.annotation == 'other word')
+        for key in ['tier', '__class__']:
+            try:
+                annotation[key]
+                assert(False)
+            except KeyError:
+                pass
+
+    def test_equality_with_dict(self):
+        """Raise an assertion if an annotation is not equal to a dictionary
+        with the same values.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        annotation = data.Annotation(1, 'word')
+
+        assert(annotation == {'id': 1, 'annotation': 'word'})
+        assert(annotation != {'id': 2, 'annotation': 'word'})
+        assert(annotation == data.Annotation(1, 'word'))
+
+    def test_pickle(self):
+        """Raise an assertion if an annotation changes when pickled.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        import pickle
+
+        annotation = data.Annotation(1, 'word')
+
+        assert(pickle.loads(pickle.dumps(annotation)) == annotation)
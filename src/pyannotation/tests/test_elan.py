@@ -0,0 +1,460 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module contains the tests to the classes
+Eaf, EafPythonic and EafStreamReader in the elan/data.py
+module.
+"""
+
+import io
+import os
+
+from pyannotation import data
+from pyannotation import corpusreader
+from pyannotation.elan import data as elan
+
+# The example file of the repository
+turkish_eaf = os.path.join(os.path.dirname(__file__), '..', '..', '..',
+                           'example_data', 'turkish.eaf')
+
+def tier_content(eaf):
+    # the ids and values of the annotations of all tiers, and the ids
+    # of the sub annotations in the child tiers
+    content = {}
+    for id_tier, linguistic_type in eaf.tiers().items():
+        ids = eaf.getAnnotationIdsForTier(id_tier)
+        content[id_tier] = (linguistic_type,
+            eaf.getLocaleForTier(id_tier),
+            eaf.getParticipantForTier(id_tier),
+            [ (id, eaf.getAnnotationValueForAnnotation(id_tier, id))
+              for id in ids ])
+    for id_tier in eaf.tiers():
+        for id_child, linguistic_type in eaf.tiers().items():
+            if id_child in eaf.getTierIdsForLinguisticType(
+                    linguistic_type, id_tier):
+                content[(id_tier, id_child)] = [
+                    eaf.getSubAnnotationIdsForAnnotationInTier(
+                        id, id_tier, id_child)
+                    for id in eaf.getAnnotationIdsForTier(id_tier) ]
+    return content
+
+def records(annotation_file):
+    # the utterance records of the WORDS parser
+    return annotation_file.create_parser(corpusreader.WORDS).parse()
+
+# The word a3 starts at the same time as the utterance a1, but its
+# time slot comes first in TIME_ORDER
+same_time_eaf = """<?xml version="1.0" encoding="UTF-8"?>
+<ANNOTATION_DOCUMENT FORMAT="2.6" VERSION="2.6">
+    <HEADER MEDIA_FILE="" TIME_UNITS="milliseconds">
+        <PROPERTY NAME="lastUsedAnnotationId">4</PROPERTY>
+    </HEADER>
+    <TIME_ORDER>
+        <TIME_SLOT TIME_SLOT_ID="ts1" TIME_VALUE="1000"/>
+        <TIME_SLOT TIME_SLOT_ID="ts2" TIME_VALUE="2000"/>
+        <TIME_SLOT TIME_SLOT_ID="ts3" TIME_VALUE="500"/>
+        <TIME_SLOT TIME_SLOT_ID="ts4" TIME_VALUE="1500"/>
+        <TIME_SLOT TIME_SLOT_ID="ts5" TIME_VALUE="1000"/>
+    </TIME_ORDER>
+    <TIER LINGUISTIC_TYPE_REF="utterance" TIER_ID="U">
+        <ANNOTATION>
+            <ALIGNABLE_ANNOTATION ANNOTATION_ID="a1" TIME_SLOT_REF1="ts5" TIME_SLOT_REF2="ts2">
+                <ANNOTATION_VALUE>dog barks</ANNOTATION_VALUE>
+            </ALIGNABLE_ANNOTATION>
+        </ANNOTATION>
+    </TIER>
+    <TIER LINGUISTIC_TYPE_REF="words" PARENT_REF="U" TIER_ID="W">
+        <ANNOTATION>
+            <ALIGNABLE_ANNOTATION ANNOTATION_ID="a3" TIME_SLOT_REF1="ts1" TIME_SLOT_REF2="ts4">
+                <ANNOTATION_VALUE>dog</ANNOTATION_VALUE>
+            </ALIGNABLE_ANNOTATION>
+        </ANNOTATION>
+        <ANNOTATION>
+            <ALIGNABLE_ANNOTATION ANNOTATION_ID="a4" TIME_SLOT_REF1="ts4" TIME_SLOT_REF2="ts2">
+                <ANNOTATION_VALUE>barks</ANNOTATION_VALUE>
+            </ALIGNABLE_ANNOTATION>
+        </ANNOTATION>
+        <ANNOTATION>
+            <ALIGNABLE_ANNOTATION ANNOTATION_ID="a2" TIME_SLOT_REF1="ts3" TIME_SLOT_REF2="ts1">
+                <ANNOTATION_VALUE>well</ANNOTATION_VALUE>
+            </ALIGNABLE_ANNOTATION>
+        </ANNOTATION>
+    </TIER>
+    <LINGUISTIC_TYPE LINGUISTIC_TYPE_ID="utterance" TIME_ALIGNABLE="true"/>
+    <LINGUISTIC_TYPE CONSTRAINTS="Included_In" LINGUISTIC_TYPE_ID="words" TIME_ALIGNABLE="true"/>
+</ANNOTATION_DOCUMENT>
+""".encode("utf-8")
+
+# Two utterance tiers with a word and a translation tier each
+two_speakers_eaf = """<?xml version="1.0" encoding="UTF-8"?>
+<ANNOTATION_DOCUMENT FORMAT="2.6" VERSION="2.6">
+    <HEADER MEDIA_FILE="" TIME_UNITS="milliseconds"/>
+    <TIME_ORDER>
+        <TIME_SLOT TIME_SLOT_ID="ts1" TIME_VALUE="0"/>
+        <TIME_SLOT TIME_SLOT_ID="ts2" TIME_VALUE="1000"/>
+    </TIME_ORDER>
+    <TIER LINGUISTIC_TYPE_REF="utterance" TIER_ID="A"/>
+    <TIER LINGUISTIC_TYPE_REF="words" PARENT_REF="A" TIER_ID="A-W"/>
+    <TIER LINGUISTIC_TYPE_REF="translation" PARENT_REF="A" TIER_ID="A-T"/>
+    <TIER LINGUISTIC_TYPE_REF="utterance" TIER_ID="B"/>
+    <TIER LINGUISTIC_TYPE_REF="words" PARENT_REF="B" TIER_ID="B-W"/>
+    <TIER LINGUISTIC_TYPE_REF="translation" PARENT_REF="B" TIER_ID="B-T"/>
+    <LINGUISTIC_TYPE LINGUISTIC_TYPE_ID="utterance" TIME_ALIGNABLE="true"/>
+    <LINGUISTIC_TYPE CONSTRAINTS="Symbolic_Subdivision" LINGUISTIC_TYPE_ID="words" TIME_ALIGNABLE="false"/>
+    <LINGUISTIC_TYPE CONSTRAINTS="Symbolic_Association" LINGUISTIC_TYPE_ID="translation" TIME_ALIGNABLE="false"/>
+</ANNOTATION_DOCUMENT>
+""".encode("utf-8")
+
+class TestEaf:
+
+    def test_getters(self):
+        """Raise an assertion if the getters of EafPythonic don't
+        return the same as the getters of Eaf.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        eaf = elan.Eaf(turkish_eaf)
+        eaf_pythonic = elan.EafPythonic(turkish_eaf)
+
+        # The result expected should be
+        expected_result = tier_content(eaf)
+        assert(tier_content(eaf_pythonic) == expected_result)
+        assert(expected_result[('P-Spch', 'P-Word')][0] ==
+               ['a10', 'a11', 'a12', 'a13', 'a14', 'a15'])
+        assert(eaf_pythonic.getLastUsedAnnotationId() ==
+               eaf.getLastUsedAnnotationId() == 340)
+        for id in eaf.getAnnotationIdsForTier('P-Spch'):
+            assert(eaf_pythonic.getStartTimeForAnnotation('P-Spch', id) ==
+                   eaf.getStartTimeForAnnotation('P-Spch', id))
+            assert(eaf_pythonic.getDurationForAnnotation('P-Spch', id) ==
+                   eaf.getDurationForAnnotation('P-Spch', id))
+        for id in eaf.getAnnotationIdsForTier('P-Word'):
+            assert(eaf_pythonic.getRefAnnotationIdForAnnotationId(
+                'P-Word', id) ==
+                eaf.getRefAnnotationIdForAnnotationId('P-Word', id))
+
+    def test_changes(self):
+        """Raise an assertion if the indexes of Eaf aren't the same as
+        the indexes of the changed file read again.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        eaf = elan.Eaf(turkish_eaf)
+        eaf.appendRefAnnotationToTier('P-Word', 'a341', 'uzun', 'a1',
+                                      'a15')
+        eaf.appendRefAnnotationToTier('P-Trans', 'a342', 'a long way',
+                                      'a2')
+        eaf.removeAnnotationWithId('a11')
+        eaf.updatePrevAnnotationForAnnotation('a12', 'a10')
+        eaf.removeAnnotationWithId('a3')
+        eaf.setAnnotationValueForAnnotation('P-Word', 'a12', 'koşa-koşa')
+        eaf.setAnnotationValueForAnnotation('P-Spch', 'a4', 'o uyurken')
+
+        # The result expected should be
+        expected_result = elan.Eaf(io.BytesIO(eaf.tostring()))
+        assert(tier_content(eaf) == tier_content(expected_result))
+        assert(eaf.getSubAnnotationIdsForAnnotationInTier(
+            'a1', 'P-Spch', 'P-Word') ==
+            ['a10', 'a12', 'a13', 'a14', 'a15', 'a341'])
+        assert(eaf.getAnnotationValueForAnnotation('P-Word', 'a12') ==
+               'koşa-koşa')
+        assert(eaf.annotations_in_range('P-Spch', 0, 14000) == ['a1', 'a2'])
+
+    def test_annotations_in_range(self):
+        """Raise an assertion if the annotations in a time range aren't
+        the annotations that lie in the range.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        eaf = elan.Eaf(turkish_eaf)
+        eaf_pythonic = elan.EafPythonic(turkish_eaf)
+        ids = eaf.getAnnotationIdsForTier('P-Spch')
+
+        for start_ms, end_ms in [(0, 8000), (40, 3590), (41, 3590),
+                                 (3590, 13170), (0, 100000), (0, 0)]:
+            # The result expected should be
+            expected_result = [ id for id in ids
+                if eaf.getStartTimeForAnnotation('P-Spch', id) >= start_ms
+                and eaf.getEndTimeForAnnotation('P-Spch', id) <= end_ms ]
+            assert(eaf.annotations_in_range('P-Spch', start_ms, end_ms) ==
+                   expected_result)
+            assert(eaf_pythonic.annotations_in_range(
+                'P-Spch', start_ms, end_ms) == expected_result)
+        assert(eaf.annotations_in_range('P-Spch', 0, 8000) == ['a1', 'a2'])
+        assert(eaf.annotations_in_range('P-Spch', 41, 3590) == [])
+
+class TestTierSelection:
+
+    def test_tiers(self):
+        """Raise an assertion if the tiers read with a whitelist aren't
+        the whitelisted tiers and the tiers they descend from.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        for read_only in [True, False]:
+            # If the variables value equal like this
+            by_id = elan.EafAnnotationFileObject(
+                io.BytesIO(two_speakers_eaf), tiers = ['A-W'],
+                read_only = read_only)
+            by_type = elan.EafAnnotationFileObject(
+                io.BytesIO(two_speakers_eaf), linguistic_types = ['words'],
+                read_only = read_only)
+            utterances = elan.EafAnnotationFileObject(
+                io.BytesIO(two_speakers_eaf),
+                linguistic_types = ['utterance'], read_only = read_only)
+
+            # The result expected should be
+            assert(sorted(by_id.file.tiers()) == ['A', 'A-W'])
+            assert(sorted(by_type.file.tiers()) == ['A', 'A-W', 'B', 'B-W'])
+            assert(sorted(utterances.file.tiers()) == ['A', 'B'])
+
+    def test_records(self):
+        """Raise an assertion if the records of a file read with a
+        whitelist of its word and gloss types are empty or don't contain
+        the utterances and words of the whole file.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        expected_result = records(elan.EafAnnotationFileObject(turkish_eaf))
+
+        for read_only in [True, False]:
+            annotation_file = elan.EafAnnotationFileObject(turkish_eaf,
+                linguistic_types = ['Wort', 'Glosse'], read_only = read_only)
+            result = records(annotation_file)
+
+            # The result expected should be
+            assert(sorted(annotation_file.file.tiers()) ==
+                   ['P-Gloss', 'P-Morph', 'P-Spch', 'P-Word'])
+            assert(len(result) == len(expected_result) > 0)
+            for record, expected_record in zip(result, expected_result):
+                assert(record[:3] == expected_record[:3])
+                assert(record[3] == [[]])
+            assert(records(elan.EafAnnotationFileObject(turkish_eaf,
+                tiers = ['P-Word', 'P-Trans'], read_only = read_only)) ==
+                expected_result)
+
+class TestTimeOrder:
+
+    def test_time_order(self):
+        """Raise an assertion if the values and keys of the time slots
+        aren't correct.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        time_order = elan.TimeOrder()
+        time_order.append('ts1', '100')
+        time_order.append('ts2')
+        time_order.append('ts3', '100')
+        time_order.append('ts4', '50')
+
+        # The result expected should be
+        assert(len(time_order) == 4)
+        assert([time_order.value(ts) for ts in ['ts1', 'ts2', 'ts3', 'ts4']]
+               == [100, 100, 100, 50])
+        assert(time_order.isAligned('ts1') and
+               not time_order.isAligned('ts2'))
+        assert(time_order.key('ts1') == time_order.key('ts3'))
+        assert(time_order.key('ts1') < time_order.key('ts2') <
+               time_order.end_key('ts3'))
+        assert(time_order.key('ts4') < time_order.key('ts1'))
+        assert(sorted(['ts2', 'ts4', 'ts1'], key=time_order.key) ==
+               ['ts4', 'ts1', 'ts2'])
+
+    def test_same_time_value(self):
+        """Raise an assertion if a word that starts at the same time as
+        its utterance, with a time slot that comes first in TIME_ORDER,
+        is not a sub annotation of the utterance.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        eaf = elan.Eaf(io.BytesIO(same_time_eaf))
+        eaf_pythonic = elan.EafPythonic(io.BytesIO(same_time_eaf))
+        annotation_file = elan.EafStreamAnnotationFileObject(
+            io.BytesIO(same_time_eaf))
+        tier_handler = annotation_file.create_tier_handler()
+        records = list(annotation_file.file.utterance_records(tier_handler))
+
+        # The result expected should be
+        expected_result = ['a3', 'a4']
+        assert(eaf.getSubAnnotationIdsForAnnotationInTier(
+            'a1', 'U', 'W') == expected_result)
+        assert(eaf_pythonic.getSubAnnotationIdsForAnnotationInTier(
+            'a1', 'U', 'W') == expected_result)
+        assert([w[0] for w in records[0][2]] == expected_result)
+        assert(eaf.annotations_in_range('W', 1000, 2000) == expected_result)
+        assert(eaf_pythonic.annotations_in_range('W', 1000, 2000) ==
+               expected_result)
+
+class TestStreamReader:
+
+    def test_records(self):
+        """Raise an assertion if the records of EafStreamReader aren't
+        the records of EafPythonic and Eaf.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        expected_result = records(elan.EafAnnotationFileObject(
+            turkish_eaf, read_only = False))
+        stream_file = elan.EafStreamAnnotationFileObject(turkish_eaf)
+        parser = stream_file.create_parser(corpusreader.WORDS)
+
+        # The result expected should be
+        assert(records(elan.EafAnnotationFileObject(turkish_eaf)) ==
+               expected_result)
+        assert(list(parser.records()) == expected_result)
+        assert(len(expected_result) == 9)
+        assert(stream_file.file.getTierIdsForLinguisticType(
+            'Wort', 'P-Spch') == ['P-Word'])
+        assert(stream_file.file.getLastUsedAnnotationId() == 340)
+
+    def test_create_parser(self):
+        """Raise an assertion if the stream builder doesn't create a
+        parser for WORDS or doesn't reject other types like the other
+        builders.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        for annotation_file in [
+                elan.EafAnnotationFileObject(turkish_eaf),
+                elan.EafStreamAnnotationFileObject(turkish_eaf)]:
+            # The result expected should be
+            assert(isinstance(annotation_file.create_parser(
+                corpusreader.WORDS), elan.EafAnnotationFileParser))
+            try:
+                annotation_file.create_parser(corpusreader.POS)
+            except data.DataStructureTypeNotSupportedError:
+                pass
+            else:
+                assert(False)
+
+class TestReadOnly:
+
+    def test_writers(self):
+        """Raise an assertion if the writers and mutators of a file that
+        was opened read-only don't read the file again with Eaf.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        results = []
+        for read_only in [True, False]:
+            annotation_file = elan.EafAnnotationFileObject(
+                turkish_eaf, read_only = read_only)
+            parser = annotation_file.create_parser(corpusreader.GLOSS)
+            tree = parser.parse()
+            tree[0][1] = 'dün akşam eve geldim'
+            results.append(parser.get_file(tree, 'P-Spch', 'P-Word',
+                'P-Morph', 'P-Gloss', 'P-Trans'))
+            parser.remove_annotation_with_id('a2')
+            parser.tier_handler.add_tier('P-Note', 'Notiz',
+                'Symbolic_Association', 'P-Spch', 'en', '')
+
+            # The result expected should be
+            assert(isinstance(annotation_file.file, elan.Eaf))
+            assert(parser.eaf.getAnnotationIdsForTier('P-Spch')[:2] ==
+                   ['a1', 'a3'])
+            assert(annotation_file.file.getLinguisticTypeForTier('P-Note')
+                   == 'Notiz')
+        assert(results[0] == results[1])
+        assert('dün akşam eve geldim'.encode('utf-8') in results[0])
+
+        stream_file = elan.EafStreamAnnotationFileObject(turkish_eaf)
+        parser = stream_file.create_parser(corpusreader.WORDS)
+        try:
+            parser.remove_annotation_with_id('a2')
+        except data.ReadOnlyFileError:
+            pass
+        else:
+            assert(False)
+
+class TestExpatHandler:
+
+    def test_parse(self):
+        """Raise an assertion if the file read by the expat handler
+        isn't the same as the file read by Eaf, also for values with
+        character references and several lines.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        changed_eaf = same_time_eaf.replace(b'>dog barks<',
+            b'>dog &amp; cat\n&#246;<')
+        eaf = elan.Eaf(io.BytesIO(changed_eaf))
+        eaf_pythonic = elan.EafPythonic(io.BytesIO(changed_eaf))
+        from_path = elan.EafPythonic(turkish_eaf)
+        with open(turkish_eaf, 'rb') as file:
+            from_file = elan.EafPythonic(file)
+
+        # The result expected should be
+        assert(tier_content(eaf_pythonic) == tier_content(eaf))
+        assert(eaf_pythonic.getAnnotationValueForAnnotation('U', 'a1') ==
+               'dog & cat\n\u00f6')
+        assert(eaf_pythonic.getLastUsedAnnotationId() == 4)
+        assert(tier_content(from_file) == tier_content(from_path))
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module contains the tests to the class
+TreeJournal in the journal.py module and to the
+incremental save of the class AnnotationTree.
+
+Note: The tests made on this use Data Structure
+Graid.
+"""
+
+from pyannotation import data
+from pyannotation import journal
+from pyannotation import annotationtree
+from pyannotation.tests import helpers
+
+import os
+import shutil
+import tempfile
+
+# Initialize the DataStructureType class
+data_class = data.DataStructureTypeGraid()
+
+def loaded_tree(filepath):
+    tree = annotationtree.AnnotationTree(data_class)
+    tree.load_tree_from_binary(filepath)
+    return tree
+
+class TestTreeJournal:
+
+    def test_save_tree_with_journal(self):
+        """Raise an assertion if the tree loaded from the tree file and
+        the journal isn't the same as the saved tree, or if the tree file
+        is written again for a save of the changes.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        directory = tempfile.mkdtemp()
+        filepath = os.path.join(directory, 'tree.bin')
+        try:
+            tree = helpers.graid_tree(['one dog', 'two cats', 'a bird'])
+            tree.journal_compaction_ratio = 100
+            tree.save_tree_with_journal(filepath)
+            modified = os.path.getmtime(filepath)
+            size = os.path.getsize(filepath)
+
+            first_id = tree.tree[0][0]['id']
+            tree.set_annotation(first_id, 'one big dog')
+            tree.remove_element(tree.tree[1][0]['id'])
+            element = tree.empty_element()
+            element[0]['annotation'] = 'three cats'
+            tree.insert_element(element, first_id)
+            tree.tree[-1][3]['annotation'] = 'a comment'
+            tree.mark_element_changed(tree.tree[-1][0]['id'])
+            tree.append_empty_element()
+            tree.save_tree_with_journal(filepath)
+
+            # The result expected should be
+            assert(os.path.getmtime(filepath) == modified)
+            assert(os.path.getsize(filepath) == size)
+            loaded = loaded_tree(filepath)
+            assert(loaded.tree == tree.tree)
+            assert(loaded._next_annotation_id == tree._next_annotation_id)
+
+            # The changes of the loaded tree are appended
+            loaded.set_annotation(first_id, 'one dog')
+            loaded.save_tree_with_journal(filepath)
+            assert(loaded_tree(filepath).tree == loaded.tree)
+
+            mapped = annotationtree.AnnotationTree(data_class)
+            mapped.map_tree_file(filepath)
+            assert(mapped.tree == loaded.tree)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_truncated_journal(self):
+        """Raise an assertion if a journal with an incomplete last record
+        isn't replayed up to the last complete record, or if the next
+        save doesn't overwrite the incomplete record.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        directory = tempfile.mkdtemp()
+        filepath = os.path.join(directory, 'tree.bin')
+        journal_filepath = filepath + journal.SUFFIX
+        try:
+            tree = helpers.graid_tree(['one dog', 'two cats'])
+            tree.journal_compaction_ratio = 100
+            tree.save_tree_with_journal(filepath)
+            tree.set_annotation(tree.tree[0][0]['id'], 'one big dog')
+            tree.save_tree_with_journal(filepath)
+            expected_result = [e[0]['annotation'] for e in tree.tree]
+            complete_length = os.path.getsize(journal_filepath)
+
+            tree.set_annotation(tree.tree[1][0]['id'], 'two big cats')
+            tree.save_tree_with_journal(filepath)
+            content = open(journal_filepath, 'rb').read()
+            for length in range(complete_length, len(content)):
+                file = open(journal_filepath, 'wb')
+                file.write(content[:length])
+                file.close()
+
+                # The result expected should be
+                loaded = loaded_tree(filepath)
+                assert([e[0]['annotation'] for e in loaded.tree] ==
+                       expected_result)
+
+            # A tail that was filled with zeros is not replayed
+            file = open(journal_filepath, 'wb')
+            file.write(content[:complete_length] + b'\0' * 32)
+            file.close()
+            loaded = loaded_tree(filepath)
+            assert([e[0]['annotation'] for e in loaded.tree] ==
+                   expected_result)
+
+            # A corrupt record is not replayed either
+            loaded.remove_element(loaded.tree[0][0]['id'])
+            loaded.save_tree_with_journal(filepath)
+            file = open(journal_filepath, 'r+b')
+            file.seek(-1, os.SEEK_END)
+            last_byte = file.read(1)
+            file.seek(-1, os.SEEK_END)
+            file.write(bytes(bytearray([ord(last_byte) ^ 0xff])))
+            file.close()
+            assert(len(loaded_tree(filepath)) == 2)
+
+            # The next save overwrites the corrupt record
+            loaded = loaded_tree(filepath)
+            loaded.remove_element(loaded.tree[1][0]['id'])
+            loaded.save_tree_with_journal(filepath)
+            assert([e[0]['annotation'] for e in loaded_tree(filepath).tree] ==
+                   expected_result[:1])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_compaction(self):
+        """Raise an assertion if the tree file isn't written again when
+        the journal grows too large, or if an old journal is replayed on
+        the new tree file.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        directory = tempfile.mkdtemp()
+        filepath = os.path.join(directory, 'tree.bin')
+        journal_filepath = filepath + journal.SUFFIX
+        try:
+            tree = helpers.graid_tree(['one dog', 'two cats'])
+            tree.journal_compaction_ratio = 100
+            tree.save_tree_with_journal(filepath)
+            tree.set_annotation(tree.tree[0][0]['id'], 'one big dog')
+            tree.save_tree_with_journal(filepath)
+            old_journal = open(journal_filepath, 'rb').read()
+            tree.journal_compaction_ratio = 0
+            tree.set_annotation(tree.tree[0][0]['id'], 'one small dog')
+            tree.save_tree_with_journal(filepath)
+
+            # The result expected should be
+            assert(os.path.getsize(journal_filepath) < len(old_journal))
+            assert(loaded_tree(filepath).tree == tree.tree)
+
+            file = open(journal_filepath, 'wb')
+            file.write(old_journal)
+            file.close()
+            assert(loaded_tree(filepath).tree == tree.tree)
+        finally:
+            shutil.rmtree(directory)
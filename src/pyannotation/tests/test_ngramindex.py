@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module contains the tests to the class
+NgramIndex and the literal extraction in the
+ngramindex.py module.
+
+Note: The tests made on this use Data Structure
+Graid.
+"""
+
+from pyannotation import data
+from pyannotation import annotationtree
+from pyannotation import ngramindex
+from pyannotation.tests import helpers
+
+# Initialize the DataStructureType class
+data_class = data.DataStructureTypeGraid()
+
+class TestNgramIndex:
+
+    def test_required_literals(self):
+        """Raise an assertion if the literals aren't correct.
+
+        Return literal strings that every match contains.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        assert(ngramindex.required_literals('dog') == ['dog'])
+        assert(ngramindex.required_literals('^gu\\.PRS') == ['gu.PRS'])
+        assert(ngramindex.required_literals('ab(cd)?ef') == ['ab', 'ef'])
+        assert(ngramindex.required_literals('colou?r') == ['colo', 'r'])
+        assert(ngramindex.required_literals('[abc]def+g') == ['def', 'g'])
+        assert(ngramindex.required_literals('(?=abc)de') == ['de'])
+        assert(ngramindex.required_literals('dog|cat') == [])
+        assert(ngramindex.required_literals('(?i)dog') == [])
+        assert(ngramindex.required_literals('(?:dog){e<=1}') == [])
+        assert(ngramindex.required_literals('dog{e<=1}') == [])
+        assert(ngramindex.required_literals('\\L<animals>s') == ['s'])
+
+    def test_candidate_ids(self):
+        """Raise an assertion if the candidates aren't correct.
+
+        Return the ids of the elements that may contain a match.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        index = ngramindex.NgramIndex(data_class)
+        index.add_element(1, helpers.graid_element(1, 'the dog barks',
+            ['the', 'dog', 'barks'], 'a dog'))
+        index.add_element(100, helpers.graid_element(100, 'a cat',
+            ['a', 'cat'], 'a cat'))
+
+        # The result expected should be
+        assert(index.candidate_ids('utterance', 'dog') == set([1]))
+        assert(index.candidate_ids('word', '^ca') == None)
+        assert(index.candidate_ids('word', 'cat$') == set([100]))
+        assert(index.candidate_ids('word', 'bird') == set())
+        index.remove_element(100)
+        assert(index.candidate_ids('word', 'cat$') == set())
+
+    def test_filter_with_index(self):
+        """Raise an assertion if the filter results with an index
+        aren't the same as without the index.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        tree = annotationtree.AnnotationTree(data_class)
+        tree.append_element(helpers.graid_element(1, 'the dog barks',
+            ['the', 'dog', 'barks'], 'a dog'))
+        tree.append_element(helpers.graid_element(100, 'a cat',
+            ['a', 'cat'], 'a cat'))
+        tree.append_element(helpers.graid_element(200, 'dogs and cats',
+            ['dogs', 'and', 'cats'], ''))
+
+        for inverted in [False, True]:
+            for operation in [annotationtree.AnnotationTreeFilter.AND,
+                              annotationtree.AnnotationTreeFilter.OR]:
+                filter = annotationtree.AnnotationTreeFilter(data_class)
+                filter.set_filter_for_type('word', 'dog')
+                filter.set_filter_for_type('translation', 'cat')
+                filter.set_inverted_filter(inverted)
+                filter.set_boolean_operation(operation)
+
+                tree.ngram_index = None
+                tree.init_filters()
+                tree.append_filter(filter)
+                expected_result = tree.get_filtered_element_ids()
+
+                tree.build_ngram_index()
+                tree.init_filters()
+                tree.append_filter(filter)
+
+                assert(tree.get_filtered_element_ids() == expected_result)
+
+        # The index follows the changes of the tree
+        tree.remove_element(1)
+        tree.insert_element(helpers.graid_element(300, 'one dog',
+            ['one', 'dog'], 'a cat'), 100)
+        filter = annotationtree.AnnotationTreeFilter(data_class)
+        filter.set_filter_for_type('word', 'dog')
+        tree.init_filters()
+        tree.append_filter(filter)
+
+        assert(tree.get_filtered_element_ids() == [300, 200])
+
+    def test_fuzzy_filter_with_index(self):
+        """Raise an assertion if the filter results of a pattern with
+        fuzzy constraints with an index aren't the same as without the
+        index.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        tree = annotationtree.AnnotationTree(data_class)
+        tree.append_element(helpers.graid_element(1, 'the dig barks',
+            ['the', 'dig', 'barks'], 'a dog'))
+        tree.append_element(helpers.graid_element(100, 'a cat',
+            ['a', 'cat'], 'a cat'))
+
+        # 'dog{e<=1}' only allows an error in the 'g'
+        for pattern, result in [('(?:dog){e<=1}', [1]), ('dog{e<=1}', [])]:
+            filter = annotationtree.AnnotationTreeFilter(data_class)
+            filter.set_filter_for_type('utterance', pattern)
+
+            tree.ngram_index = None
+            tree.init_filters()
+            tree.append_filter(filter)
+            expected_result = tree.get_filtered_element_ids()
+
+            tree.build_ngram_index()
+            tree.init_filters()
+            tree.append_filter(filter)
+
+            # The result expected should be
+            assert(tree.get_filtered_element_ids() == expected_result)
+            assert(expected_result == result)
+
+    def test_index_follows_changed_annotations(self):
+        """Raise an assertion if the filter results with an index
+        aren't correct after annotations were changed.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        tree = annotationtree.AnnotationTree(data_class)
+        tree.append_element(helpers.graid_element(1, 'the dog barks',
+            ['the', 'dog', 'barks'], 'a dog'))
+        tree.append_element(helpers.graid_element(100, 'a cat',
+            ['a', 'cat'], 'a cat'))
+        tree.build_ngram_index()
+        index = tree.ngram_index
+        tree.set_annotation(105, 'bird')
+        tree.get_element(1)[1][0][1][1][0]['annotation'] = 'bird'
+        tree.mark_element_changed(1)
+
+        filter = annotationtree.AnnotationTreeFilter(data_class)
+        filter.set_filter_for_type('word', 'bird')
+        tree.init_filters()
+        tree.append_filter(filter)
+
+        # The result expected should be
+        assert(tree.get_filtered_element_ids() == [1, 100])
+        assert(tree.ngram_index is index)
+        assert(index.candidate_ids('word', 'bird') == set([1, 100]))
+        assert(index.element_of_annotation(105) == 100)
+        tree.remove_element(100)
+        assert(index.element_of_annotation(105) == None)
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module contains the tests to the counts and
+concordances of the statistics.py module.
+
+Note: The tests made on this use Data Structure
+Morphsynt.
+"""
+
+from pyannotation import data
+from pyannotation import corpus
+from pyannotation import corpusreader
+from pyannotation import annotationtree
+from pyannotation import statistics
+
+# Initialize the DataStructureType class
+data_class = data.DataStructureTypeMorphsynt()
+
+def morphsynt_tree(utterances):
+    # utterances are lists of words, words are lists of
+    # (morpheme, glosses) tuples
+    tree = annotationtree.AnnotationTree(data_class)
+    next_id = [0]
+    def annotation(value):
+        next_id[0] += 1
+        return {'id': next_id[0], 'annotation': value}
+    for words in utterances:
+        tree.append_element([annotation(' '.join(
+                ''.join(m for m, g in w) for w in words)),
+            [ [annotation(''.join(m for m, g in w)),
+                [ [annotation(m), [ [annotation(gloss)] for gloss in g ]]
+                  for m, g in w ]]
+              for w in words ],
+            annotation(''), annotation('')])
+    return tree
+
+def records(utterances):
+    # the records of a corpus reader for the same utterances
+    return [ [None, '', [ [None, ''.join(m for m, g in w),
+                [ [None, m, [ [None, gloss] for gloss in g ]]
+                  for m, g in w ]]
+              for w in words ], '', None, None]
+            for words in utterances ]
+
+utterances_a = [
+    [[('dog', ['N'])], [('bark', ['V']), ('s', ['3SG'])]],
+    [[('dog', ['N']), ('s', ['PL'])]] ]
+
+utterances_b = [
+    [[('cat', ['N'])], [('bark', ['V']), ('s', ['3SG', 'PRS'])]] ]
+
+def statistics_corpus():
+    corpus_trees = corpus.CorpusTrees(data_class)
+    corpus_trees.items.append(('a', morphsynt_tree(utterances_a)))
+    corpus_trees.items.append(('b', morphsynt_tree(utterances_b)))
+    return corpus_trees
+
+def statistics_reader():
+    reader = corpusreader.GlossCorpusReader()
+    reader.annotationtrees.append(
+        ['a', corpusreader.AnnotationRecords('a', records(utterances_a))])
+    reader.annotationtrees.append(
+        ['b', corpusreader.AnnotationRecords('b', records(utterances_b))])
+    return reader
+
+class TestStatistics:
+
+    def test_frequencies(self):
+        """Raise an assertion if the frequencies of the tokens of
+        the trees or of a corpus reader aren't correct.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        tokens = statistics.tokens_of_trees(statistics_corpus(), 'morpheme')
+        reader_tokens = statistics.tokens_of_reader(statistics_reader(),
+                                                    'morpheme')
+
+        # The result expected should be
+        expected_result = [('s', 3), ('bark', 2), ('dog', 2), ('cat', 1)]
+        assert(sorted(tokens.most_common(), key=lambda f: (-f[1], f[0])) ==
+               expected_result)
+        assert(sorted(reader_tokens.most_common(),
+                      key=lambda f: (-f[1], f[0])) == expected_result)
+        assert(list(tokens.utterance_starts) == [0, 3, 5, 8])
+        assert(list(tokens.document_starts) == [0, 5, 8])
+        assert(list(reader_tokens.utterance_starts) ==
+               list(tokens.utterance_starts))
+        assert(list(reader_tokens.document_starts) ==
+               list(tokens.document_starts))
+        assert(tokens.most_common(1) == [('s', 3)])
+
+    def test_ngrams(self):
+        """Raise an assertion if the n-gram counts aren't correct or if
+        an n-gram spans utterances.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        tokens = statistics.tokens_of_trees(statistics_corpus(), 'morpheme')
+
+        # The result expected should be
+        assert(sorted(tokens.most_common_ngrams(2)) ==
+               [(('bark', 's'), 2), (('cat', 'bark'), 1),
+                (('dog', 'bark'), 1), (('dog', 's'), 1)])
+        assert(tokens.most_common_ngrams(4) == [])
+
+    def test_cooccurrences(self):
+        """Raise an assertion if the morpheme and gloss pairs of the
+        trees or of a corpus reader aren't counted correctly.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        cooccurrences = statistics.cooccurrences_of_trees(
+            statistics_corpus(), 'morpheme', 'gloss')
+        inverse = statistics.cooccurrences_of_trees(
+            statistics_corpus(), 'gloss', 'morpheme')
+        reader_cooccurrences = statistics.cooccurrences_of_reader(
+            statistics_reader())
+
+        # The result expected should be
+        expected_result = [(('bark', 'V'), 2), (('cat', 'N'), 1),
+            (('dog', 'N'), 2), (('s', '3SG'), 2), (('s', 'PL'), 1),
+            (('s', 'PRS'), 1)]
+        assert(sorted(cooccurrences.most_common()) == expected_result)
+        assert(sorted(reader_cooccurrences.most_common()) ==
+               expected_result)
+        assert(sorted(((b, a), c) for (a, b), c in inverse.most_common()) ==
+               expected_result)
+        assert(cooccurrences.count('s', '3SG') == 2)
+        assert(cooccurrences.count('s', 'N') == 0)
+        assert(cooccurrences.as_array().sum() == 9)
+
+    def test_concordance(self):
+        """Raise an assertion if the concordance windows aren't correct
+        or if a window spans files.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        tokens = statistics.tokens_of_trees(statistics_corpus(), 'morpheme')
+        concordance = tokens.concordance('bark', 2)
+
+        # The result expected should be
+        assert(list(concordance.positions) == [1, 6])
+        assert(concordance.lines() ==
+               [('a', 'dog', 'bark', 's dog'), ('b', 'cat', 'bark', 's')])
+        assert(list(concordance.windows[1][:2]) ==
+               [-1, tokens.vocabulary.code('cat')])
+        assert(len(tokens.concordance('bird')) == 0)
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module contains the tests to the functions
+write_tree and read_tree and to the class MappedTreeFile
+in the treefile.py module, and to the binary files of the
+class AnnotationTree.
+
+Note: The tests made on this use Data Structure
+Graid.
+"""
+
+from pyannotation import data
+from pyannotation import treefile
+from pyannotation import annotationtree
+from pyannotation.tests import helpers
+
+import io
+import os
+import tempfile
+
+# Initialize the DataStructureType class
+data_class = data.DataStructureTypeGraid()
+
+def saved_tree_file(tree):
+    handle, filepath = tempfile.mkstemp()
+    os.close(handle)
+    tree.save_tree_as_binary(filepath)
+    return filepath
+
+class TestTreeFile:
+
+    def test_write_and_read_tree(self):
+        """Raise an assertion if the header and the elements read from
+        a tree file aren't the written ones.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        tree = helpers.graid_words_tree()
+        tree.tree[2][0]['annotation'] = 'dögs and cäts'
+        file = io.BytesIO()
+        treefile.write_tree(file, tree, { 'title': 'Test' })
+        file.seek(0)
+        header, elements, annotations = treefile.read_tree(file)
+
+        # The result expected should be
+        assert(elements == tree.tree)
+        assert(header['data_structure_type'] == data_class.name)
+        assert(header['data_hierarchy'] == data_class.data_hierarchy)
+        assert(header['next_annotation_id'] == tree._next_annotation_id)
+        assert(header['elements'] == 3)
+        assert(header['title'] == 'Test')
+        assert(len(annotations) == 14 + 11 + 14)
+        assert(annotations[0] is elements[0][0])
+        assert(isinstance(annotations[0], data.Annotation))
+
+    def test_read_tree_errors(self):
+        """Raise an assertion if a file that isn't a tree file or is
+        truncated is read without an error.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        file = io.BytesIO()
+        treefile.write_tree(file, helpers.graid_words_tree())
+        content = file.getvalue()
+
+        # The result expected should be
+        for invalid in [b'NOTATREE' + content[8:], content[:len(content) // 2]]:
+            try:
+                treefile.read_tree(io.BytesIO(invalid))
+                assert(False)
+            except data.UnknownFileFormatError:
+                pass
+
+    def test_mapped_tree_file(self):
+        """Raise an assertion if the elements read from a mapped tree file
+        aren't the written elements.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        tree = helpers.graid_words_tree()
+        filepath = saved_tree_file(tree)
+        try:
+            tree_file = treefile.MappedTreeFile(filepath)
+            try:
+                # The result expected should be
+                assert(len(tree_file) == 3)
+                assert(tree_file.header['elements'] == 3)
+                assert(tree_file.element(1) == tree.tree[1])
+                assert(tree_file.element(-1) == tree.tree[2])
+                assert(list(tree_file.elements(1)) == tree.tree[1:])
+                assert(list(tree_file.elements(0, 2)) == tree.tree[:2])
+                assert(tree_file.position_of_element(100) == 1)
+                assert(tree_file.position_of_element(101) == None)
+                assert(tree_file.positions_of_id_range(2, 200) == [1, 2])
+                assert(tree_file.positions_of_id_range(300, 400) == [])
+                assert(tree_file.read_tree()[1] == tree.tree)
+                try:
+                    tree_file.element(3)
+                    assert(False)
+                except IndexError:
+                    pass
+            finally:
+                tree_file.close()
+        finally:
+            os.remove(filepath)
+
+    def test_mapped_tree_file_errors(self):
+        """Raise an assertion if a file that isn't a tree file or is
+        truncated is mapped without an error.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        filepath = saved_tree_file(helpers.graid_words_tree())
+        try:
+            file = open(filepath, "rb")
+            content = file.read()
+            file.close()
+
+            # The result expected should be
+            for invalid in [b'NOTATREE' + content[8:],
+                            content[:len(content) - 8]]:
+                file = open(filepath, "wb")
+                file.write(invalid)
+                file.close()
+                try:
+                    treefile.MappedTreeFile(filepath)
+                    assert(False)
+                except data.UnknownFileFormatError:
+                    pass
+        finally:
+            os.remove(filepath)
+
+class TestAnnotationTreeBinary:
+
+    def test_save_and_load_tree_as_binary(self):
+        """Raise an assertion if the tree loaded from a binary tree file
+        isn't the same as the saved tree.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        saved_tree = helpers.graid_words_tree()
+        filepath = saved_tree_file(saved_tree)
+        try:
+            tree = annotationtree.AnnotationTree(data_class)
+            tree.load_tree_from_binary(filepath)
+
+            # The result expected should be
+            assert(tree.tree == saved_tree.tree)
+            assert(tree._next_annotation_id ==
+                   saved_tree._next_annotation_id)
+            element_id = tree.tree[-1][0]['id']
+            assert(tree.get_element(element_id) is tree.tree[-1])
+            annotation = tree.tree[0][1][0][1][0][0]
+            assert(tree.get_annotation(annotation['id']) is annotation)
+
+            tree = annotationtree.AnnotationTree(
+                data.DataStructureTypeMorphsynt())
+            try:
+                tree.load_tree_from_binary(filepath)
+                assert(False)
+            except data.DataStructureTypeNotSupportedError:
+                pass
+        finally:
+            os.remove(filepath)
+
+    def test_map_tree_file(self):
+        """Raise an assertion if the elements read from a mapped tree file
+        aren't the elements of the saved tree.
+
+        Raises
+        ------
+        AssertionError
+            If the results there aren't the expected.
+
+        """
+
+        # If the variables value equal like this
+        elements = helpers.graid_words_tree().tree
+        filepath = saved_tree_file(helpers.graid_words_tree())
+        try:
+            tree = annotationtree.AnnotationTree(data_class)
+            tree.map_tree_file(filepath)
+            first_id = elements[1][0]['id']
+            last_id = elements[2][0]['id']
+
+            # The result expected should be
+            assert(len(tree) == len(elements))
+            assert(tree.get_element_at(2) == elements[2])
+            assert(tree.get_element(last_id) == elements[2])
+            assert(tree.get_elements_in_id_range(first_id, last_id) ==
+                   elements[1:3])
+            assert(list(tree.elements()) == elements)
+            assert(tree.tree_file is not None)
+
+            # The whole tree is read when it is changed
+            tree.remove_element(first_id)
+            assert(tree.tree_file is None)
+            assert(tree.tree == elements[:1] + elements[2:])
+        finally:
+            os.remove(filepath)
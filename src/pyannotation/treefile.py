@@ -0,0 +1,519 @@
+# -*- coding: utf-8 -*-
+#
+# Poio Tools for Linguists
+#
+# Copyright (C) 2009-2012 Poio Project
+# Author: Peter Bouda <pbouda@cidles.eu>
+# URL: <http://www.cidles.eu/ltll/poio>
+# For license information, see LICENSE.TXT
+"""This module contains the binary file format of annotation
+trees. A file starts with a header that stores the format
+version, the name and the hierarchy of the data structure type,
+the next annotation id and the number of elements. The
+annotation values follow as a table of unique strings, and the
+structure of the elements as flat integer arrays:
+
+* the number of children of each list in the elements, in the
+  order of a walk through the data hierarchy,
+* the id of each annotation, -1 for annotations without id,
+* the position of the value of each annotation in the string
+  table.
+
+The structure of the elements is given by the data hierarchy,
+so only the lengths of the lists are stored. All integers are
+stored in little-endian byte order.
+
+Since format version 2 the sections are aligned to 8 bytes and
+followed by the tables for random access: the byte offsets of
+the strings, the positions in the arrays where each element
+starts and the element ids in sorted order with the positions
+of their elements. MappedTreeFile uses these tables to read
+single elements from a memory-mapped file.
+"""
+
+from __future__ import unicode_literals
+
+import sys
+import mmap
+import json
+import array
+import bisect
+import struct
+
+import pyannotation.data as data
+
+MAGIC = b"PYANTREE"
+
+FORMAT_VERSION = 2
+
+_PREAMBLE = struct.Struct("<8sHI")
+
+_SECTION = struct.Struct("<Q")
+
+_decoders = dict()
+
+def write_tree(file, annotation_tree, header_fields = None):
+    """Write an annotation tree to a binary file.
+
+    Parameters
+    ----------
+    file : file
+        A file object opened for writing in binary mode.
+    annotation_tree : annotationtree.AnnotationTree
+        The tree to write.
+    header_fields : dict
+        Additional fields of the header.
+
+    Raises
+    ------
+    ValueError
+        If an element does not match the data hierarchy or an
+        annotation id is not an int.
+
+    """
+
+    data_structure_type = annotation_tree.data_structure_type
+    hierarchy = data_structure_type.data_hierarchy
+    strings = dict()
+    counts = array.array("i")
+    ids = array.array("q")
+    string_positions = array.array("i")
+    annotation_starts = array.array("q")
+    count_starts = array.array("q")
+    element_ids = []
+    for position, element in enumerate(annotation_tree.tree):
+        annotation_starts.append(len(ids))
+        count_starts.append(len(counts))
+        _encode_element(element, hierarchy, strings, counts, ids,
+            string_positions)
+        if ids[annotation_starts[-1]] != -1:
+            element_ids.append((ids[annotation_starts[-1]], position))
+    annotation_starts.append(len(ids))
+    count_starts.append(len(counts))
+    element_ids.sort()
+
+    table = sorted(strings, key = strings.get)
+    offsets = array.array("i", [0])
+    byte_offsets = array.array("q", [0])
+    encoded_table = []
+    for s in table:
+        offsets.append(offsets[-1] + len(s))
+        encoded = s.encode("utf-8")
+        byte_offsets.append(byte_offsets[-1] + len(encoded))
+        encoded_table.append(encoded)
+
+    header = {
+        "data_structure_type": data_structure_type.name,
+        "data_hierarchy": hierarchy,
+        "next_annotation_id": annotation_tree._next_annotation_id,
+        "elements": len(annotation_tree.tree) }
+    if header_fields is not None:
+        header.update(header_fields)
+    header_bytes = json.dumps(header).encode("utf-8")
+    file.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+    file.write(header_bytes)
+    file.write(b"\0" * _padding(_PREAMBLE.size + len(header_bytes)))
+    _write_section(file, b"".join(encoded_table))
+    for integers in (offsets, counts, ids, string_positions, byte_offsets,
+                     annotation_starts, count_starts,
+                     array.array("q", [i for i, _ in element_ids]),
+                     array.array("q", [p for _, p in element_ids])):
+        _write_section(file, _little_endian(integers))
+
+def read_tree(file):
+    """Read the header and the elements of an annotation tree from a
+    binary file.
+
+    Parameters
+    ----------
+    file : file
+        A file object opened for reading in binary mode.
+
+    Returns
+    -------
+    header : dict
+        The header of the file.
+    elements : array_like
+        The elements of the tree with data.Annotation objects.
+    annotations : array_like
+        All annotations of the elements in the order of the file.
+
+    Raises
+    ------
+    data.UnknownFileFormatError
+        If the file is not a tree file or has a newer format version.
+
+    """
+
+    version, header = _read_header(file.read(_PREAMBLE.size), file.read)
+
+    text = _read_section(file, version).decode("utf-8")
+    offsets = _integers(_read_section(file, version), "i")
+    counts = _integers(_read_section(file, version), "i")
+    ids = _integers(_read_section(file, version), "q").tolist()
+    string_positions = _integers(_read_section(file, version), "i")
+
+    # the annotations are created in one pass over the arrays, the
+    # elements are then assembled by the decoder of the hierarchy
+    table = [text[offsets[i]:offsets[i + 1]]
+             for i in range(len(offsets) - 1)]
+    if -1 in ids:
+        ids = [None if i == -1 else i for i in ids]
+    annotations = list(map(data.Annotation, ids,
+                           map(table.__getitem__, string_positions)))
+    elements = eval(_decoder(header["data_hierarchy"]), {
+        "a": iter(annotations).__next__,
+        "c": iter(counts).__next__,
+        "n": header["elements"] })
+    return header, elements, annotations
+
+class MappedTreeFile(object):
+    """
+    Random access to the elements of a binary tree file of format
+    version 2 or newer. The file is memory-mapped, the elements are
+    decoded when they are read, so the memory that is used depends on
+    the elements that are accessed and not on the size of the file.
+
+    Attributes
+    ----------
+    filepath : str
+        The path of the tree file.
+    header : dict
+        The header of the file.
+
+    """
+
+    def __init__(self, filepath):
+        """Class's constructor.
+
+        Parameters
+        ----------
+        filepath : str
+            The path of the tree file.
+
+        Raises
+        ------
+        data.UnknownFileFormatError
+            If the file is not a tree file or has no tables for random
+            access.
+
+        """
+
+        self.filepath = filepath
+        file = open(filepath, "rb")
+        try:
+            self._mmap = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+        finally:
+            file.close()
+        self._views = []
+        try:
+            self._map_sections()
+        except:
+            self.close()
+            raise
+        self._decoder = _decoder(self.header["data_hierarchy"])
+
+    def _map_sections(self):
+        """Read the header and create the views of the sections."""
+
+        self._mmap.seek(0)
+        version, self.header = _read_header(
+            self._mmap.read(_PREAMBLE.size), self._mmap.read)
+        if version < 2:
+            raise data.UnknownFileFormatError(
+                "Tree file of format version {0} has no random access".format(
+                    version))
+        base = memoryview(self._mmap)
+        self._views.append(base)
+        sections = []
+        position = self._mmap.tell()
+        for typecode in (None, "i", "i", "q", "i", "q", "q", "q", "q", "q"):
+            if position + _SECTION.size > len(self._mmap):
+                raise data.UnknownFileFormatError("Tree file is truncated")
+            length, = _SECTION.unpack_from(self._mmap, position)
+            position += _SECTION.size
+            if position + length > len(self._mmap):
+                raise data.UnknownFileFormatError("Tree file is truncated")
+            section = base[position:position + length]
+            self._views.append(section)
+            if typecode is not None:
+                section = _integer_view(section, typecode)
+                if isinstance(section, memoryview):
+                    self._views.append(section)
+            sections.append(section)
+            position += length + _padding(length)
+        (self._text, _, self._counts, self._ids, self._string_positions,
+         self._byte_offsets, self._annotation_starts, self._count_starts,
+         self._element_ids, self._element_id_positions) = sections
+
+    def __len__(self):
+        return self.header["elements"]
+
+    def element(self, position):
+        """Read the element at a position.
+
+        Parameters
+        ----------
+        position : int
+            The position of the element in the tree.
+
+        Returns
+        -------
+        element : array_like
+            The element with data.Annotation objects.
+
+        Raises
+        ------
+        IndexError
+            If there is no element at the position.
+
+        """
+
+        if position < 0:
+            position += len(self)
+        if position < 0 or position >= len(self):
+            raise IndexError("Element position out of range")
+        first, last = self._annotation_starts[position:position + 2]
+        annotations = [data.Annotation(None if id == -1 else id,
+                                       self._string(string_position))
+                       for id, string_position in zip(
+                           self._ids[first:last],
+                           self._string_positions[first:last])]
+        first, last = self._count_starts[position:position + 2]
+        return eval(self._decoder, {
+            "a": iter(annotations).__next__,
+            "c": iter(self._counts[first:last]).__next__,
+            "n": 1 })[0]
+
+    def _string(self, string_position):
+        first, last = self._byte_offsets[string_position:string_position + 2]
+        return str(self._text[first:last], "utf-8")
+
+    def elements(self, start = 0, stop = None):
+        """Read the elements from position start to stop, one at a
+        time.
+
+        Parameters
+        ----------
+        start : int
+            The position of the first element.
+        stop : int
+            The position after the last element, None for the end of the
+            tree.
+
+        Returns
+        -------
+        elements : iterator
+            The elements with data.Annotation objects.
+
+        """
+
+        if stop is None or stop > len(self):
+            stop = len(self)
+        return (self.element(i) for i in range(start, stop))
+
+    def position_of_element(self, id_element):
+        """Return the position of the element with the given id.
+
+        Parameters
+        ----------
+        id_element : int
+            Id of an element.
+
+        Returns
+        -------
+        position : int
+            The position of the element or None if there is no element
+            with the id.
+
+        """
+
+        i = bisect.bisect_left(self._element_ids, id_element)
+        if i < len(self._element_ids) and self._element_ids[i] == id_element:
+            return self._element_id_positions[i]
+        return None
+
+    def positions_of_id_range(self, first_id, last_id):
+        """Return the positions of the elements with ids from first_id
+        to last_id, including both.
+
+        Parameters
+        ----------
+        first_id : int
+            The smallest element id.
+        last_id : int
+            The largest element id.
+
+        Returns
+        -------
+        positions : array_like
+            The sorted positions of the elements.
+
+        """
+
+        first = bisect.bisect_left(self._element_ids, first_id)
+        last = bisect.bisect_right(self._element_ids, last_id)
+        return sorted(self._element_id_positions[first:last])
+
+    def read_tree(self):
+        """Read all elements of the file.
+
+        Returns
+        -------
+        header : dict
+            The header of the file.
+        elements : array_like
+            The elements of the tree with data.Annotation objects.
+        annotations : array_like
+            All annotations of the elements in the order of the file.
+
+        See Also
+        --------
+        read_tree
+
+        """
+
+        self._mmap.seek(0)
+        return read_tree(self._mmap)
+
+    def close(self):
+        """Release the views and close the memory map."""
+
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+def _encode_element(element, hierarchy, strings, counts, ids,
+                    string_positions):
+    """Append the structure, the ids and the string positions of an
+    element to the arrays.
+
+    Parameters
+    ----------
+    element : array_like
+        An element or a part of an element of the annotation tree.
+    hierarchy : array_like
+        The data hierarchy of the element.
+    strings : dict
+        Maps the annotation values to their position in the string
+        table.
+    counts : array.array
+        The lengths of the lists.
+    ids : array.array
+        The ids of the annotations.
+    string_positions : array.array
+        The positions of the annotation values in the string table.
+
+    """
+
+    if type(element) is not list or len(element) != len(hierarchy):
+        raise ValueError("Element does not match the data hierarchy")
+    for i, t in enumerate(hierarchy):
+        if type(t) is list:
+            if type(element[i]) is not list:
+                raise ValueError("Element does not match the data hierarchy")
+            counts.append(len(element[i]))
+            for e in element[i]:
+                _encode_element(e, t, strings, counts, ids, string_positions)
+        else:
+            id = element[i]["id"]
+            if id is None:
+                id = -1
+            elif type(id) is not int:
+                raise ValueError("Annotation id must be int")
+            ids.append(id)
+            value = element[i]["annotation"]
+            position = strings.get(value)
+            if position is None:
+                position = strings[value] = len(strings)
+            string_positions.append(position)
+
+def _decoder(hierarchy):
+    """Return the compiled expression that builds the elements of a data
+    hierarchy. For the hierarchy ['utterance', ['word'], 'translation']
+    the expression is
+
+        [[a(), [[a()] for _ in range(c())], a()] for _ in range(n)]
+
+    where a() returns the next annotation, c() the next list length and
+    n is the number of elements.
+
+    Parameters
+    ----------
+    hierarchy : array_like
+        The data hierarchy of the elements.
+
+    Returns
+    -------
+    decoder : code
+        The compiled expression.
+
+    """
+
+    key = json.dumps(hierarchy)
+    if key not in _decoders:
+        _decoders[key] = compile("[{0} for _ in range(n)]".format(
+            _decoder_source(hierarchy)), "<treefile>", "eval")
+    return _decoders[key]
+
+def _decoder_source(hierarchy):
+    parts = []
+    for t in hierarchy:
+        if type(t) is list:
+            parts.append("[{0} for _ in range(c())]".format(
+                _decoder_source(t)))
+        else:
+            parts.append("a()")
+    return "[{0}]".format(", ".join(parts))
+
+def _read_header(preamble, read):
+    if len(preamble) != _PREAMBLE.size:
+        raise data.UnknownFileFormatError("Not a tree file")
+    magic, version, header_length = _PREAMBLE.unpack(preamble)
+    if magic != MAGIC or version > FORMAT_VERSION:
+        raise data.UnknownFileFormatError(
+            "Not a tree file of format version {0} or older".format(
+                FORMAT_VERSION))
+    header = json.loads(read(header_length).decode("utf-8"))
+    if version >= 2:
+        read(_padding(_PREAMBLE.size + header_length))
+    return version, header
+
+def _padding(length):
+    # sections are aligned to 8 bytes since format version 2
+    return -length % 8
+
+def _write_section(file, section):
+    file.write(_SECTION.pack(len(section)))
+    file.write(section)
+    file.write(b"\0" * _padding(len(section)))
+
+def _read_section(file, version):
+    length, = _SECTION.unpack(file.read(_SECTION.size))
+    section = file.read(length)
+    if len(section) != length:
+        raise data.UnknownFileFormatError("Tree file is truncated")
+    if version >= 2:
+        file.read(_padding(length))
+    return section
+
+def _little_endian(integers):
+    if sys.byteorder == "big":
+        integers = array.array(integers.typecode, integers)
+        integers.byteswap()
+    return integers.tobytes()
+
+def _integer_view(section, typecode):
+    # the integers of a mapped section without a copy, if the byte
+    # order allows it
+    if sys.byteorder == "big":
+        return _integers(section.tobytes(), typecode)
+    return section.cast(typecode)
+
+def _integers(section, typecode):
+    integers = array.array(typecode)
+    integers.frombytes(section)
+    if sys.byteorder == "big":
+        integers.byteswap()
+    return integers